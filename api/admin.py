@@ -8,8 +8,10 @@ class CategoryAdmin(admin.ModelAdmin):
 
 from django.contrib import admin
 from django.utils.html import format_html
-from django.db.models import Sum
-from .models import Product, Category, Order, OrderItem, Review, Cart
+from django.db.models import Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import Product, Category, Order, OrderItem, PaymentAttempt, Review, Cart
+from .images import variant_urls
 
 class LowStockFilter(admin.SimpleListFilter):
     title = 'Inventory Status'
@@ -39,7 +41,9 @@ class ProductAdmin(admin.ModelAdmin):
     # A. Display Image Thumbnail
     def product_image(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 5px;" />', obj.image.url)
+            # The 100px thumbnail once rendered, instead of the full upload
+            thumb = variant_urls(obj).get('thumb', {}).get('webp', obj.image.url)
+            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 5px;" />', thumb)
         return "No Image"
     product_image.short_description = "Image"
 
@@ -59,11 +63,23 @@ class ProductAdmin(admin.ModelAdmin):
     stock_status.short_description = "Inventory"
 
     # C. Calculated Field: Total Sold
+    def get_queryset(self, request):
+        # Sum up quantity from delivered orders: one correlated subquery in the
+        # changelist SELECT instead of an aggregate query per row
+        delivered_units = (
+            OrderItem.objects.filter(product=OuterRef('pk'), order__status='delivered')
+            .values('product')
+            .annotate(total=Sum('quantity'))
+            .values('total')
+        )
+        return super().get_queryset(request).annotate(
+            units_sold=Coalesce(Subquery(delivered_units), 0)
+        )
+
     def sold_count(self, obj):
-        # Sum up quantity from delivered orders
-        total = OrderItem.objects.filter(product=obj, order__status='delivered').aggregate(Sum('quantity'))['quantity__sum']
-        return total or 0
+        return obj.units_sold
     sold_count.short_description = "Units Sold"
+    sold_count.admin_order_field = 'units_sold' # Sortable column
 
 
     
@@ -83,19 +99,29 @@ class OrderItemInline(admin.TabularInline):
         qty = obj.quantity if obj.quantity is not None else 0
         return f"₦{price * qty}"
 
+class PaymentAttemptInline(admin.TabularInline):
+    model = PaymentAttempt
+    readonly_fields = ('reference', 'created_at')
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False # Opened by checkout only
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user_link', 'total_amount', 'status_badge', 'payment_method', 'created_at', 'action_buttons')
     list_filter = ('status', 'is_paid', 'created_at', 'payment_method')
-    search_fields = ('id', 'user__username', 'user__email', 'payment_reference')
-    inlines = [OrderItemInline]
+    search_fields = ('id', 'user__username', 'user__email', 'payment_reference', 'payment_attempts__reference')
+    inlines = [OrderItemInline, PaymentAttemptInline]
     readonly_fields = ('total_amount', 'delivery_fee', 'created_at')
+    list_select_related = ('user',) # user_link: no query per row
     
     actions = ['mark_processing', 'mark_shipped', 'resend_confirmation_email']
 
     # A. Link to User Profile
     def user_link(self, obj):
-        url = reverse("admin:auth_user_change", args=[obj.user.id])
+        url = reverse("admin:auth_user_change", args=[obj.user_id])
         return format_html('<a href="{}">{}</a>', url, obj.user.username)
     user_link.short_description = "Customer"
 
@@ -126,17 +152,17 @@ class OrderAdmin(admin.ModelAdmin):
 
     # D. Bulk Action: Resend Email
     def resend_confirmation_email(self, request, queryset):
-        count = 0
-        for order in queryset:
-            # Trigger the email logic manually
-            EmailService.send_order_status_email(order)
-            count += 1
+        # One bulk INSERT into the outbox; the worker sends them in batches
+        count = EmailService.send_order_status_emails(queryset.select_related('user'))
         self.message_user(request, f"Emails queued for {count} orders.")
     resend_confirmation_email.short_description = "Resend Email Notification"
 
+    # E. Bulk Status Actions: one UPDATE, but still sync is_paid and email customers
     def mark_processing(self, request, queryset):
-        queryset.update(status='processing')
+        count = queryset.transition('processing')
+        self.message_user(request, f"{count} orders marked as processing.")
     
     def mark_shipped(self, request, queryset):
-        queryset.update(status='shipped')
+        count = queryset.transition('shipped')
+        self.message_user(request, f"{count} orders marked as shipped.")
 
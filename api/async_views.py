@@ -0,0 +1,146 @@
+# Async (ASGI) versions of the payment endpoints.
+# Under config.asgi one worker keeps many Paystack round-trips in flight on a
+# single event loop instead of parking a thread per request. They replace the
+# DRF views when ASYNC_PAYMENTS = True (see api/urls.py).
+# DRF's APIView is sync-only: its auth/permission/throttle checks run on the
+# sync thread (drf_checks), JSON parsing is done by hand; responses match the
+# DRF views.
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions, views
+from rest_framework.permissions import AllowAny, IsAuthenticated
+
+from core.metrics import CHECKOUTS, CHECKOUT_DURATION, PAYMENT_VERIFICATIONS
+from core.paystack import AsyncPaystack
+from .models import Order
+from .checkout import (
+    place_order, astart_paystack_payment, can_retry_payment,
+    payment_started_payload, payment_retry_payload, order_placed_payload,
+    payment_method_label, mark_paid, GATEWAY_DOWN_MESSAGE, RETRY_DOWN_MESSAGE, NOT_PAYABLE_MESSAGE,
+)
+
+
+
+def _run_drf_checks(request, permission_classes):
+    """
+    APIView.initial() for a plain Django request: the configured
+    DEFAULT_AUTHENTICATION_CLASSES (including SessionAuthentication and its
+    CSRF check, if enabled), the permissions and DEFAULT_THROTTLE_CLASSES,
+    sharing the throttle history with the DRF views.
+    """
+    view = views.APIView()
+    view.permission_classes = permission_classes
+    view.args, view.kwargs, view.headers = (), {}, {}
+    view.format_kwarg = None
+    drf_request = view.initialize_request(request)
+    view.request = drf_request
+    try:
+        view.initial(drf_request)
+    except exceptions.APIException as exc:
+        response = JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            # Same as APIView.handle_exception: 401 + challenge, or 403 without one
+            auth_header = view.get_authenticate_header(drf_request)
+            if auth_header:
+                response['WWW-Authenticate'] = auth_header
+            else:
+                response.status_code = 403
+        if isinstance(exc, exceptions.Throttled) and exc.wait is not None:
+            response['Retry-After'] = str(math.ceil(exc.wait))
+        return None, response
+    return drf_request.user, None
+
+
+async def drf_checks(request, permission_classes):
+    """ (user, None) if the request may proceed, else (None, error response). """
+    return await sync_to_async(_run_drf_checks)(request, permission_classes)
+
+
+@csrf_exempt # Token auth, like the DRF views
+@require_POST
+async def checkout_view(request):
+    user, denied = await drf_checks(request, [IsAuthenticated])
+    if denied:
+        return denied
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    payment_method = data.get('payment_method', 'paystack')
+    label = payment_method_label(payment_method) # Bounded set of metric series
+
+    with CHECKOUT_DURATION.time(payment_method=label):
+        # 1-4. Cart -> Order: the ORM transaction runs on the sync thread
+        try:
+            order = await sync_to_async(place_order)(user, data)
+        except Exception as e:
+            CHECKOUTS.inc(payment_method=label, outcome='rejected')
+            return JsonResponse({"error": str(e)}, status=400)
+
+        # 5. Gateway call is awaited: no thread or DB lock held meanwhile
+        if payment_method == 'paystack':
+            res = await astart_paystack_payment(order, user.email)
+            if res['status']:
+                CHECKOUTS.inc(payment_method=label, outcome='payment_started')
+                return JsonResponse(payment_started_payload(order, res), status=201)
+            CHECKOUTS.inc(payment_method=label, outcome='gateway_down')
+            return JsonResponse(payment_retry_payload(order, GATEWAY_DOWN_MESSAGE), status=502)
+
+        CHECKOUTS.inc(payment_method=label, outcome='placed')
+        return JsonResponse(order_placed_payload(order), status=201)
+
+
+@csrf_exempt
+@require_POST
+async def order_payment_view(request, id):
+    user, denied = await drf_checks(request, [IsAuthenticated])
+    if denied:
+        return denied
+
+    try:
+        order = await Order.objects.aget(id=id, user=user)
+    except Order.DoesNotExist:
+        return JsonResponse({"detail": "No Order matches the given query."}, status=404)
+
+    if not can_retry_payment(order):
+        return JsonResponse({"error": NOT_PAYABLE_MESSAGE}, status=400)
+
+    res = await astart_paystack_payment(order, user.email)
+    if res['status']:
+        return JsonResponse(payment_started_payload(order, res, "Redirecting to payment."))
+    return JsonResponse(payment_retry_payload(order, RETRY_DOWN_MESSAGE), status=502)
+
+
+@require_GET
+async def payment_verify_view(request):
+    """ Called by Frontend after Paystack redirect return. Public. """
+    _, denied = await drf_checks(request, [AllowAny]) # Still throttled
+    if denied:
+        return denied
+
+    reference = request.GET.get('reference')
+    if not reference:
+        return JsonResponse({"error": "No reference provided"}, status=400)
+
+    res = await AsyncPaystack().verify_transaction(reference)
+
+    if res['status']:
+        # Find order (by any of its attempts, retries included) and mark as paid
+        try:
+            order = await Order.objects.select_related('user').aget(payment_attempts__reference=reference)
+        except Order.DoesNotExist:
+            PAYMENT_VERIFICATIONS.inc(outcome='order_not_found')
+            return JsonResponse({"error": "Order not found"}, status=404)
+        mark_paid(order, reference)
+        await order.asave()
+        PAYMENT_VERIFICATIONS.inc(outcome='paid')
+        return JsonResponse({"status": "success", "message": "Payment verified"})
+
+    PAYMENT_VERIFICATIONS.inc(outcome='failed')
+    return JsonResponse({"status": "failed", "message": "Payment verification failed"}, status=400)
@@ -0,0 +1,95 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from core.db_router import primary_reads
+from core.metrics import CACHE_REQUESTS
+
+# Cache keys
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def _incr(key, delta=1):
+    """ Atomic counter that survives a missing key. """
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # First use (or evicted): seed it, unless another worker beat us to it
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached catalog page at once.
+    Old entries are never read again and simply expire.
+    """
+    return _incr(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version_on_commit():
+    # Wait for the write to be visible, otherwise a concurrent reader could
+    # re-cache the old rows under the new version.
+    transaction.on_commit(bump_catalog_version)
+
+
+def catalog_cache_stats():
+    # From the in-memory metrics counters: counting in the shared cache would
+    # make every hit a write (a BEGIN IMMEDIATE on the SQLite tier)
+    hits = CACHE_REQUESTS.value(cache='catalog', result='hit')
+    misses = CACHE_REQUESTS.value(cache='catalog', result='miss')
+    total = hits + misses
+    return {
+        'version': get_catalog_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 1) if total else 0,
+    }
+
+
+class CatalogCacheMixin:
+    """
+    Caches the serialized list response under the current catalog version.
+    Any Product/Category save or delete bumps the version (see api/signals.py),
+    so the TTL can be long without serving stale prices or stock.
+    Misses are read from the primary even in a replica view: a lagging
+    replica would otherwise cache old rows under the new version.
+    """
+    def get_catalog_cache_timeout(self):
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60 * 6)
+
+    def get_catalog_cache_key(self, request):
+        # Sort params so ?a=1&b=2 and ?b=2&a=1 share one entry
+        query = sorted(request.query_params.lists())
+        raw = f"{request.get_host()}{request.path}?{query}".encode()
+        digest = hashlib.md5(raw).hexdigest()
+        return f"catalog:v{get_catalog_version()}:{digest}"
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_catalog_cache_key(request)
+        data = cache.get(key)
+
+        if data is not None:
+            CACHE_REQUESTS.inc(cache='catalog', result='hit')
+            response = Response(data)
+            response['X-Catalog-Cache'] = 'HIT'
+            return response
+
+        CACHE_REQUESTS.inc(cache='catalog', result='miss')
+        with primary_reads():
+            response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, self.get_catalog_cache_timeout())
+        response['X-Catalog-Cache'] = 'MISS'
+        return response
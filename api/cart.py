@@ -0,0 +1,187 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Cart, CartItem, Product, CART_TOTAL_FIELD, line_total
+
+CART_OPERATIONS = ('add', 'set', 'remove')
+MAX_BATCH_OPERATIONS = 100
+
+
+class CartError(ValueError):
+    """ A batch that can't be applied; comes back to the customer as a 400. """
+
+
+def cart_queryset():
+    """
+    The cart read path, used by the cart endpoints and by checkout:
+    - Query 1: the cart row with `cart_total` = SUM(quantity * price)
+    - Query 2: its items with their products and `line_total` per row
+    Cart.total_price / CartItem.total_price pick these annotations up, so
+    serializing a cart never touches the database per item.
+    """
+    items = (
+        CartItem.objects.select_related('product')
+        .annotate(line_total=line_total())
+        .order_by('id')
+    )
+    return (
+        Cart.objects
+        .annotate(cart_total=Coalesce(Sum(line_total('items__')), Value(Decimal('0.00')), output_field=CART_TOTAL_FIELD))
+        .prefetch_related(Prefetch('items', queryset=items))
+    )
+
+
+def get_cart(user, create=True):
+    """ The user's cart, loaded via cart_queryset(). Created if missing unless create=False. """
+    try:
+        return cart_queryset().get(user=user)
+    except Cart.DoesNotExist:
+        if not create:
+            raise
+    Cart.objects.get_or_create(user=user)
+    return cart_queryset().get(user=user)
+
+
+def _parse_operations(operations):
+    """ Validates the raw list and returns [(op, product_id, quantity), ...]. """
+    if not isinstance(operations, list) or not operations:
+        raise CartError("'operations' must be a non-empty list.")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise CartError(f"At most {MAX_BATCH_OPERATIONS} operations per request.")
+
+    parsed = []
+    for index, raw in enumerate(operations):
+        if not isinstance(raw, dict) or raw.get('op') not in CART_OPERATIONS:
+            raise CartError(f"Operation {index}: 'op' must be one of {', '.join(CART_OPERATIONS)}.")
+        op = raw['op']
+        try:
+            product_id = int(raw.get('product_id'))
+            quantity = int(raw.get('quantity', 1 if op == 'add' else 0))
+        except (TypeError, ValueError):
+            raise CartError(f"Operation {index}: 'product_id' and 'quantity' must be integers.")
+        if op == 'set' and quantity < 0:
+            raise CartError(f"Operation {index}: 'set' quantity can't be negative.")
+        parsed.append((op, product_id, quantity))
+    return parsed
+
+
+def apply_cart_operations(user, operations):
+    """
+    Applies a list of cart operations in ONE transaction:
+    - {"op": "add", "product_id": 3, "quantity": 2}  -> +2 (negative to decrease)
+    - {"op": "set", "product_id": 3, "quantity": 5}  -> exactly 5 (0 removes)
+    - {"op": "remove", "product_id": 3}              -> line removed
+    Operations are folded in memory first, so ten +/- clicks on the same
+    line cost one UPDATE. At most one DELETE, one INSERT and one UPDATE hit
+    the database, whatever the batch size.
+    """
+    parsed = _parse_operations(operations)
+    product_ids = {product_id for _, product_id, _ in parsed}
+
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.filter(cart=cart, product_id__in=product_ids)
+        }
+
+        # 1. Fold the operations into a final quantity per product
+        final = {product_id: item.quantity for product_id, item in existing.items()}
+        for op, product_id, quantity in parsed:
+            if op == 'add':
+                final[product_id] = max(final.get(product_id, 0) + quantity, 0)
+            elif op == 'set':
+                final[product_id] = quantity
+            else:
+                final[product_id] = 0
+
+        # 2. New lines must point at real products
+        new_ids = {product_id for product_id, qty in final.items() if qty > 0 and product_id not in existing}
+        if new_ids:
+            found = set(Product.objects.filter(id__in=new_ids).values_list('id', flat=True))
+            missing = new_ids - found
+            if missing:
+                raise CartError(f"Unknown product(s): {', '.join(map(str, sorted(missing)))}.")
+
+        # 3. Write the differences
+        to_delete, to_update, to_create = [], [], []
+        for product_id, qty in final.items():
+            item = existing.get(product_id)
+            if item is None:
+                if qty > 0:
+                    to_create.append(CartItem(cart=cart, product_id=product_id, quantity=qty))
+            elif qty == 0:
+                to_delete.append(item.id)
+            elif qty != item.quantity:
+                item.quantity = qty
+                to_update.append(item)
+
+        if to_delete:
+            CartItem.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+
+    return get_cart(user)
+
+
+# --- Idempotency-Key support for the batch endpoint ---
+
+class IdempotencyKeyReused(Exception):
+    """ The key was first sent with a different request body (422). """
+
+
+def _idempotency_cache_key(user, key):
+    return f'cart:idempotency:v2:{user.pk}:{key}'
+
+
+def _fingerprint(payload):
+    # Same JSON body (whatever the key order) -> same fingerprint
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def claim_idempotency_key(user, key, payload):
+    """
+    Returns (claimed, stored_response).
+    - (True, None): first time we see this key, go ahead
+    - (False, response): already applied, replay `response`
+    - (False, None): the same request is still running elsewhere
+    Raises IdempotencyKeyReused if the key came with another body before.
+    cache.add() is atomic, so two concurrent retries can't both apply.
+    The claim only lives CART_IDEMPOTENCY_PENDING_TTL seconds, so a worker
+    that dies mid-request blocks the key briefly, not for a day.
+    """
+    cache_key = _idempotency_cache_key(user, key)
+    fingerprint = _fingerprint(payload)
+    pending = {'pending': True, 'fingerprint': fingerprint}
+    if cache.add(cache_key, pending, timeout=settings.CART_IDEMPOTENCY_PENDING_TTL):
+        return True, None
+
+    stored = cache.get(cache_key)
+    if stored is None: # Expired between add() and get(): claim it again
+        return claim_idempotency_key(user, key, payload)
+    if stored['fingerprint'] != fingerprint:
+        raise IdempotencyKeyReused("This Idempotency-Key was already used with a different request.")
+    if stored.get('pending'):
+        return False, None
+    return False, stored
+
+
+def store_idempotent_response(user, key, payload, status_code, data):
+    # The final result is kept for the full TTL (the pending claim was short)
+    cache.set(_idempotency_cache_key(user, key),
+              {'status': status_code, 'data': data, 'fingerprint': _fingerprint(payload)},
+              timeout=settings.CART_IDEMPOTENCY_TTL)
+
+
+def release_idempotency_key(user, key):
+    """ Forget a key whose request failed, so the client can retry it. """
+    cache.delete(_idempotency_cache_key(user, key))
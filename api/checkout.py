@@ -0,0 +1,186 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from core.delivery_zones import get_zone_fee
+from core.paystack import Paystack, AsyncPaystack
+from .models import Cart, Order, OrderItem, PaymentAttempt
+from .inventory import reserve_stock
+from .cart import get_cart
+from .rollups import record_items
+
+DEFAULT_DELIVERY_FEE = 2500 # Standard delivery when the state is not in DeliveryZone
+
+GATEWAY_DOWN_MESSAGE = "Order saved, but we couldn't reach the payment gateway. Please retry payment."
+RETRY_DOWN_MESSAGE = "Payment gateway unavailable. Please try again shortly."
+NOT_PAYABLE_MESSAGE = "This order is not awaiting online payment."
+
+
+class CheckoutError(ValueError):
+    """ Anything that should come back to the customer as a 400. """
+
+
+def payment_method_label(payment_method):
+    """ Metrics label: the request body is free text, so anything unknown is 'other'. """
+    known = isinstance(payment_method, str) and payment_method in dict(Order.PAYMENT_METHOD_CHOICES)
+    return payment_method if known else 'other'
+
+
+def get_delivery_fee(state_name):
+    # We don't trust the frontend price. We verify it here,
+    # against the in-memory zone table (no query on the checkout path).
+    # Normalized match for state (e.g. "kano" matches "Kano")
+    return get_zone_fee(state_name, DEFAULT_DELIVERY_FEE)
+
+
+def place_order(user, data):
+    """
+    The local (database) half of checkout: cart -> order, stock reserved,
+    cart cleared, all in one short transaction. No network I/O happens
+    here, so the SQLite write lock is held for milliseconds.
+    Shared by the sync CheckoutView and the async checkout view.
+    """
+    # 1. Extract Data
+    payment_method = data.get('payment_method', 'paystack')
+    state_name = data.get('state')
+
+    # 2. CALCULATE DELIVERY FEE (Server-Side Validation)
+    delivery_fee = get_delivery_fee(state_name)
+
+    # 3. Start Database Transaction (IMMEDIATE on SQLite: the cart is read
+    #    under the write lock, so a concurrent checkout can't read it too)
+    with transaction.atomic():
+
+        # Get User's Cart (items, products and total in 2 queries)
+        try:
+            cart = get_cart(user, create=False)
+        except Cart.DoesNotExist:
+            raise CheckoutError("No cart found")
+        cart_items = list(cart.items.all())
+        if not cart_items:
+            raise CheckoutError("Cart is empty")
+
+        # Calculate Grand Total (Cart Subtotal + Delivery Fee)
+        grand_total = cart.total_price + delivery_fee
+
+        # A. Create the Order
+        order = Order.objects.create(
+            user=user,
+            full_name=data.get('full_name'),
+            address=data.get('address'),
+            city=data.get('city'),
+            state=state_name,
+            phone=data.get('phone'),
+            delivery_fee=delivery_fee, # Save the fee
+            total_amount=grand_total,  # Save the final total
+            payment_method=payment_method
+        )
+
+        # B. Deduct Stock (single guarded UPDATE for the whole cart)
+        reserve_stock(cart_items)
+
+        # C. Move Items
+        items_to_create = []
+        for item in cart_items:
+            product = item.product
+
+            # Create Order Item (Snapshot of price/name)
+            items_to_create.append(OrderItem(
+                order=order,
+                product=product,
+                product_name=product.name,
+                price=product.price,
+                quantity=item.quantity
+            ))
+
+        # Bulk Create for performance (no post_save, so record the units sold here)
+        OrderItem.objects.bulk_create(items_to_create)
+        record_items(order, items_to_create)
+
+        # D. Clear the Cart: only the lines ordered (one added meanwhile stays).
+        #    Fewer deleted means another checkout took them: roll this one back.
+        deleted, _ = cart.items.filter(pk__in=[item.pk for item in cart_items]).delete()
+        if deleted != len(cart_items):
+            raise CheckoutError("Your cart changed during checkout. Please review it and try again.")
+
+    return order
+
+
+# --- Payment (runs AFTER place_order has committed) ---
+
+def start_paystack_payment(order, email):
+    """
+    Opens a Paystack transaction for an already-committed order.
+    Runs OUTSIDE any transaction.atomic() block: the gateway round-trip must
+    not hold the SQLite write lock. On failure the order simply stays
+    'pending' with no new reference; the customer can retry from the order
+    page and `manage.py reconcile_payments` cleans up abandoned ones.
+    """
+    res = Paystack().initialize_transaction(
+        email=email,
+        amount=order.total_amount,
+        order_id=order.id
+    )
+    if res['status']:
+        record_payment_attempt(order, res['reference'])
+    return res
+
+
+async def astart_paystack_payment(order, email):
+    """ Async twin of start_paystack_payment (no thread held during the call). """
+    res = await AsyncPaystack().initialize_transaction(
+        email=email,
+        amount=order.total_amount,
+        order_id=order.id
+    )
+    if res['status']:
+        await sync_to_async(record_payment_attempt)(order, res['reference'])
+    return res
+
+
+def record_payment_attempt(order, reference):
+    """
+    Keeps every reference opened for the order (a retry doesn't forget the
+    earlier transaction, which the customer may still complete); the new
+    one becomes order.payment_reference. The attempt is written first: it
+    is what verify and reconcile_payments look up.
+    """
+    PaymentAttempt.objects.create(order=order, reference=reference)
+    order.payment_reference = reference
+    order.save(update_fields=['payment_reference', 'updated_at'])
+
+
+def mark_paid(order, reference):
+    """ Paystack confirmed `reference` (any of the order's attempts). Caller saves. """
+    order.payment_reference = reference
+    order.is_paid = True
+    order.status = 'paid'
+
+
+def payment_started_payload(order, res, message="Order created. Redirecting to payment."):
+    return {
+        "message": message,
+        "payment_url": res['auth_url'],
+        "order_id": order.id,
+        "type": "paystack"
+    }
+
+
+def payment_retry_payload(order, message):
+    return {
+        "error": message,
+        "order_id": order.id,
+        "retry_url": f"/api/orders/{order.id}/pay/",
+        "type": "paystack"
+    }
+
+
+def order_placed_payload(order):
+    return {
+        "message": "Order placed successfully!",
+        "order_id": order.id,
+        "type": "pod"
+    }
+
+
+def can_retry_payment(order):
+    return order.payment_method == 'paystack' and not order.is_paid and order.status == 'pending'
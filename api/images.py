@@ -0,0 +1,227 @@
+"""
+Product image variants (thumbnails + responsive WebP/AVIF sizes).
+
+Uploads are served as-is by `Product.image`; the variants are rendered in
+the background and recorded in `Product.image_variants`:
+
+    {"source": "products/shoe.jpg",             # image they were made from
+     "sizes": {"thumb": {"webp": "products/variants/12/shoe-thumb.webp", "avif": ...},
+               "small": {...}, ...},
+     "widths": {"thumb": 100, "small": 320, ...}}
+
+A product whose `source` differs from its current image is pending, so the
+products table itself is the work queue: nothing is lost if a worker dies
+mid-way, and `manage.py generate_image_variants` catches up on anything missed.
+"""
+import io
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.db.models.fields.json import KT
+from PIL import Image, ImageOps, features
+
+from .cache import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# name -> width in px. 'thumb' is a square crop (admin list, cart rows);
+# the others keep the aspect ratio and feed the srcset.
+VARIANT_WIDTHS = {'thumb': 100, 'small': 320, 'medium': 640, 'large': 1200}
+SRCSET_SIZES = ('small', 'medium', 'large')
+
+# Best first; AVIF only if this Pillow build can encode it
+ENCODERS = {
+    'avif': {'format': 'AVIF', 'quality': 55, 'speed': 6},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+}
+FORMATS = tuple(fmt for fmt in ENCODERS if features.check(fmt))
+
+
+def pending_products():
+    """ Products with an image whose variants are missing or out of date. """
+    return (
+        Product.objects.exclude(image='').exclude(image__isnull=True)
+        .annotate(variant_source=KT('image_variants__source'))
+        # Never rendered: no key, so NULL (and NOT (NULL = image) would drop the row)
+        .filter(Q(variant_source__isnull=True) | ~Q(variant_source=F('image')))
+    )
+
+
+def _open(field):
+    field.open('rb')
+    try:
+        image = Image.open(field)
+        image.load()
+    finally:
+        field.close()
+    image = ImageOps.exif_transpose(image) # Phone photos come in sideways otherwise
+    return image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+
+def _resize(image, name, width):
+    if name == 'thumb':
+        return ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, width * 10), Image.Resampling.LANCZOS) # Width-bound, never upscaled
+    return resized
+
+
+def render_variants(product):
+    """
+    Renders every variant of product.image into storage and returns the
+    image_variants map. Never upscales: the first size at least as wide as the
+    original gets the original width and larger ones are skipped.
+    """
+    storage = product.image.storage
+    stem = os.path.splitext(os.path.basename(product.image.name))[0]
+    image = _open(product.image)
+
+    sizes, widths = {}, {}
+    covered = False # A size as wide as the original exists: larger ones would be copies
+    for name, width in VARIANT_WIDTHS.items():
+        if name != 'thumb':
+            if covered:
+                continue
+            covered = width >= image.width
+        resized = _resize(image, name, width)
+        sizes[name] = {}
+        for fmt in FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, **ENCODERS[fmt])
+            path = f"products/variants/{product.pk}/{stem}-{name}.{fmt}"
+            if storage.exists(path):
+                storage.delete(path)
+            sizes[name][fmt] = storage.save(path, ContentFile(buffer.getvalue()))
+        widths[name] = resized.width
+
+    return {'source': product.image.name, 'sizes': sizes, 'widths': widths}
+
+
+def delete_variant_files(variants, keep=()):
+    storage = Product._meta.get_field('image').storage
+    for formats in variants.get('sizes', {}).values():
+        for path in formats.values():
+            if path not in keep:
+                storage.delete(path)
+
+
+def process_product(product):
+    """ Renders one product's variants and records them (if the image didn't change meanwhile). """
+    old = product.image_variants or {}
+    try:
+        variants = render_variants(product)
+    except Exception as e:
+        # Corrupt/unsupported upload: record it so it isn't retried forever
+        logger.warning("Image variants failed for product #%s (%s): %s", product.pk, product.image.name, e)
+        variants = {'source': product.image.name, 'error': str(e)}
+
+    # .update(): no post_save (that would queue the product again)
+    updated = Product.objects.filter(pk=product.pk, image=product.image.name).update(image_variants=variants)
+    if updated:
+        kept = [path for formats in variants.get('sizes', {}).values() for path in formats.values()]
+        delete_variant_files(old, keep=kept)
+    else:
+        delete_variant_files(variants) # Image replaced while we worked; the new one is pending already
+    return updated
+
+
+def process_pending_images(batch_size=None):
+    """ Processes one batch of pending products. Returns how many were processed. """
+    batch_size = batch_size or getattr(settings, 'IMAGE_PIPELINE_BATCH_SIZE', 10)
+    products = list(pending_products().order_by('id')[:batch_size])
+    for product in products:
+        process_product(product)
+    if products:
+        bump_catalog_version() # Cached catalog pages pick up the new URLs
+    return len(products)
+
+
+def clear_variants(product):
+    """ Image removed: drop the files and the map. """
+    delete_variant_files(product.image_variants or {})
+    Product.objects.filter(pk=product.pk).update(image_variants={})
+
+
+# --- Background worker (same model as the email outbox worker) ---
+
+class ImageWorker(threading.Thread):
+    """
+    One background thread per process renders pending variants, so uploads
+    return as soon as the original is stored. Disable with
+    IMAGE_PIPELINE_WORKER = 'command' and run
+    `manage.py generate_image_variants --loop` instead.
+    """
+    POLL_INTERVAL = 300 # Seconds; a safety net, uploads wake the worker directly
+
+    def __init__(self):
+        super().__init__(name='image-pipeline', daemon=True)
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.POLL_INTERVAL)
+            self.wakeup.clear()
+            try:
+                while process_pending_images():
+                    pass
+            except Exception:
+                logger.exception("Image worker crashed while processing")
+            finally:
+                close_old_connections()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_image_worker():
+    global _worker
+    if getattr(settings, 'IMAGE_PIPELINE_WORKER', 'thread') != 'thread':
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = ImageWorker()
+            _worker.start()
+    _worker.wakeup.set()
+
+
+def queue_image_variants(product):
+    """ Called on Product save: wakes the worker once the new image is committed. """
+    if not product.image:
+        if product.image_variants:
+            clear_variants(product)
+        return
+    if (product.image_variants or {}).get('source') != product.image.name:
+        transaction.on_commit(wake_image_worker)
+
+
+# --- Read side (serializers, admin) ---
+
+def variant_urls(product, build_url=None):
+    """ {"thumb": {"avif": url, "webp": url}, "small": {...}, ...}; {} until rendered. """
+    variants = product.image_variants or {}
+    if variants.get('source') != (product.image.name if product.image else None):
+        return {} # Stale (image replaced, not re-rendered yet)
+    storage = Product._meta.get_field('image').storage
+    build_url = build_url or (lambda url: url)
+    return {
+        name: {fmt: build_url(storage.url(path)) for fmt, path in formats.items()}
+        for name, formats in variants.get('sizes', {}).items()
+    }
+
+
+def srcsets(product, urls):
+    """ {"avif": "url 320w, url 640w, ...", "webp": ...} for <picture><source srcset>. """
+    widths = (product.image_variants or {}).get('widths', {})
+    sizes = [name for name in SRCSET_SIZES if name in urls]
+    formats = {fmt for name in sizes for fmt in urls[name]}
+    return {
+        fmt: ', '.join(f"{urls[name][fmt]} {widths[name]}w" for name in sizes if fmt in urls[name])
+        for fmt in ENCODERS if fmt in formats # Best first
+    }
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models import Case, When, Value, F, IntegerField
+
+from .models import Product
+from .cache import bump_catalog_version_on_commit
+from .rollups import record_stock_changes
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+        output_field=IntegerField()
+    )
+
+
+def _record_stock_moves(quantities, sign):
+    # New stock of just these rows (pk lookups, inside the same transaction);
+    # the old stock is new - sign * qty, since the UPDATE moved it by exactly that
+    new_stock = Product.objects.filter(pk__in=quantities).values_list('pk', 'stock')
+    record_stock_changes([(stock - sign * quantities[pk], stock) for pk, stock in new_stock])
+
+
+def reserve_stock(cart_items):
+    """
+    Deducts stock for a whole cart in ONE conditional UPDATE:
+
+        UPDATE product SET stock = stock - <qty>
+        WHERE id IN (...) AND stock >= <qty>
+
+    The `stock >= qty` guard runs inside the UPDATE, so two concurrent
+    checkouts can never both take the last unit. If any line is short the
+    row count comes back low and we raise ValueError, which rolls back the
+    surrounding transaction.atomic() block.
+    Must be called inside transaction.atomic().
+    """
+    quantities = {}
+    for item in cart_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    needed = _quantity_case(quantities)
+    updated = Product.objects.filter(pk__in=quantities, stock__gte=needed).update(stock=F('stock') - needed)
+
+    if updated != len(quantities):
+        # Name the first line we know is short (from the snapshot we loaded)
+        for item in cart_items:
+            if item.product.stock < item.quantity:
+                raise ValueError(f"Not enough stock for {item.product.name}")
+        raise ValueError("Some items in your cart just sold out. Please review your cart.")
+
+    # .update() skips post_save, so refresh the cached catalog (and stock rollup) ourselves
+    bump_catalog_version_on_commit()
+    _record_stock_moves(quantities, -1)
+
+
+def release_stock(order):
+    """
+    Puts an order's units back on the shelf (e.g. an abandoned payment).
+    Lines whose product was deleted are skipped.
+    """
+    quantities = {}
+    for item in order.items.all():
+        if item.product_id:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    if not quantities:
+        return
+
+    with transaction.atomic():
+        Product.objects.filter(pk__in=quantities).update(stock=F('stock') + _quantity_case(quantities))
+        _record_stock_moves(quantities, 1)
+    bump_catalog_version_on_commit()
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.images import FORMATS, pending_products, process_pending_images
+from api.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders missing product image variants (thumbnail + WebP/AVIF sizes). "
+        "Use --loop to run as a dedicated worker (with IMAGE_PIPELINE_WORKER = 'command')."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Products per batch (default: IMAGE_PIPELINE_BATCH_SIZE)')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render every product (e.g. after changing the sizes or encoders)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and poll for new uploads')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Seconds to sleep when nothing is pending (default: 30)')
+
+    def handle(self, *args, **options):
+        if options['force']:
+            # Keep the files (they are replaced/cleaned per product), just mark everything stale
+            for product in Product.objects.exclude(image_variants={}).only('id', 'image_variants'):
+                variants = {**product.image_variants, 'source': None}
+                Product.objects.filter(pk=product.pk).update(image_variants=variants)
+
+        self.stdout.write(f"Formats: {', '.join(FORMATS)}. Pending: {pending_products().count()}")
+        total = 0
+        while True:
+            processed = process_pending_images(options['batch_size'])
+            total += processed
+
+            if processed:
+                continue
+            if not options['loop']:
+                break
+
+            close_old_connections()
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} product images."))
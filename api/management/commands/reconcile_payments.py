@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Order
+from api.checkout import mark_paid
+from api.inventory import release_stock
+from core.paystack import Paystack
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconciles pending Paystack orders: marks paid the ones Paystack confirms, "
+        "and cancels (and restocks) the ones abandoned for too long. Run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=10,
+                            help='Only check orders older than this many minutes (default: 10)')
+        parser.add_argument('--expire-after', type=int, default=24,
+                            help='Cancel unpaid orders older than this many hours (default: 24)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without saving')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expire_before = now - timedelta(hours=options['expire_after'])
+        dry_run = options['dry_run']
+
+        pending = Order.objects.filter(
+            payment_method='paystack',
+            status='pending',
+            is_paid=False,
+            created_at__lt=now - timedelta(minutes=options['min_age']),
+        ).order_by('created_at').prefetch_related('payment_attempts')
+
+        paystack = Paystack()
+        paid = cancelled = 0
+
+        for order in pending.iterator(chunk_size=200):
+            # 1. Payment went through but the customer never hit /checkout/verify/
+            #    (on any attempt: a retried order may be paid on the first one)
+            reference = next((
+                attempt.reference for attempt in order.payment_attempts.all()
+                if paystack.verify_transaction(attempt.reference)['status']
+            ), None)
+            if reference:
+                paid += 1
+                if not dry_run:
+                    mark_paid(order, reference)
+                    order.save()
+                continue
+
+            # 2. Abandoned: give the reserved units back to the catalog
+            if order.created_at < expire_before:
+                cancelled += 1
+                if not dry_run:
+                    with transaction.atomic():
+                        order.status = 'cancelled'
+                        order.save()
+                        release_stock(order)
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Reconciled payments: {paid} marked paid, {cancelled} cancelled."
+        ))
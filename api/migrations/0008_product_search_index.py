@@ -0,0 +1,120 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# SQLite FTS5 index over product name, description and category name.
+# Triggers keep it in sync with every write path (save(), bulk ops, raw SQL).
+# Other databases skip this and keep using SearchFilter's icontains lookups.
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS api_product_fts USING fts5(
+        name, description, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    # Name matches outrank category matches, which outrank description matches
+    "INSERT INTO api_product_fts (api_product_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 3.0)')",
+    """
+    INSERT INTO api_product_fts (rowid, name, description, category)
+    SELECT p.id, p.name, p.description, c.name
+    FROM api_product p JOIN api_category c ON c.id = p.category_id
+    """,
+]
+
+# SQLite drops a table's triggers whenever Django rebuilds it (AddField with a
+# default, AlterField...), and refuses the rebuild while api_category's trigger
+# points at api_product. Later migrations that rebuild api_product run
+# drop_search_triggers before and create_search_triggers after (see 0009).
+TRIGGER_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS api_product_fts_insert AFTER INSERT ON api_product BEGIN
+        INSERT INTO api_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM api_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_product_fts_update
+    AFTER UPDATE OF name, description, category_id ON api_product BEGIN
+        DELETE FROM api_product_fts WHERE rowid = old.id;
+        INSERT INTO api_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM api_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_product_fts_delete AFTER DELETE ON api_product BEGIN
+        DELETE FROM api_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_category_fts_update AFTER UPDATE OF name ON api_category BEGIN
+        UPDATE api_product_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM api_product WHERE category_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGER_SQL = [
+    'DROP TRIGGER IF EXISTS api_category_fts_update',
+    'DROP TRIGGER IF EXISTS api_product_fts_delete',
+    'DROP TRIGGER IF EXISTS api_product_fts_update',
+    'DROP TRIGGER IF EXISTS api_product_fts_insert',
+]
+
+DROP_SQL = DROP_TRIGGER_SQL + ['DROP TABLE IF EXISTS api_product_fts']
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL + TRIGGER_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TRIGGER_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_TRIGGER_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_alter_order_created_at_alter_order_status_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='api.product')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('category', models.TextField()),
+                ('document', models.TextField(db_column='api_product_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'api_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
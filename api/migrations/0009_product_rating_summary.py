@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 07:19
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+# Adding NOT NULL columns makes SQLite rebuild api_product: lift the FTS
+# triggers around the rebuild (the index rows themselves are untouched).
+search_index = import_module('api.migrations.0008_product_search_index')
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    Review = apps.get_model('api', 'Review')
+    summaries = Review.objects.values('product_id').annotate(avg=Avg('rating'), count=Count('id'))
+    for row in summaries:
+        Product.objects.filter(pk=row['product_id']).update(
+            rating_avg=round(row['avg'], 2), review_count=row['count']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.drop_search_triggers, search_index.create_search_triggers),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(search_index.create_search_triggers, search_index.drop_search_triggers),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
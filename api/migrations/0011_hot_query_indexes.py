@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 07:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def blank_references_to_null(apps, schema_editor):
+    # Several orders may have '' (no payment started); only NULLs may repeat
+    Order = apps.get_model('api', 'Order')
+    Order.objects.filter(payment_reference='').update(payment_reference=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_sales_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(blank_references_to_null, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='payment_reference',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['-created_at', '-id'], name='product_available_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock'], name='product_stock_idx'),
+        ),
+    ]
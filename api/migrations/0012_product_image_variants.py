@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 15:02
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Adding a NOT NULL column makes SQLite rebuild api_product (see 0009)
+search_index = import_module('api.migrations.0008_product_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.drop_search_triggers, search_index.create_search_triggers),
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(search_index.create_search_triggers, search_index.drop_search_triggers),
+    ]
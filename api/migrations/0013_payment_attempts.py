@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def record_existing_references(apps, schema_editor):
+    # Orders already sent to Paystack: their one reference is their first attempt
+    Order = apps.get_model('api', 'Order')
+    PaymentAttempt = apps.get_model('api', 'PaymentAttempt')
+    PaymentAttempt.objects.bulk_create(
+        PaymentAttempt(order_id=order_id, reference=reference)
+        for order_id, reference in Order.objects.filter(
+            payment_reference__isnull=False,
+        ).values_list('id', 'payment_reference').iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_attempts', to='api.order')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.RunPython(record_existing_references, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,48 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.text import slugify
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+class TrackedFieldsMixin:
+    """
+    Remembers the database value of TRACKED_FIELDS on load and save, so
+    signal handlers can tell what a save changed without re-reading the row.
+    """
+    TRACKED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def remember_loaded_values(self):
+        """ Marks the current tracked values as what the database holds. """
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
+    def loaded_value(self, field):
+        """
+        `field` as last read from / written to the database, so a save can
+        tell what changed without re-reading the row. KeyError if unknown
+        (unsaved instance, or the field was deferred).
+        """
+        return self.__dict__.get('_loaded_values', {})[field]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save receivers have seen the old values by now
+        update_fields = kwargs.get('update_fields')
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for name in self.TRACKED_FIELDS:
+            if update_fields is None or name in update_fields:
+                loaded[name] = getattr(self, name)
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
@@ -20,7 +60,7 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-class Product(models.Model):
+class Product(TrackedFieldsMixin, models.Model):
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True, db_index=True)
@@ -28,11 +68,31 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2) # e.g., 5000.00
     old_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True) # For discounts
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Thumbnails and WebP/AVIF sizes of `image`, rendered in the background (see api/images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     stock = models.PositiveIntegerField(default=0)
     is_available = models.BooleanField(default=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Review summary (denormalized, kept current by api.signals on Review writes)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    review_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Storefront listing: WHERE is_available ORDER BY -created_at, -id (keyset pages).
+            # Partial, because Django writes the filter as a bare `WHERE is_available`,
+            # which can't seek into an (is_available, ...) index but does match this condition.
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_available=True),
+                         name='product_available_newest_idx'),
+            # Low / out-of-stock filters (admin, inventory rollup)
+            models.Index(fields=['stock'], name='product_stock_idx'),
+        ]
+
+    # Stock as loaded: the inventory rollup moves by the difference (api/signals.py)
+    TRACKED_FIELDS = ('stock',)
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -40,7 +100,45 @@ class Product(models.Model):
 
     def __str__(self):
         return self.name
+
+    def refresh_rating_summary(self):
+        """ Recomputes rating_avg/review_count from the reviews table. """
+        summary = self.reviews.aggregate(avg=models.Avg('rating'), count=models.Count('id'))
+        self.rating_avg = round(summary['avg'] or 0, 2)
+        self.review_count = summary['count']
+        # .update() so catalog signals (cache bump) don't fire for a rating change
+        Product.objects.filter(pk=self.pk).update(rating_avg=self.rating_avg, review_count=self.review_count)
         
+class ProductSearchIndex(models.Model):
+    """
+    Read-only view of the SQLite FTS5 table `api_product_fts`.
+    The table and its sync triggers are created in migration 0008
+    (SQLite only). Query it through api.search.ProductSearchFilter.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid',
+        related_name='search_index', on_delete=models.DO_NOTHING
+    )
+    name = models.TextField()
+    description = models.TextField()
+    category = models.TextField()
+    # FTS5 hidden columns: `document = query` is a full-table MATCH, `rank` is bm25
+    document = models.TextField(db_column='api_product_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_product_fts'
+
+CART_TOTAL_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+def line_total(prefix=''):
+    """ quantity x product price, computed by the database. """
+    return models.ExpressionWrapper(
+        models.F(f'{prefix}quantity') * models.F(f'{prefix}product__price'),
+        output_field=CART_TOTAL_FIELD
+    )
+
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -51,7 +149,14 @@ class Cart(models.Model):
 
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        # Annotated by api.cart.get_cart(); otherwise one SUM() query
+        if hasattr(self, 'cart_total'):
+            total = self.cart_total
+        else:
+            total = self.items.aggregate(
+                total=Coalesce(models.Sum(line_total()), models.Value(Decimal('0.00')), output_field=CART_TOTAL_FIELD)
+            )['total']
+        return round(total, 2) # SQLite sums in floating point
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
@@ -66,9 +171,41 @@ class CartItem(models.Model):
 
     @property
     def total_price(self):
+        # Annotated by api.cart.get_cart(), no product lookup needed
+        if hasattr(self, 'line_total'):
+            return round(self.line_total, 2)
         return self.quantity * self.product.price
 
-class Order(models.Model):
+class OrderQuerySet(models.QuerySet):
+    def transition(self, status):
+        """
+        Bulk status change for admin actions. Unlike a bare .update(), it
+        runs the same status-change hook as Order.save(): is_paid sync and
+        one bulk INSERT of customer emails. Returns how many orders changed.
+        """
+        from .signals import order_status_changed # signals.py imports this module
+
+        with transaction.atomic():
+            orders = list(self.exclude(status=status).select_related('user'))
+            if not orders:
+                return 0
+
+            updates = {'status': status, 'updated_at': timezone.now()}
+            if status in Order.PAID_STATUSES:
+                updates['is_paid'] = True
+            Order.objects.filter(pk__in=[order.pk for order in orders]).update(**updates)
+
+            previous = {}
+            for order in orders:
+                previous[order.pk] = order.status
+                for field, value in updates.items():
+                    setattr(order, field, value)
+                order.remember_loaded_values()
+
+            order_status_changed.send(sender=Order, orders=orders, previous=previous)
+        return len(orders)
+
+class Order(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending Payment'),
         ('paid', 'Paid'),
@@ -97,15 +234,31 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
     delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='paystack')
-    payment_reference = models.CharField(max_length=100, blank=True, null=True) # The Paystack Ref
+    payment_reference = models.CharField(max_length=100, blank=True, null=True, unique=True) # The Paystack Ref (NULL until payment starts)
     is_paid = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Order history: WHERE user ORDER BY -created_at, -id
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_newest_idx'),
+            # Verified-purchase check: WHERE user AND status = 'delivered'
+            models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+        ]
+
+    # Statuses that imply the money has been received
+    PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
+    # Fields whose database value is remembered on load (see loaded_value)
+    TRACKED_FIELDS = ('status', 'is_paid')
+
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True) # Keep record even if product deleted
@@ -118,6 +271,23 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product_name}"
 
+class PaymentAttempt(models.Model):
+    """
+    One Paystack transaction opened for an order. A retry opens a new one
+    (Paystack refuses a reused reference), but an earlier one may still be
+    paid afterwards: verify and reconcile_payments look at all of them.
+    Order.payment_reference is the latest (or the one that paid).
+    """
+    order = models.ForeignKey(Order, related_name='payment_attempts', on_delete=models.CASCADE)
+    reference = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id'] # Newest first: the likeliest to be paid
+
+    def __str__(self):
+        return f"{self.reference} (Order #{self.order_id})"
+
 class Review(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -136,4 +306,53 @@ class Review(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.rating}* - {self.product.name}"
\ No newline at end of file
+        return f"{self.rating}* - {self.product.name}"
+
+# --- Sales rollups (maintained by api/rollups.py, read by the admin dashboard) ---
+
+class SalesRollup(models.Model):
+    """
+    Orders and order value per hour/day bucket (by created_at) and status.
+    Status changes move the order between rows of its bucket, so the
+    dashboard sums a few rows instead of scanning every order.
+    """
+    PERIOD_CHOICES = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField() # Start of the hour/day (local time)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0) # Sum of total_amount
+
+    class Meta:
+        unique_together = ('period', 'bucket', 'status')
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:00} {self.status}: {self.order_count}"
+
+class ProductSalesRollup(models.Model):
+    """ Units and revenue per product per day, from orders that aren't cancelled. """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='sales_rollups')
+    product_name = models.CharField(max_length=200) # Snapshot, like OrderItem
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'product')
+
+    def __str__(self):
+        return f"{self.day} {self.product_name}: {self.units}"
+
+class InventoryRollup(models.Model):
+    """ Daily low-stock / out-of-stock counts, refreshed whenever stock moves. """
+    day = models.DateField(unique=True)
+    low_stock_count = models.IntegerField(default=0)
+    out_of_stock_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.day}: {self.low_stock_count} low, {self.out_of_stock_count} out"
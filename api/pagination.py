@@ -0,0 +1,47 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the catalog.
+    Pages are fetched with `WHERE created_at < last_seen` instead of OFFSET,
+    so page 500 costs the same as page 1.
+    - Default order: newest first, id breaks ties
+    - Works with ?ordering=price / -price / name / created_at
+    - Searches without ?ordering= come back by relevance (see api/search.py)
+    - Page size: ?page_size=24 (capped at max_page_size)
+    """
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if getattr(view, 'search_ranked', False) and not request.query_params.get('ordering'):
+            return ('search_rank', 'id')
+
+        ordering = super().get_ordering(request, queryset, view)
+
+        # Always finish with the primary key so rows sharing a price/name
+        # come back in a stable order across pages.
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            tie_breaker = '-id' if ordering[0].startswith('-') else 'id'
+            ordering = ordering + (tie_breaker,)
+        return ordering
+
+
+class ReviewPagination(PageNumberPagination):
+    """
+    Reviews for one product, newest first (?page=2, ...).
+    Page 1 is also embedded in the product detail response.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+
+
+class OrderPagination(PageNumberPagination):
+    """ A customer's order history, newest first (?page=2, ...). """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
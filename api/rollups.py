@@ -0,0 +1,260 @@
+from contextvars import ContextVar
+
+from django.apps import apps as django_apps
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import OrderItem, Product, SalesRollup, ProductSalesRollup, InventoryRollup
+
+LOW_STOCK_THRESHOLD = 10 # Same cut-off as ProductAdmin's "Low Stock (< 10)"
+
+# Rollup columns that are added up (everything else is a key or a snapshot)
+COUNTER_FIELDS = ('order_count', 'amount', 'units', 'revenue')
+
+# Orders being deleted: their items already left the product rollup in one
+# go (record_order_removal), so the cascaded item deletes skip it
+_removing_orders = ContextVar('removing_orders', default=frozenset())
+
+
+def _add(model, keys, rows):
+    """
+    Adds `rows` (dicts of key, snapshot and counter columns) to a rollup table
+    in ONE statement:
+
+        INSERT ... ON CONFLICT (<keys>) DO UPDATE SET units = units + excluded.units
+
+    New rows are created, existing ones incremented inside the database, so
+    concurrent order writes never lose counts and a 20-line order costs one
+    statement instead of one read + write per line.
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    counters = [field for field in fields if field.name in COUNTER_FIELDS]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(f.column) for f in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))}) "
+        f"ON CONFLICT ({', '.join(quote(model._meta.get_field(k).column) for k in keys)}) DO UPDATE SET "
+        + ', '.join(f"{quote(f.column)} = {table}.{quote(f.column)} + excluded.{quote(f.column)}" for f in counters)
+    )
+    params = [
+        [field.get_db_prep_save(row[field.name], connection) for field in fields]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _buckets(created_at):
+    local = timezone.localtime(created_at)
+    return (
+        ('hour', local.replace(minute=0, second=0, microsecond=0)),
+        ('day', local.replace(hour=0, minute=0, second=0, microsecond=0)),
+    )
+
+
+def _add_order(order, status, sign):
+    _add(SalesRollup, ('period', 'bucket', 'status'), [
+        {'period': period, 'bucket': bucket, 'status': status,
+         'order_count': sign, 'amount': sign * order.total_amount}
+        for period, bucket in _buckets(order.created_at)
+    ])
+
+
+def _add_items(order, items, sign):
+    day = timezone.localtime(order.created_at).date()
+    # One row per product, even if the same product appears on two lines
+    totals = {}
+    for item in items:
+        row = totals.setdefault(item.product_id, {
+            'day': day, 'product': item.product_id, 'product_name': item.product_name,
+            'units': 0, 'revenue': 0,
+        })
+        row['units'] += sign * item.quantity
+        row['revenue'] += sign * item.price * item.quantity
+
+    deleted_product = totals.pop(None, None)
+    _add(ProductSalesRollup, ('day', 'product'), list(totals.values()))
+    if deleted_product:
+        _add_deleted_product(deleted_product)
+
+
+def _add_deleted_product(row):
+    """
+    Lines whose product was deleted. NULLs never conflict in the upsert
+    (each write would add a row), and there is no unique key to give them:
+    deleting products sets many rows to NULL at once. Add to the day's
+    first NULL row instead, or start one.
+    """
+    existing = (
+        ProductSalesRollup.objects.filter(day=row['day'], product__isnull=True)
+        .order_by('pk').values_list('pk', flat=True).first()
+    )
+    if existing is None:
+        ProductSalesRollup.objects.create(day=row['day'], product_name=row['product_name'],
+                                          units=row['units'], revenue=row['revenue'])
+    else:
+        ProductSalesRollup.objects.filter(pk=existing).update(
+            units=F('units') + row['units'], revenue=F('revenue') + row['revenue'],
+        )
+
+
+# --- Write-time hooks (see api/signals.py and place_order) ---
+
+def record_order(order, sign=1):
+    """ +1 on create, -1 on delete. """
+    _add_order(order, order.status, sign)
+
+
+def record_items(order, items, sign=1):
+    """ Units sold; ignored for cancelled orders, which don't count as sales. """
+    if order.status != 'cancelled':
+        _add_items(order, items, sign)
+
+
+def record_order_removal(order):
+    """ pre_delete of an Order: all its lines leave the product rollup at once. """
+    _removing_orders.set(_removing_orders.get() | {order.pk})
+    record_items(order, list(order.items.all()), sign=-1)
+
+
+def record_order_removed(order):
+    """ post_delete of an Order (its lines are gone by now). """
+    _removing_orders.set(_removing_orders.get() - {order.pk})
+    record_order(order, sign=-1)
+
+
+def record_item_removal(item):
+    """ post_delete of a single OrderItem, unless its whole order is going. """
+    if item.order_id not in _removing_orders.get():
+        record_items(item.order, [item], sign=-1)
+
+
+def record_status_changes(orders, previous):
+    """
+    Moves each order from its old status row to the new one. Cancelling
+    takes its units out of the product rollup (and un-cancelling puts
+    them back). Hooked to the order_status_changed signal.
+    """
+    moving = [] # Orders whose units leave/rejoin the product rollup
+    for order in orders:
+        old_status = previous[order.pk]
+        _add_order(order, old_status, -1)
+        _add_order(order, order.status, 1)
+
+        if (old_status == 'cancelled') != (order.status == 'cancelled'):
+            moving.append(order)
+    if not moving:
+        return
+
+    # The lines of every moving order in one query
+    items = {}
+    for item in OrderItem.objects.filter(order__in=moving):
+        items.setdefault(item.order_id, []).append(item)
+    for order in moving:
+        _add_items(order, items.get(order.pk, []), -1 if order.status == 'cancelled' else 1)
+
+
+def _stock_flags(stock):
+    return int(stock < LOW_STOCK_THRESHOLD), int(stock == 0)
+
+
+def record_stock_changes(changes):
+    """
+    Moves today's low/out-of-stock counts by the products that crossed a
+    threshold. `changes` is [(old_stock, new_stock), ...], with None for
+    the old stock of a new product and the new stock of a deleted one.
+    Call it in the transaction that changed the stock, so both commit or
+    roll back together.
+    """
+    low = out = 0
+    for old, new in changes:
+        for stock, sign in ((old, -1), (new, 1)):
+            if stock is not None:
+                is_low, is_out = _stock_flags(stock)
+                low += sign * is_low
+                out += sign * is_out
+    if not (low or out):
+        return # Nothing crossed a threshold: no write at all
+
+    updated = InventoryRollup.objects.filter(day=timezone.localdate()).update(
+        low_stock_count=F('low_stock_count') + low,
+        out_of_stock_count=F('out_of_stock_count') + out,
+    )
+    if not updated:
+        refresh_inventory_rollup() # First change of the day: count a baseline (includes this change)
+
+
+def refresh_inventory_rollup():
+    """
+    Full recount of today's low/out-of-stock products: one pass over the
+    product table. Only for the daily baseline, the dashboard's first
+    visit of the day and rebuild_rollups; stock changes move the counts
+    through record_stock_changes.
+    """
+    counts = Product.objects.aggregate(
+        low=Count('id', filter=Q(stock__lt=LOW_STOCK_THRESHOLD)),
+        out=Count('id', filter=Q(stock=0)),
+    )
+    InventoryRollup.objects.update_or_create(
+        day=timezone.localdate(),
+        defaults={'low_stock_count': counts['low'], 'out_of_stock_count': counts['out']},
+    )
+
+
+
+# --- Full rebuild (manage.py rebuild_rollups, and the initial migration) ---
+
+def rebuild_rollups(apps=django_apps):
+    """
+    Recomputes every rollup from the orders table. Safe to run any time
+    (e.g. after fixing data by hand). `apps` lets migrations pass their
+    historical app registry.
+    """
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    SalesRollup = apps.get_model('api', 'SalesRollup')
+    ProductSalesRollup = apps.get_model('api', 'ProductSalesRollup')
+
+    with transaction.atomic():
+        SalesRollup.objects.all().delete()
+        ProductSalesRollup.objects.all().delete()
+
+        # 1. Orders and amounts per hour/day and status
+        sales = []
+        for period, trunc in (('hour', TruncHour), ('day', TruncDay)):
+            rows = (
+                Order.objects.annotate(bucket=trunc('created_at'))
+                .values('bucket', 'status')
+                .annotate(order_count=Count('id'), amount=Sum('total_amount'))
+                .order_by()
+            )
+            sales.extend(SalesRollup(period=period, **row) for row in rows)
+        SalesRollup.objects.bulk_create(sales, batch_size=500)
+
+        # 2. Units and revenue per product per day
+        rows = (
+            OrderItem.objects.exclude(order__status='cancelled')
+            .annotate(day=TruncDate('order__created_at'))
+            .values('day', 'product_id')
+            .annotate(
+                name=Max('product_name'),
+                units=Sum('quantity'),
+                revenue=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField())),
+            )
+            .order_by()
+        )
+        ProductSalesRollup.objects.bulk_create([
+            ProductSalesRollup(day=row['day'], product_id=row['product_id'], product_name=row['name'],
+                               units=row['units'], revenue=row['revenue'])
+            for row in rows
+        ], batch_size=500)
+
+    if apps is django_apps:
+        refresh_inventory_rollup()
+    return len(sales)
@@ -0,0 +1,68 @@
+import re
+
+from django.db import connections
+from django.db.models import F
+from rest_framework.filters import SearchFilter
+
+FTS_TABLE = 'api_product_fts'
+
+# Letters/digits only: everything else would be FTS5 query syntax
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(terms):
+    """
+    Turns ['iph', 'pro max'] into '"iph"* "pro"* "max"*'.
+    Every word must match (implicit AND) and the last letters typed
+    can be incomplete (prefix match), which suits search-as-you-type.
+    """
+    tokens = []
+    for term in terms:
+        tokens.extend(TOKEN_RE.findall(term))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+# Aliases where the index is known to exist (checked once per process)
+_fts_ready = set()
+
+
+def fts_available(alias='default'):
+    if alias in _fts_ready:
+        return True
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return False
+    _fts_ready.add(alias)
+    return True
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    ?search= backed by the SQLite FTS5 index (see ProductSearchIndex).
+    - Prefix matching: ?search=sams finds "Samsung"
+    - Relevance: results are annotated with `search_rank` (bm25, lower is better)
+      and ordered by it unless the client asks for ?ordering=
+    Falls back to DRF's icontains search on databases without the index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not fts_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        match = build_match_query(terms)
+        if not match:
+            return queryset.none() # Only punctuation (?search=***): like icontains, nothing matches
+
+        # Tells ProductCursorPagination to page by relevance
+        view.search_ranked = True
+
+        # JOIN against the index (FTS drives the scan, products are looked up
+        # by primary key) and carry the bm25 score along for ordering
+        return queryset.filter(search_index__document=match).annotate(
+            search_rank=F('search_index__rank')
+        )
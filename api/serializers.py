@@ -4,8 +4,8 @@ from core.models import Profile
 from .models import Product, Category
 from .models import Cart, CartItem
 from .models import Order, OrderItem
-from django.db.models import Avg
 from .models import Review
+from .images import srcsets, variant_urls
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -51,25 +51,43 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'slug']
 
+class ImageVariantsField(serializers.Field):
+    """
+    Resized WebP/AVIF copies of a product's image (see api/images.py):
+    {"sizes": {"thumb": {"webp": url, ...}, ...}, "srcset": {"avif": "...", "webp": "..."}}
+    Empty until the background worker has rendered them; `image` stays the fallback.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, product):
+        request = self.context.get('request')
+        urls = variant_urls(product, request.build_absolute_uri if request else None)
+        return {'sizes': urls, 'srcset': srcsets(product, urls)}
+
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'description', 'price', 
-            'old_price', 'image', 'stock', 'category', 'category_name'
+            'old_price', 'image', 'image_variants', 'stock', 'category', 'category_name'
         ]
 
 class CartItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
     product_image = serializers.ImageField(source='product.image', read_only=True)
+    product_image_variants = ImageVariantsField(source='product')
     subtotal = serializers.DecimalField(source='total_price', max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
-        fields = ['id', 'product', 'product_name', 'product_price', 'product_image', 'quantity', 'subtotal']
+        fields = ['id', 'product', 'product_name', 'product_price', 'product_image', 'product_image_variants', 'quantity', 'subtotal']
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
@@ -84,13 +102,24 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['product_name', 'price', 'quantity']
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Order history rows: no nested items. `item_count` is annotated by
+    OrderListView (COUNT over order items), so a page is one query.
+    """
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'total_amount', 'payment_method', 'is_paid', 'created_at', 'item_count']
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'status', 'total_amount', 'created_at', 'items', 'full_name', 'address', 'city', 'state', 'phone']
-        read_only_fields = ['id', 'status', 'total_amount', 'created_at', 'items']
+        fields = ['id', 'status', 'total_amount', 'delivery_fee', 'payment_method', 'is_paid', 'created_at', 'items', 'full_name', 'address', 'city', 'state', 'phone']
+        read_only_fields = ['id', 'status', 'total_amount', 'delivery_fee', 'payment_method', 'is_paid', 'created_at', 'items']
 
 
 
@@ -104,24 +133,23 @@ class ReviewSerializer(serializers.ModelSerializer):
 class ProductDetailSerializer(serializers.ModelSerializer):
     """
     Rich serializer for the single product page.
-    Includes average rating and the actual reviews list.
+    Includes average rating and the latest page of reviews.
+    Rating numbers come from the denormalized Product columns and reviews
+    from the `recent_reviews` prefetch (see ProductDetailView), so the page
+    costs the same number of queries however many reviews a product has.
     """
     category_name = serializers.CharField(source='category.name', read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
+    reviews = ReviewSerializer(source='recent_reviews', many=True, read_only=True)
     average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'description', 'price', 
-            'old_price', 'image', 'stock', 'category_name',
+            'old_price', 'image', 'image_variants', 'stock', 'category_name',
             'reviews', 'average_rating', 'review_count'
         ]
 
     def get_average_rating(self, obj):
-        avg = obj.reviews.aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else 0
-
-    def get_review_count(self, obj):
-        return obj.reviews.count()
\ No newline at end of file
+        return round(float(obj.rating_avg), 1)
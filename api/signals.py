@@ -1,25 +1,131 @@
-from django.db.models.signals import pre_save
-from django.dispatch import receiver
-from .models import Order
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver, Signal
+from .models import Order, OrderItem, Product, Category, Review
+from .cache import bump_catalog_version_on_commit
+from . import images, rollups
 from core.email_service import EmailService
 
+# Sent after one or more orders moved to a new status, whether through
+# Order.save() or Order.objects.filter(...).transition(status).
+# Args: orders (list of Order, already saved), previous ({order.pk: old status})
+order_status_changed = Signal()
+
+
 @receiver(pre_save, sender=Order)
-def order_status_sync_and_email(sender, instance, **kwargs):
+def order_status_sync(sender, instance, update_fields=None, **kwargs):
     if not instance.pk:
         return # New order
 
+    # 1. AUTO-SYNC LOGIC: If status implies payment, set is_paid = True
+    if instance.status in Order.PAID_STATUSES:
+        instance.is_paid = True
+
+    # Instances not loaded through the ORM (e.g. Order(pk=...)) have nothing
+    # to diff against: read the stored status once (the only extra SELECT)
+    if '_loaded_values' not in instance.__dict__ or 'status' not in instance._loaded_values:
+        stored = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        if stored is not None:
+            instance.__dict__.setdefault('_loaded_values', {})['status'] = stored
+
+
+@receiver(post_save, sender=Order)
+def order_status_transition(sender, instance, created, update_fields=None, **kwargs):
+    # 2. Status changed? Diff against the value remembered at load time (no query)
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
     try:
-        old_order = Order.objects.get(pk=instance.pk)
-        
-        # 1. AUTO-SYNC LOGIC: If status implies payment, set is_paid = True
-        paid_statuses = ['paid', 'processing', 'shipped', 'delivered']
-        if instance.status in paid_statuses:
-            instance.is_paid = True
-
-        # 2. EMAIL LOGIC: If status changed, send email
-        if old_order.status != instance.status:
-            print(f"Status changed from {old_order.status} to {instance.status}")
-            EmailService.send_order_status_email(instance)
-            
-    except Order.DoesNotExist:
-        pass
\ No newline at end of file
+        old_status = instance.loaded_value('status')
+    except KeyError:
+        return
+    if old_status != instance.status:
+        order_status_changed.send(sender=Order, orders=[instance], previous={instance.pk: old_status})
+
+
+@receiver(order_status_changed)
+def send_order_status_emails(sender, orders, **kwargs):
+    # EMAIL LOGIC: one outbox INSERT however many orders changed
+    EmailService.send_order_status_emails(orders)
+
+
+# --- Dashboard rollups (api/rollups.py) ---
+
+@receiver(order_status_changed)
+def update_status_rollups(sender, orders, previous, **kwargs):
+    rollups.record_status_changes(orders, previous)
+
+
+@receiver(post_save, sender=Order)
+def add_order_rollup(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_order(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_items_rollup(sender, instance, **kwargs):
+    # While the order row is still there: one read for all its lines
+    rollups.record_order_removal(instance)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_rollup(sender, instance, **kwargs):
+    rollups.record_order_removed(instance)
+
+
+@receiver(post_save, sender=OrderItem)
+def add_item_rollup(sender, instance, created, **kwargs):
+    # Single saves (e.g. the admin inline). place_order's bulk_create records its own.
+    if created:
+        rollups.record_items(instance.order, [instance])
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_item_rollup(sender, instance, **kwargs):
+    rollups.record_item_removal(instance)
+
+
+@receiver(post_save, sender=Product)
+def update_inventory_rollup(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'stock' not in update_fields:
+        return
+    if created:
+        rollups.record_stock_changes([(None, instance.stock)])
+        return
+    try:
+        old_stock = instance.loaded_value('stock')
+    except KeyError:
+        rollups.refresh_inventory_rollup() # Stock was deferred: nothing to diff against
+        return
+    rollups.record_stock_changes([(old_stock, instance.stock)])
+
+
+@receiver(post_delete, sender=Product)
+def remove_inventory_rollup(sender, instance, **kwargs):
+    rollups.record_stock_changes([(instance.stock, None)])
+
+
+@receiver(post_save, sender=Product)
+def render_image_variants(sender, instance, **kwargs):
+    # New/changed upload: thumbnails and WebP/AVIF are made off the request thread
+    images.queue_image_variants(instance)
+
+
+@receiver(post_delete, sender=Product)
+def delete_image_variants(sender, instance, **kwargs):
+    transaction.on_commit(lambda: images.delete_variant_files(instance.image_variants or {}))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    # Price/stock edits (e.g. list_editable in ProductAdmin) show up on the next request
+    bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_product_rating_summary(sender, instance, **kwargs):
+    # Keeps Product.rating_avg/review_count current for ProductDetailSerializer
+    Product(pk=instance.product_id).refresh_rating_summary()
@@ -1,3 +1,1019 @@
-from django.test import TestCase
+import gc
+import io
+import itertools
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.text import slugify
+from drf_spectacular.settings import spectacular_settings
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import metrics
+from core.delivery_zones import invalidate_zone_table
+from core.models import DeliveryZone, EmailLog
+from core.paystack import AsyncPaystack, Paystack
+from PIL import Image
+from . import async_views, images
+from .cache import catalog_cache_stats
+from . import urls as api_urls
+from .models import Cart, CartItem, Category, Order, OrderItem, PaymentAttempt, Product, Review
+from .cart import claim_idempotency_key
+from .checkout import CheckoutError, place_order, start_paystack_payment
+from .inventory import release_stock, reserve_stock
+from .models import InventoryRollup, ProductSalesRollup, SalesRollup
+from .rollups import rebuild_rollups, refresh_inventory_rollup
+from .serializers import ProductSerializer
+from .views import OrderListView, ProductListView
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite's")
+class QueryPlanTests(TestCase):
+    """
+    The hot lookups must be answered from an index (SEARCH ... USING INDEX),
+    never by scanning the table, so they stay flat as the tables grow.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='x')
+
+    def assertUsesIndex(self, queryset, index, table):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index}", plan.replace('COVERING INDEX', 'INDEX'), plan)
+        # "SCAN <table>" with no index at all means a full table scan
+        for line in plan.splitlines():
+            if f"SCAN {table}" in line:
+                self.assertIn("USING", line, plan)
+        self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_payment_reference_lookup(self):
+        # PaymentVerifyView / payment_verify_view
+        self.assertUsesIndex(
+            Order.objects.filter(payment_reference='T123'),
+            'sqlite_autoindex_api_order', 'api_order',
+        )
+
+    def test_payment_reference_is_unique(self):
+        self.assertTrue(Order._meta.get_field('payment_reference').unique)
+
+    def test_order_history(self):
+        request = RequestFactory().get('/api/orders/')
+        request.user = self.user
+        view = OrderListView()
+        view.setup(request)
+        view.request = view.initialize_request(request)
+        view.request.user = self.user
+
+        self.assertUsesIndex(view.get_queryset()[:20], 'order_user_newest_idx', 'api_order')
+
+    def test_verified_purchase_check(self):
+        # ProductReviewsView.perform_create
+        queryset = OrderItem.objects.filter(order__user=self.user, order__status='delivered', product_id=1)
+        self.assertUsesIndex(queryset, 'order_user_status_idx', 'api_order')
+
+    def test_storefront_listing(self):
+        queryset = ProductListView.queryset.order_by('-created_at', '-id')
+        self.assertUsesIndex(queryset[:24], 'product_available_newest_idx', 'api_product')
+        # Later keyset pages seek into the same index
+        self.assertUsesIndex(
+            queryset.filter(created_at__lt='2026-01-01T00:00:00Z')[:24],
+            'product_available_newest_idx', 'api_product',
+        )
+
+    def test_low_stock_filters(self):
+        self.assertUsesIndex(Product.objects.filter(stock__lt=10, stock__gt=0), 'product_stock_idx', 'api_product')
+        self.assertUsesIndex(Product.objects.filter(stock=0), 'product_stock_idx', 'api_product')
+
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'cursor-pages'}})
+class ProductCursorPaginationTests(TestCase):
+    """ The catalog's infinite scroll: cursor pages by -created_at, -id. """
+
+    def setUp(self):
+        cache.clear() # Catalog pages are cached per URL
+        category = Category.objects.create(name='Lamps', slug='lamps')
+        products = [
+            Product.objects.create(category=category, name=f'Lamp {i}', slug=f'lamp-{i}',
+                                   description='', price=Decimal('10.00'), stock=5)
+            for i in range(9)
+        ]
+        # A bulk import: most rows share one created_at, only the id orders them
+        stamp = timezone.now()
+        Product.objects.filter(pk__in=[p.pk for p in products[1:8]]).update(created_at=stamp)
+        Product.objects.filter(pk=products[0].pk).update(created_at=stamp - timedelta(days=1))
+        Product.objects.filter(pk=products[8].pk).update(created_at=stamp + timedelta(days=1))
+        self.newest_first = [products[8].pk] + [p.pk for p in reversed(products[1:8])] + [products[0].pk]
+
+    def walk(self, url, link='next'):
+        """ Follows `link` from url: ([ids of each page], the last response). """
+        pages = []
+        while True:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([product['id'] for product in response.json()['results']])
+            if not response.json()[link]:
+                return pages, response
+            url = response.json()[link]
+
+    def test_pages_follow_created_at_then_id(self):
+        pages, _ = self.walk(api_url('product_list') + '?page_size=2')
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 2, 1])
+        seen = [pk for page in pages for pk in page]
+        self.assertEqual(seen, self.newest_first) # No repeats, no skips across the tied rows
+
+    def test_previous_links_walk_back_over_ties(self):
+        forward, last = self.walk(api_url('product_list') + '?page_size=4')
+        back, _ = self.walk(last.json()['previous'], link='previous')
+        self.assertEqual(back, forward[-2::-1])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'catalog-cache'}})
+class CatalogCacheTests(TestCase):
+    """ Cached product lists: hits are reads only, catalog edits invalidate them. """
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.category = Category.objects.create(name='Pens', slug='pens')
+        self.product = Product.objects.create(category=self.category, name='Pen', slug='pen',
+                                              description='', price=Decimal('3.00'), stock=5)
+
+    def get_list(self):
+        response = self.client.get(api_url('product_list'))
+        return response['X-Catalog-Cache'], response.json()['results']
+
+    def assertInvalidatedBy(self, save):
+        self.get_list()
+        self.assertEqual(self.get_list()[0], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True): # The version bump waits for the commit
+            save()
+        state, results = self.get_list()
+        self.assertEqual(state, 'MISS')
+        return results
+
+    def test_product_save_invalidates_list(self):
+        self.product.price = Decimal('4.00')
+        results = self.assertInvalidatedBy(self.product.save)
+        self.assertEqual(results[0]['price'], '4.00')
+
+    def test_category_save_invalidates_list(self):
+        self.category.name = 'Pencils'
+        self.assertInvalidatedBy(self.category.save)
+
+    @mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', {'anon': None, 'user': None}) # They write too
+    def test_hit_writes_nothing_to_the_cache(self):
+        self.get_list()
+        with mock.patch.object(LocMemCache, 'incr') as incr, mock.patch.object(LocMemCache, 'set') as set_:
+            self.assertEqual(self.get_list()[0], 'HIT')
+        incr.assert_not_called()
+        set_.assert_not_called()
+        self.assertEqual(catalog_cache_stats()['hits'], 1)
+        self.assertEqual(catalog_cache_stats()['misses'], 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'search'}})
+class ProductSearchTests(TestCase):
+    """ ?search= on the FTS5 index: prefixes, bm25 ranking, trigger sync, cursor pages. """
+
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(name='Phones', slug='phones')
+        self.lighting = Category.objects.create(name='Lighting', slug='lighting')
+        self.galaxy = self.product('Samsung Galaxy S24', self.phones, 'Flagship phone')
+        self.case = self.product('Rugged Case', self.phones, 'Fits the Samsung Galaxy')
+        self.lamp = self.product('Desk Lamp', self.lighting, 'LED, warm white')
+
+    def product(self, name, category, description=''):
+        return Product.objects.create(category=category, name=name, slug=slugify(name),
+                                      description=description, price=Decimal('10.00'), stock=5)
+
+    def search(self, term, **params):
+        response = self.client.get(api_url('product_list'), {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('galaxy s24'), [self.galaxy.pk])
+        self.assertEqual(self.search('lamp phone'), [])
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(self.search('desk la'), [self.lamp.pk])
+        self.assertEqual(set(self.search('sams')), {self.galaxy.pk, self.case.pk})
+
+    def test_name_matches_outrank_description_matches(self):
+        self.assertEqual(self.search('samsung'), [self.galaxy.pk, self.case.pk])
+        # ?ordering= takes over from relevance
+        self.assertEqual(self.search('samsung', ordering='name'), [self.case.pk, self.galaxy.pk])
+
+    def test_category_name_is_searchable(self):
+        self.assertEqual(self.search('lighting'), [self.lamp.pk])
+
+    def test_index_follows_renames(self):
+        with self.captureOnCommitCallbacks(execute=True): # Catalog cache version bumps
+            self.lamp.name = 'Floor Light'
+            self.lamp.save()
+            self.lighting.name = 'Home Decor'
+            self.lighting.save()
+        self.assertEqual(self.search('desk'), [])
+        self.assertEqual(self.search('floor'), [self.lamp.pk])
+        self.assertEqual(self.search('lighting'), [])
+        self.assertEqual(self.search('decor'), [self.lamp.pk])
+
+    def test_punctuation_only_matches_nothing(self):
+        self.assertEqual(self.search('***'), [])
+
+    def test_ranked_results_page_without_repeats(self):
+        for i in range(5):
+            self.product(f'Galaxy Buds {i}', self.phones)
+        everything = self.search('galaxy')
+        self.assertEqual(len(everything), 7)
+
+        pages = []
+        response = self.client.get(api_url('product_list'), {'search': 'galaxy', 'page_size': 2})
+        while True:
+            pages.extend(product['id'] for product in response.json()['results'])
+            url = response.json()['next']
+            if not url:
+                break
+            response = self.client.get(url)
+        self.assertEqual(pages, everything)
+
+# --- Endpoint benchmarks ---
+# Every route in api/urls.py is called BENCH_ROUNDS times against a store
+# seeded at BENCH_SCALE, and must stay within its budget:
+#   queries: max SQL queries in one call (an N+1 blows past it as the
+#            seeded carts/orders/reviews grow with the scale)
+#   p99_ms:  99th percentile wall time    } budgets are for BENCH_SCALE=1 and
+#   peak_kb: peak Python allocations      } grow linearly with it
+#            (tracemalloc) during one call
+# Wall time depends on the machine, so p99_ms is only asserted with
+# BENCH_LATENCY=1 (a quiet, known box); queries and memory always are.
+# BENCH_LATENCY=1 BENCH_SCALE=10 python manage.py test api.tests.EndpointBenchmarkTests
+# BENCH_REPORT=bench.json writes the measurements, to track them per commit.
+
+BENCH_SCALE = int(os.getenv('BENCH_SCALE', 1))
+BENCH_ROUNDS = int(os.getenv('BENCH_ROUNDS', 10))
+BENCH_REPORT = os.getenv('BENCH_REPORT')
+BENCH_LATENCY = os.getenv('BENCH_LATENCY') == '1'
+
+BUDGETS = {
+    # Auth
+    'token_obtain_pair': {'queries': 1, 'p99_ms': 50, 'peak_kb': 512},
+    'token_refresh': {'queries': 1, 'p99_ms': 50, 'peak_kb': 256},
+    'auth_register': {'queries': 7, 'p99_ms': 100, 'peak_kb': 512},
+    'auth_logout': {'queries': 1, 'p99_ms': 50, 'peak_kb': 256},
+    'auth_me': {'queries': 1, 'p99_ms': 50, 'peak_kb': 256},
+    'user_profile': {'queries': 2, 'p99_ms': 50, 'peak_kb': 256},
+    'user_profile PUT': {'queries': 3, 'p99_ms': 50, 'peak_kb': 256},
+    # Catalog
+    'product_list': {'queries': 1, 'p99_ms': 50, 'peak_kb': 512},
+    'product_detail_full': {'queries': 2, 'p99_ms': 100, 'peak_kb': 512},
+    'create_review': {'queries': 2, 'p99_ms': 50, 'peak_kb': 256},
+    'create_review POST': {'queries': 7, 'p99_ms': 100, 'peak_kb': 256},
+    'category_list': {'queries': 1, 'p99_ms': 50, 'peak_kb': 256},
+    'delivery_zones': {'queries': 1, 'p99_ms': 50, 'peak_kb': 256},
+    # Cart and checkout
+    'cart_detail': {'queries': 3, 'p99_ms': 100, 'peak_kb': 512},
+    'cart_detail POST': {'queries': 7, 'p99_ms': 100, 'peak_kb': 512},
+    'cart_item_action PATCH': {'queries': 5, 'p99_ms': 100, 'peak_kb': 512},
+    'cart_item_action DELETE': {'queries': 5, 'p99_ms': 100, 'peak_kb': 512},
+    'cart_batch': {'queries': 8, 'p99_ms': 100, 'peak_kb': 512},
+    'checkout': {'queries': 12, 'p99_ms': 150, 'peak_kb': 1024}, # Incl. the new stock of the cart's products (inventory rollup) and the PaymentAttempt
+    'payment_verify': {'queries': 6, 'p99_ms': 100, 'peak_kb': 256},
+    # Orders
+    'order_list': {'queries': 3, 'p99_ms': 100, 'peak_kb': 512},
+    'order_list ?expand=items': {'queries': 4, 'p99_ms': 150, 'peak_kb': 1024},
+    'order_detail': {'queries': 3, 'p99_ms': 100, 'peak_kb': 256},
+    'order_payment': {'queries': 4, 'p99_ms': 50, 'peak_kb': 256}, # Incl. the PaymentAttempt
+    'admin_dashboard': {'queries': 9, 'p99_ms': 150, 'peak_kb': 1536},
+    # API docs (schema generation walks every view, no database)
+    'schema': {'queries': 0, 'p99_ms': 500, 'peak_kb': 4096},
+    'swagger-ui': {'queries': 0, 'p99_ms': 50, 'peak_kb': 256},
+    'redoc': {'queries': 0, 'p99_ms': 50, 'peak_kb': 256},
+}
+
+_references = itertools.count()
+
+
+def api_url(name, *args):
+    # Resolved against api/urls.py alone: web/urls.py reuses names like 'checkout'
+    return '/api' + reverse(name, urlconf=api_urls, args=args)
+
+
+def fake_initialize(self, email, amount, order_id):
+    reference = f"BENCH-{order_id}-{next(_references)}"
+    return {'status': True, 'auth_url': f"https://checkout.paystack.test/{reference}",
+            'access_code': reference, 'reference': reference}
+
+
+def fake_verify(self, reference):
+    return {'status': True, 'amount': 0}
+
+
+def seed_store(scale=1):
+    """
+    Synthetic store sized by `scale`: categories, products, zones, reviews,
+    one customer with a full cart and order history, and a staff user.
+    Uses bulk inserts, then rebuilds the denormalized data those skip.
+    """
+    # 1. Catalog
+    categories = Category.objects.bulk_create([
+        Category(name=f"Category {i}", slug=f"category-{i}") for i in range(5)
+    ])
+    products = Product.objects.bulk_create([
+        Product(category=categories[i % 5], name=f"Product {i}", slug=f"product-{i}",
+                description=f"Synthetic product {i}", price=Decimal(1000 + i), stock=1_000_000)
+        for i in range(40 * scale)
+    ])
+    DeliveryZone.objects.bulk_create([
+        DeliveryZone(state=f"State {i}", fee=1000 + i * 100) for i in range(10)
+    ])
+
+    # 2. People
+    customer = User.objects.create_user('customer', 'customer@example.com', 'bench-pass')
+    customer.profile.state = 'State 1'
+    customer.profile.save()
+    staff = User.objects.create_user('staff', 'staff@example.com', 'bench-pass', is_staff=True)
+    reviewers = User.objects.bulk_create([
+        User(username=f"reviewer{i}", email=f"reviewer{i}@example.com") for i in range(15 * scale)
+    ])
+
+    # 3. Reviews on the first product (more than one page)
+    featured = products[0]
+    Review.objects.bulk_create([
+        Review(product=featured, user=user, rating=1 + i % 5, comment="Synthetic review")
+        for i, user in enumerate(reviewers)
+    ])
+    featured.refresh_rating_summary()
+
+    # 4. A full cart
+    cart = Cart.objects.create(user=customer)
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=1 + i % 3)
+        for i, product in enumerate(products[1:1 + 10 * scale])
+    ])
+
+    # 5. Order history: 5 lines each, every third one delivered
+    orders = Order.objects.bulk_create([
+        Order(user=customer, full_name='Bench Customer', address='1 Test Road', city='Kano',
+              state='State 1', phone='0800', total_amount=Decimal('5000.00'),
+              status='delivered' if i % 3 == 0 else 'pending', is_paid=i % 3 == 0,
+              payment_reference=f"BENCH-SEED-{i}" if i % 3 else None)
+        for i in range(25 * scale)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, product_name=product.name, price=product.price, quantity=1)
+        for order in orders for product in products[1:6]
+    ])
+    PaymentAttempt.objects.bulk_create([
+        PaymentAttempt(order=order, reference=order.payment_reference) for order in orders if order.payment_reference
+    ])
+    rebuild_rollups()
+    invalidate_zone_table()
+
+    return {'customer': customer, 'staff': staff, 'products': products, 'cart': cart, 'orders': orders}
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}},
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], # Measure the view, not PBKDF2
+)
+@mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', {'anon': None, 'user': None, 'burst': None})
+@mock.patch.object(Paystack, 'initialize_transaction', fake_initialize)
+@mock.patch.object(Paystack, 'verify_transaction', fake_verify)
+@mock.patch.object(spectacular_settings, 'DISABLE_ERRORS_AND_WARNINGS', True) # "unable to guess serializer" noise
+class EndpointBenchmarkTests(TestCase):
+    """ Query, latency and memory budgets for every API route (see BUDGETS). """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = seed_store(BENCH_SCALE)
+
+    def setUp(self):
+        customer = self.store['customer']
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(customer).access_token}")
+        self.anon = APIClient()
+        self.staff = APIClient()
+        self.staff.force_login(self.store['staff'])
+        self.refresh = str(RefreshToken.for_user(customer))
+
+    def cases(self):
+        """ (label, client, method, url, body) for every route in api/urls.py. """
+        products = self.store['products']
+        featured, unreviewed = products[0], products[-1]
+        order = self.store['orders'][1] # pending, so it can be paid
+        item = self.store['cart'].items.first()
+        checkout = {'full_name': 'Bench Customer', 'address': '1 Test Road', 'city': 'Kano',
+                    'state': 'State 1', 'phone': '0800', 'payment_method': 'paystack'}
+        return [
+            ('token_obtain_pair', self.anon, 'post', api_url('token_obtain_pair'),
+             {'username': 'customer', 'password': 'bench-pass'}),
+            ('token_refresh', self.anon, 'post', api_url('token_refresh'), {'refresh': self.refresh}),
+            ('auth_register', self.anon, 'post', api_url('auth_register'),
+             {'username': 'newcomer', 'email': 'newcomer@example.com',
+              'password': 'bench-pass', 'confirm_password': 'bench-pass'}),
+            ('auth_logout', self.client, 'post', api_url('auth_logout'), {'refresh': self.refresh}),
+            ('auth_me', self.client, 'get', api_url('auth_me'), None),
+            ('user_profile', self.client, 'get', api_url('user_profile'), None),
+            ('user_profile PUT', self.client, 'put', api_url('user_profile'), {'city': 'Kano'}),
+
+            ('product_list', self.anon, 'get', api_url('product_list'), None),
+            ('product_detail_full', self.anon, 'get', api_url('product_detail_full', featured.slug), None),
+            ('create_review', self.anon, 'get', api_url('create_review', featured.id), None),
+            ('create_review POST', self.client, 'post', api_url('create_review', unreviewed.id),
+             {'rating': 5, 'comment': 'Great'}),
+            ('category_list', self.anon, 'get', api_url('category_list'), None),
+            ('delivery_zones', self.anon, 'get', api_url('delivery_zones'), None),
+
+            ('cart_detail', self.client, 'get', api_url('cart_detail'), None),
+            ('cart_detail POST', self.client, 'post', api_url('cart_detail'),
+             {'product_id': unreviewed.id, 'quantity': 1}),
+            ('cart_item_action PATCH', self.client, 'patch', api_url('cart_item_action', item.id),
+             {'quantity': 3}),
+            ('cart_item_action DELETE', self.client, 'delete', api_url('cart_item_action', item.id), None),
+            ('cart_batch', self.client, 'post', api_url('cart_batch'),
+             {'operations': [{'op': 'add', 'product_id': p.id, 'quantity': 1} for p in products[:5]]}),
+            ('checkout', self.client, 'post', api_url('checkout'), checkout),
+            ('payment_verify', self.anon, 'get', api_url('payment_verify') + f"?reference={order.payment_reference}", None),
+
+            ('order_list', self.client, 'get', api_url('order_list'), None),
+            ('order_list ?expand=items', self.client, 'get', api_url('order_list') + '?expand=items', None),
+            ('order_detail', self.client, 'get', api_url('order_detail', order.id), None),
+            ('order_payment', self.client, 'post', api_url('order_payment', order.id), None),
+            ('admin_dashboard', self.staff, 'get', api_url('admin_dashboard'), None),
+
+            ('schema', self.anon, 'get', api_url('schema'), None),
+            ('swagger-ui', self.anon, 'get', api_url('swagger-ui'), None),
+            ('redoc', self.anon, 'get', api_url('redoc'), None),
+        ]
+
+    def call(self, client, method, url, body):
+        """ One request, rolled back afterwards so every round sees the seeded store. """
+        with transaction.atomic():
+            response = getattr(client, method)(url, body, format='json') if body else getattr(client, method)(url)
+            transaction.set_rollback(True)
+        return response
+
+    @staticmethod
+    def count_queries(queries):
+        # Leave out the SAVEPOINT / ROLLBACK TO / RELEASE that call() adds
+        return sum(1 for query in queries if not query['sql'].startswith(('SAVEPOINT', 'ROLLBACK', 'RELEASE')))
+
+    def measure(self, client, method, url, body):
+        # 1. Cold call: queries and peak memory
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            response = self.call(client, method, url, body)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.assertLess(response.status_code, 500, response.content[:500])
+        max_queries = self.count_queries(queries)
+
+        # 2. Timed rounds (no tracing overhead, no garbage left from other endpoints)
+        gc.collect()
+        timings = []
+        for _ in range(BENCH_ROUNDS):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                self.call(client, method, url, body)
+                timings.append((time.perf_counter() - start) * 1000)
+            max_queries = max(max_queries, self.count_queries(queries))
+
+        timings.sort()
+        return {
+            'status': response.status_code,
+            'queries': max_queries,
+            'p50_ms': round(timings[len(timings) // 2], 2),
+            'p99_ms': round(timings[math.ceil(0.99 * len(timings)) - 1], 2),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def test_every_route_has_a_case(self):
+        routes = {pattern.name for pattern in api_urls.urlpatterns}
+        covered = {label.split(' ')[0] for label, *_ in self.cases()}
+        self.assertEqual(routes - covered, set())
+        self.assertEqual({label for label, *_ in self.cases()}, set(BUDGETS))
+
+    def test_endpoint_budgets(self):
+        results = {}
+        for label, client, method, url, body in self.cases():
+            result = results[label] = self.measure(client, method, url, body)
+            budget = BUDGETS[label]
+            with self.subTest(endpoint=label):
+                self.assertLessEqual(result['queries'], budget['queries'], f"{label}: {result}")
+                if BENCH_LATENCY:
+                    self.assertLessEqual(result['p99_ms'], budget['p99_ms'] * BENCH_SCALE, f"{label}: {result}")
+                self.assertLessEqual(result['peak_kb'], budget['peak_kb'] * BENCH_SCALE, f"{label}: {result}")
+
+        if BENCH_REPORT:
+            with open(BENCH_REPORT, 'w') as report:
+                json.dump({'scale': BENCH_SCALE, 'rounds': BENCH_ROUNDS, 'endpoints': results}, report, indent=2)
+
+
+class AdminChangelistTests(TestCase):
+    """ Product/order changelists: a fixed number of queries, however many rows. """
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin-pass'))
+        category = Category.objects.create(name='Toys', slug='toys')
+        for i in range(20):
+            product = Product.objects.create(category=category, name=f'Toy {i}', slug=f'toy-{i}',
+                                             description='', price=Decimal('5.00'), stock=i)
+            order = Order.objects.create(user=User.objects.create_user(f'kid{i}'), full_name='K', address='A',
+                                         city='Kano', state='Kano', phone='0800', total_amount=Decimal('10.00'),
+                                         status='delivered')
+            OrderItem.objects.create(order=order, product=product, product_name=product.name,
+                                     price=product.price, quantity=2)
+
+    def test_product_changelist(self):
+        # Session, user, COUNT, filtered COUNT, page (units sold as a subquery), category filter
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('admin:api_product_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({product.units_sold for product in response.context['cl'].result_list}, {2})
+
+    def test_order_changelist(self):
+        # Session, user, COUNT, filtered COUNT, page (customers joined)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('admin:api_order_changelist'))
+        self.assertEqual(response.status_code, 200)
+
+
+class ImagePipelineTests(TestCase):
+    """ Variants are rendered from the pending queue and served next to `image`. """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_PIPELINE_WORKER='command')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), (200, 40, 40)).save(buffer, 'JPEG')
+        category = Category.objects.create(name='Shoes', slug='shoes')
+        self.product = Product.objects.create(
+            category=category, name='Runner', slug='runner', price=Decimal('100.00'), stock=5,
+            image=SimpleUploadedFile('runner.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        )
+
+    def test_variants_are_rendered_from_the_queue(self):
+        self.assertEqual(list(images.pending_products()), [self.product])
+        self.assertEqual(images.process_pending_images(), 1)
+        self.assertFalse(images.pending_products().exists())
+
+        self.product.refresh_from_db()
+        variants = self.product.image_variants
+        self.assertEqual(variants['source'], self.product.image.name)
+        # 800px original: 'large' is capped at the original width, never upscaled
+        self.assertEqual(variants['widths'], {'thumb': 100, 'small': 320, 'medium': 640, 'large': 800})
+        storage = self.product.image.storage
+        for name, formats in variants['sizes'].items():
+            self.assertEqual(set(formats), set(images.FORMATS))
+            with storage.open(formats['webp']) as f, Image.open(f) as image:
+                self.assertEqual(image.width, variants['widths'][name])
+                if name == 'thumb':
+                    self.assertEqual(image.size, (100, 100))
+
+    def test_serializer_falls_back_until_rendered(self):
+        data = ProductSerializer(self.product).data
+        self.assertTrue(data['image'])
+        self.assertEqual(data['image_variants'], {'sizes': {}, 'srcset': {}})
+
+        images.process_pending_images()
+        self.product.refresh_from_db()
+        data = ProductSerializer(self.product).data
+        self.assertIn('thumb', data['image_variants']['sizes'])
+        self.assertIn('640w', data['image_variants']['srcset']['webp'])
+
+    def test_replacing_the_image_requeues_it(self):
+        images.process_pending_images()
+        self.product.refresh_from_db()
+        old_thumb = self.product.image_variants['sizes']['thumb']['webp']
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 300), (0, 0, 200)).save(buffer, 'PNG')
+        self.product.image = SimpleUploadedFile('other.png', buffer.getvalue(), content_type='image/png')
+        self.product.save()
+        self.assertEqual(ProductSerializer(self.product).data['image_variants']['sizes'], {}) # Stale: not served
+        self.assertEqual(images.process_pending_images(), 1)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants['widths'], {'thumb': 100, 'small': 300})
+        self.assertFalse(self.product.image.storage.exists(old_thumb))
+
+
+class InventoryRollupTests(TestCase):
+    """ Stock changes move today's low/out-of-stock counts by deltas, never by a recount. """
+
+    def setUp(self):
+        category = Category.objects.create(name='Tools', slug='tools')
+        self.products = [
+            Product.objects.create(category=category, name=f'P{stock}', slug=f'p{stock}',
+                                   description='', price=Decimal('10.00'), stock=stock)
+            for stock in (0, 5, 10, 50)
+        ]
+
+    def assertMatchesRecount(self):
+        today = InventoryRollup.objects.get()
+        refresh_inventory_rollup()
+        recount = InventoryRollup.objects.get()
+        self.assertEqual((today.low_stock_count, today.out_of_stock_count),
+                         (recount.low_stock_count, recount.out_of_stock_count))
+        return recount
+
+    def test_checkout_and_release_apply_deltas(self):
+        _, ten, fifty = self.products[1:]
+        lines = [CartItem(product=ten, quantity=1), CartItem(product=fifty, quantity=45)]
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                reserve_stock(lines)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']]) # No full-table aggregate
+        rollup = self.assertMatchesRecount()
+        self.assertEqual((rollup.low_stock_count, rollup.out_of_stock_count), (4, 1))
+
+        order = Order.objects.create(user=User.objects.create_user('buyer'), total_amount=0)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=line.product, product_name='x', price=1, quantity=line.quantity)
+            for line in lines
+        ])
+        release_stock(order)
+        rollup = self.assertMatchesRecount()
+        self.assertEqual((rollup.low_stock_count, rollup.out_of_stock_count), (2, 1))
+
+    def test_admin_saves_and_deletes_apply_deltas(self):
+        empty, five = self.products[:2]
+        empty.stock = 30
+        empty.save()
+        five.name = 'Renamed' # Stock unchanged: nothing to move
+        five.save()
+        self.assertMatchesRecount()
+        five.delete()
+        rollup = self.assertMatchesRecount()
+        self.assertEqual((rollup.low_stock_count, rollup.out_of_stock_count), (0, 0))
+
+
+class SalesRollupTests(TestCase):
+    """ Order writes move the sales rollups by deltas; they always match a rebuild. """
+
+    def setUp(self):
+        self.user = User.objects.create_user('customer')
+        category = Category.objects.create(name='Books', slug='books')
+        self.products = [
+            Product.objects.create(category=category, name=f'Book {i}', slug=f'book-{i}',
+                                   description='', price=Decimal('10.00'), stock=100)
+            for i in range(5)
+        ]
+
+    def order(self, quantities=(1, 2, 3, 1, 2)):
+        order = Order.objects.create(user=self.user, full_name='C', address='A', city='Kano', state='Kano',
+                                     phone='0800', total_amount=Decimal('90.00'))
+        for product, quantity in zip(self.products, quantities):
+            OrderItem.objects.create(order=order, product=product, product_name=product.name,
+                                     price=product.price, quantity=quantity)
+        return order
+
+    def sales(self):
+        return sorted(
+            (row.period, row.status, row.order_count, row.amount)
+            for row in SalesRollup.objects.exclude(order_count=0)
+        )
+
+    def units(self):
+        return sorted(
+            (row.product_id, row.units, row.revenue)
+            for row in ProductSalesRollup.objects.exclude(units=0)
+        )
+
+    def assertMatchesRebuild(self):
+        sales, units = self.sales(), self.units()
+        rebuild_rollups()
+        self.assertEqual((sales, units), (self.sales(), self.units()))
+        return sales, units
+
+    def test_create(self):
+        self.order()
+        sales, units = self.assertMatchesRebuild()
+        self.assertEqual(sales, [('day', 'pending', 1, Decimal('90.00')), ('hour', 'pending', 1, Decimal('90.00'))])
+        self.assertEqual([u for _, u, _ in units], [1, 2, 3, 1, 2])
+
+    def test_transition_moves_status_and_units(self):
+        orders = [self.order() for _ in range(3)]
+        pks = [order.pk for order in orders]
+        with CaptureQueriesContext(connection) as paid:
+            Order.objects.filter(pk__in=pks).transition('paid')
+        with CaptureQueriesContext(connection) as cancelled:
+            Order.objects.filter(pk__in=pks).transition('cancelled')
+        self.assertEqual(self.assertMatchesRebuild(), (
+            [('day', 'cancelled', 3, Decimal('270.00')), ('hour', 'cancelled', 3, Decimal('270.00'))], [],
+        ))
+        # Cancelling reads the lines of all 3 orders in one query
+        self.assertEqual(len([q for q in cancelled if 'FROM "api_orderitem"' in q['sql']]), 1)
+        self.assertEqual(len(cancelled), len(paid) + 1 + 3) # + that read, + one units upsert per order
+
+        Order.objects.filter(pk=pks[0]).transition('pending') # Un-cancelling restores the units
+        self.assertEqual([u for _, u, _ in self.assertMatchesRebuild()[1]], [1, 2, 3, 1, 2])
+
+    def test_delete_reads_the_order_once(self):
+        order = self.order()
+        self.order()
+        with CaptureQueriesContext(connection) as queries:
+            order.delete()
+        reads = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in reads if 'FROM "api_order" ' in sql]) # No per-line order read
+        self.assertEqual(len(reads), 2) # The collector's and the rollup's read of the lines
+        self.assertEqual(len(queries), 7) # Was 17 for these 5 lines
+        sales, units = self.assertMatchesRebuild()
+        self.assertEqual(sales[0][2], 1)
+        self.assertEqual([u for _, u, _ in units], [1, 2, 3, 1, 2])
+
+    def test_deleted_products_share_one_row(self):
+        order = self.order(quantities=(4,))
+        self.products[0].delete() # Its rollup row and order line keep the name, lose the product
+        order.status = 'cancelled'
+        order.save()
+        rows = ProductSalesRollup.objects.filter(product__isnull=True)
+        self.assertEqual(list(rows.values_list('units', flat=True)), [0]) # Moved, not duplicated
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'idempotency'}})
+class CartIdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('retrier')
+        category = Category.objects.create(name='Bags', slug='bags')
+        self.product = Product.objects.create(category=category, name='Tote', slug='tote',
+                                              description='', price=Decimal('20.00'), stock=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, key, quantity=1):
+        body = {'operations': [{'op': 'add', 'product_id': self.product.pk, 'quantity': quantity}]}
+        return self.client.post(api_url('cart_batch'), body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_and_other_body_is_refused(self):
+        first = self.batch('k1')
+        retry = self.batch('k1')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(CartItem.objects.get().quantity, 1) # Applied once
+
+        self.assertEqual(self.batch('k1', quantity=5).status_code, 422)
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+    def test_crashed_claim_expires_quickly_but_results_are_kept(self):
+        payload = {'operations': []}
+        self.assertEqual(claim_idempotency_key(self.user, 'k2', payload), (True, None))
+        self.assertEqual(claim_idempotency_key(self.user, 'k2', payload), (False, None)) # In flight: 409
+
+        later = time.time() + settings.CART_IDEMPOTENCY_PENDING_TTL + 1
+        with mock.patch('time.time', return_value=later): # Its worker died: the key is free again
+            self.assertEqual(claim_idempotency_key(self.user, 'k2', payload), (True, None))
+
+        self.batch('k3')
+        with mock.patch('time.time', return_value=later): # A finished result outlives the short claim
+            self.assertEqual(self.batch('k3')['Idempotent-Replayed'], 'true')
+
+
+
+class OrderStatusChangeTests(TestCase):
+    """ One customer email per status change, from save() or a bulk transition(). """
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com')
+        self.orders = [
+            Order.objects.create(user=self.user, full_name='Buyer', address='1 Test Road', city='Kano',
+                                 state='Kano', phone='0800', total_amount=Decimal('100.00'))
+            for _ in range(3)
+        ]
+
+    def emails(self):
+        return list(EmailLog.objects.order_by('id').values_list('subject', flat=True))
+
+    def test_status_change_queues_one_email(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(self.emails(), [f"Order Update: #{order.pk} is Shipped"])
+        self.assertTrue(Order.objects.get(pk=order.pk).is_paid) # Shipped implies paid
+
+        order.save() # Same status again
+        order.address = '2 Test Road'
+        order.save()
+        self.assertEqual(len(self.emails()), 1)
+
+    def test_transition_queues_one_email_per_order(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(status='paid', is_paid=True) # Already there: skipped
+        changed = Order.objects.filter(pk__in=[order.pk for order in self.orders]).transition('paid')
+        self.assertEqual(changed, 2)
+        self.assertEqual(self.emails(), [f"Order Update: #{order.pk} is Paid" for order in self.orders[1:]])
+        self.assertEqual(set(Order.objects.values_list('status', 'is_paid')), {('paid', True)})
+
+    def test_unchanged_save_reads_nothing(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        self.assertEqual([q['sql'] for q in queries if q['sql'].startswith('SELECT')], [])
+
+        detached = Order(**{field.attname: getattr(order, field.attname) for field in Order._meta.concrete_fields})
+        with CaptureQueriesContext(connection) as queries:
+            detached.save() # Not loaded through the ORM: one SELECT for the stored status
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 1)
+        self.assertEqual(self.emails(), [])
+
+
+class PlaceOrderTests(TestCase):
+    """ place_order() orders exactly the cart lines it read, once. """
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper')
+        category = Category.objects.create(name='Mugs', slug='mugs')
+        self.mug, self.cup = [
+            Product.objects.create(category=category, name=name, slug=name.lower(),
+                                   description='', price=Decimal('5.00'), stock=10)
+            for name in ('Mug', 'Cup')
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.mug, quantity=1)
+        self.data = {'payment_method': 'pod', 'full_name': 'Shopper', 'address': '1 Test Road',
+                     'city': 'Kano', 'state': 'Kano', 'phone': '0800'}
+
+    def place_order_while(self, change):
+        """ place_order() with `change` made by "another request" once the cart has been read. """
+        def reserve_then_change(cart_items):
+            reserve_stock(cart_items)
+            change()
+
+        with mock.patch('api.checkout.reserve_stock', reserve_then_change):
+            return place_order(self.user, self.data)
+
+    def test_item_added_during_checkout_stays_in_cart(self):
+        order = self.place_order_while(lambda: CartItem.objects.create(cart=self.cart, product=self.cup))
+        self.assertEqual(list(order.items.values_list('product', 'quantity')), [(self.mug.pk, 1)])
+        self.assertEqual(list(self.cart.items.values_list('product', flat=True)), [self.cup.pk])
+
+    def test_cart_taken_by_another_checkout_rolls_back(self):
+        with self.assertRaises(CheckoutError):
+            self.place_order_while(lambda: self.cart.items.all().delete())
+        self.assertFalse(Order.objects.exists())
+        self.mug.refresh_from_db()
+        self.assertEqual(self.mug.stock, 10) # Not reserved twice
+
+    def test_double_submit_places_one_order(self):
+        place_order(self.user, self.data)
+        with self.assertRaisesMessage(CheckoutError, "Cart is empty"):
+            place_order(self.user, self.data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.mug.refresh_from_db()
+        self.assertEqual(self.mug.stock, 9)
+
+
+class PaymentAttemptTests(TestCase):
+    """ A payment retry opens a new transaction; the first one can still be the one that's paid. """
+
+    def setUp(self):
+        user = User.objects.create_user('payer', 'payer@example.com')
+        self.order = Order.objects.create(user=user, full_name='Payer', address='1 Test Road', city='Kano',
+                                          state='Kano', phone='0800', total_amount=Decimal('100.00'))
+        with mock.patch.object(Paystack, 'initialize_transaction', fake_initialize):
+            first = start_paystack_payment(self.order, user.email)['reference']
+            retry = start_paystack_payment(self.order, user.email)['reference'] # e.g. the tab was closed
+        self.references = [first, retry]
+
+    def test_retry_keeps_earlier_references(self):
+        self.assertEqual(self.order.payment_reference, self.references[1])
+        self.assertEqual(list(self.order.payment_attempts.values_list('reference', flat=True)),
+                         self.references[::-1])
+
+    @mock.patch.object(Paystack, 'verify_transaction', fake_verify)
+    def test_verify_finds_order_by_first_reference(self):
+        response = APIClient().get(api_url('payment_verify'), {'reference': self.references[0]})
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_reference), ('paid', self.references[0]))
+
+    def test_reconcile_checks_every_attempt(self):
+        def verify(paystack, reference):
+            return {'status': reference == self.references[0], 'amount': 0}
+
+        with mock.patch.object(Paystack, 'verify_transaction', verify):
+            call_command('reconcile_payments', '--min-age', '0', stdout=io.StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_reference), ('paid', self.references[0]))
+
+class AsyncPaymentURLs:
+    """ The routes api/urls.py swaps in when ASYNC_PAYMENTS is set (it picks them at import). """
+    urlpatterns = [
+        path('api/checkout/', async_views.checkout_view),
+        path('api/payment/verify/', async_views.payment_verify_view),
+        path('api/orders/<int:id>/pay/', async_views.order_payment_view),
+    ]
+
+
+async def async_fake_initialize(self, email, amount, order_id):
+    return fake_initialize(self, email, amount, order_id)
+
+
+async def async_fake_verify(self, reference):
+    return fake_verify(self, reference)
+
+
+async def async_gateway_down(self, email, amount, order_id):
+    return {'status': False, 'message': 'timed out'}
+
+
+@override_settings(ROOT_URLCONF=AsyncPaymentURLs,
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'async-payments'}})
+@mock.patch.object(AsyncPaystack, 'verify_transaction', async_fake_verify)
+class AsyncPaymentViewTests(TestCase):
+    """ The ASGI payment views: same outcomes, auth and throttles as the DRF ones. """
+
+    def setUp(self):
+        cache.clear() # Throttle history
+        self.user = User.objects.create_user('async-buyer', 'buyer@example.com')
+        category = Category.objects.create(name='Shoes', slug='shoes')
+        self.product = Product.objects.create(category=category, name='Sandal', slug='sandal',
+                                              description='', price=Decimal('50.00'), stock=5)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.client = AsyncClient()
+        self.auth = {'Authorization': f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def checkout(self, headers=None, **data):
+        body = {'full_name': 'Async Buyer', 'address': '1 Test Road', 'city': 'Kano',
+                'state': 'Kano', 'phone': '0800', 'payment_method': 'paystack', **data}
+        return self.client.post('/api/checkout/', body, content_type='application/json',
+                                headers=self.auth if headers is None else headers)
+
+    @mock.patch.object(AsyncPaystack, 'initialize_transaction', async_fake_initialize)
+    async def test_checkout_starts_payment(self):
+        response = await self.checkout()
+        self.assertEqual(response.status_code, 201)
+        order = await Order.objects.aget()
+        self.assertEqual(response.json()['payment_url'], f"https://checkout.paystack.test/{order.payment_reference}")
+
+        verified = await self.client.get('/api/payment/verify/', {'reference': order.payment_reference})
+        self.assertEqual(verified.status_code, 200)
+        await order.arefresh_from_db()
+        self.assertEqual((order.status, order.is_paid), ('paid', True))
+
+    async def test_empty_cart_is_rejected(self):
+        await CartItem.objects.all().adelete()
+        response = await self.checkout(payment_method='pod')
+        self.assertEqual((response.status_code, response.json()), (400, {'error': 'Cart is empty'}))
+        self.assertFalse(await Order.objects.aexists())
+
+    async def test_gateway_failure_leaves_order_payable(self):
+        with mock.patch.object(AsyncPaystack, 'initialize_transaction', async_gateway_down):
+            response = await self.checkout()
+        self.assertEqual(response.status_code, 502)
+        order = await Order.objects.aget()
+        self.assertEqual(response.json()['retry_url'], f"/api/orders/{order.id}/pay/")
+        self.assertEqual((order.status, order.payment_reference), ('pending', None))
+
+        with mock.patch.object(AsyncPaystack, 'initialize_transaction', async_fake_initialize):
+            retried = await self.client.post(response.json()['retry_url'], headers=self.auth)
+        self.assertEqual(retried.status_code, 200)
+
+    async def test_auth_and_throttles_match_drf_views(self):
+        denied = await self.checkout(headers={})
+        self.assertEqual(denied.status_code, 401)
+        self.assertIn('Bearer', denied['WWW-Authenticate'])
+        bad_token = await self.checkout(headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(bad_token.status_code, 401)
+
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', {'anon': '1/min', 'user': '1/min'}):
+            await self.client.get('/api/payment/verify/', {'reference': 'x'})
+            throttled = await self.client.get('/api/payment/verify/', {'reference': 'x'})
+            self.assertEqual(throttled.status_code, 429)
+            self.assertTrue(throttled['Retry-After'])
+
+            await self.checkout(payment_method='pod')
+            self.assertEqual((await self.checkout(payment_method='pod')).status_code, 429)
@@ -1,12 +1,13 @@
+from django.conf import settings
 from django.urls import path
-from .views import CreateReviewView, UserProfileDetailView, DeliveryZoneListView, OrderListView, OrderDetailView, PaymentVerifyView,CheckoutView, CartView, CartItemView, ProductListView, ProductDetailView, CategoryListView, RegisterView, UserProfileView, LogoutView
+from .views import CartBatchView, OrderPaymentView, ProductReviewsView, UserProfileDetailView, DeliveryZoneListView, OrderListView, OrderDetailView, PaymentVerifyView,CheckoutView, CartView, CartItemView, ProductListView, ProductDetailView, CategoryListView, RegisterView, UserProfileView, LogoutView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
 from .views import (
     ProductListView, admin_dashboard_view, ProductDetailView, CategoryListView, 
-    CreateReviewView, UserProfileDetailView # Ensure these are imported
+    ProductReviewsView, UserProfileDetailView # Ensure these are imported
 )
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
@@ -20,17 +21,19 @@ urlpatterns = [
 
     path('products/', ProductListView.as_view(), name='product_list'),
     path('products/detail/<slug:slug>/', ProductDetailView.as_view(), name='product_detail_full'),    
-    path('products/<int:product_id>/reviews/', CreateReviewView.as_view(), name='create_review'),
+    path('products/<int:product_id>/reviews/', ProductReviewsView.as_view(), name='create_review'),
     path('profile/', UserProfileDetailView.as_view(), name='user_profile'),
 
     path('categories/', CategoryListView.as_view(), name='category_list'),
     path('cart/', CartView.as_view(), name='cart_detail'),
     path('cart/items/<int:item_id>/', CartItemView.as_view(), name='cart_item_action'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart_batch'),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
     path('payment/verify/', PaymentVerifyView.as_view(), name='payment_verify'),
 
     path('orders/', OrderListView.as_view(), name='order_list'),
     path('orders/<int:id>/', OrderDetailView.as_view(), name='order_detail'),
+    path('orders/<int:id>/pay/', OrderPaymentView.as_view(), name='order_payment'),
     path('dashboard-report/', admin_dashboard_view, name='admin_dashboard'),
     path('delivery-zones/', DeliveryZoneListView.as_view(), name='delivery_zones'),
 
@@ -42,4 +45,16 @@ urlpatterns = [
 
     # 3. Redoc (Professional Reading View)
     path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
-]
\ No newline at end of file
+]
+
+# ASGI deployments: serve the payment endpoints from async views so gateway
+# I/O doesn't hold a worker thread. Same URLs, same responses.
+if settings.ASYNC_PAYMENTS:
+    from . import async_views
+
+    async_routes = {
+        'checkout': path('checkout/', async_views.checkout_view, name='checkout'),
+        'payment_verify': path('payment/verify/', async_views.payment_verify_view, name='payment_verify'),
+        'order_payment': path('orders/<int:id>/pay/', async_views.order_payment_view, name='order_payment'),
+    }
+    urlpatterns = [async_routes.get(p.name, p) for p in urlpatterns]
@@ -25,15 +25,24 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Cart, CartItem, Product
 from .serializers import CartSerializer
+from .cart import (
+    get_cart, apply_cart_operations, CartError,
+    claim_idempotency_key, store_idempotent_response, release_idempotency_key, IdempotencyKeyReused,
+)
 
 from core.paystack import Paystack
 from django.shortcuts import render
 
 from .models import Review
 from .serializers import ReviewSerializer, ProductDetailSerializer
+from rest_framework import serializers
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from django.db.models import Prefetch
 
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from .pagination import ProductCursorPagination, ReviewPagination
+from .search import ProductSearchFilter
+from .cache import CatalogCacheMixin, catalog_cache_stats
+from core.db_router import ReplicaReadMixin
 
 
 class RegisterView(generics.CreateAPIView):
@@ -73,22 +82,24 @@ class LogoutView(views.APIView):
 
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(ReplicaReadMixin, CatalogCacheMixin, generics.ListAPIView):
     """
     Returns a list of products with support for:
-    - Search: ?search=iphone
+    - Search: ?search=iphone (prefix match, ranked by relevance)
     - Filtering: ?category=electronics&price_min=1000
     - Ordering: ?ordering=price (or -price for high to low)
+    - Pagination: ?cursor=<next link> (keyset, newest first)
     """
     # Optimized query: select_related reduces database hits for categories
     queryset = Product.objects.filter(is_available=True).select_related('category').order_by('-created_at')
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    pagination_class = ProductCursorPagination
     
     # Enable the Filter Backends
-    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    filter_backends = [ProductSearchFilter, OrderingFilter, DjangoFilterBackend]
     
-    # 1. Search Fields (checks name and description)
+    # 1. Search Fields: full-text index on SQLite, icontains fallback elsewhere
     search_fields = ['name', 'description', 'category__name']
     
     # 2. Filter Fields (Exact matches)
@@ -100,10 +111,6 @@ class ProductListView(generics.ListAPIView):
     # 3. Ordering Fields
     ordering_fields = ['price', 'created_at', 'name']
 
-    @method_decorator(cache_page(60 * 15)) 
-    def dispatch(self, *args, **kwargs):
-        return super().dispatch(*args, **kwargs)
-
     @extend_schema(
         summary="List & Filter Products",
         description="Get a paginated list of products. Use query params to filter by category, search text, or sort by price.",
@@ -111,6 +118,7 @@ class ProductListView(generics.ListAPIView):
             OpenApiParameter(name='search', description='Search term for product name', required=False, type=str),
             OpenApiParameter(name='category', description='Category ID to filter by', required=False, type=int),
             OpenApiParameter(name='ordering', description='Sort by: price, -price, created_at', required=False, type=str),
+            OpenApiParameter(name='page_size', description='Products per page (max 100)', required=False, type=int),
         ],
         tags=['Storefront'] # Groups this endpoint under a nice label
     )
@@ -126,7 +134,7 @@ class ProductListView(generics.ListAPIView):
 #     permission_classes = [AllowAny]
 #     lookup_field = 'slug'
 
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(ReplicaReadMixin, CatalogCacheMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
@@ -138,8 +146,8 @@ class CartView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Get or Create cart for user
-        cart, _ = Cart.objects.get_or_create(user=request.user)
+        # Get or Create cart for user (2 queries, totals computed in SQL)
+        cart = get_cart(request.user)
         serializer = CartSerializer(cart)
         return Response(serializer.data)
 
@@ -163,7 +171,7 @@ class CartView(views.APIView):
             cart_item.save()
 
         # Return updated cart
-        return Response(CartSerializer(cart).data)
+        return Response(CartSerializer(get_cart(request.user)).data)
 
 class CartItemView(views.APIView):
     permission_classes = [IsAuthenticated]
@@ -179,14 +187,54 @@ class CartItemView(views.APIView):
         else:
             cart_item.delete() # Remove if 0
 
-        return Response(CartSerializer(cart_item.cart).data)
+        return Response(CartSerializer(get_cart(request.user)).data)
 
     def delete(self, request, item_id):
         """ Remove item completely """
         cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-        cart = cart_item.cart
         cart_item.delete()
-        return Response(CartSerializer(cart).data)
+        return Response(CartSerializer(get_cart(request.user)).data)
+
+
+class CartBatchView(views.APIView):
+    """
+    POST /api/cart/batch/
+    {"operations": [{"op": "add", "product_id": 3, "quantity": 1}, {"op": "remove", "product_id": 7}]}
+    Applies every operation in one transaction and returns the updated cart once.
+    Send an `Idempotency-Key` header to make retries safe: a replayed key
+    returns the first response instead of applying the batch again, and a
+    key reused with a different body is refused (422).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        key = request.headers.get('Idempotency-Key')
+        if key:
+            try:
+                claimed, stored = claim_idempotency_key(request.user, key, request.data)
+            except IdempotencyKeyReused as e:
+                return Response({"error": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if stored is not None:
+                return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+            if not claimed:
+                return Response({"error": "A request with this Idempotency-Key is still in progress."},
+                                status=status.HTTP_409_CONFLICT)
+
+        try:
+            cart = apply_cart_operations(request.user, request.data.get('operations'))
+        except CartError as e:
+            if key:
+                release_idempotency_key(request.user, key)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            if key:
+                release_idempotency_key(request.user, key)
+            raise
+
+        data = CartSerializer(cart).data
+        if key:
+            store_idempotent_response(request.user, key, request.data, status.HTTP_200_OK, data)
+        return Response(data)
 
 
 
@@ -270,16 +318,18 @@ class PaymentVerifyView(views.APIView):
         res = paystack.verify_transaction(reference)
 
         if res['status']:
-            # Find order and mark as paid
+            # Find order (by any of its attempts, retries included) and mark as paid
             try:
-                order = Order.objects.get(payment_reference=reference)
-                order.is_paid = True
-                order.status = 'paid'
+                order = Order.objects.get(payment_attempts__reference=reference)
+                mark_paid(order, reference)
                 order.save()
+                PAYMENT_VERIFICATIONS.inc(outcome='paid')
                 return Response({"status": "success", "message": "Payment verified"})
             except Order.DoesNotExist:
+                PAYMENT_VERIFICATIONS.inc(outcome='order_not_found')
                 return Response({"error": "Order not found"}, status=404)
         
+        PAYMENT_VERIFICATIONS.inc(outcome='failed')
         return Response({"status": "failed", "message": "Payment verification failed"}, status=400)       
 
 from django.shortcuts import get_object_or_404
@@ -290,128 +340,99 @@ from rest_framework.permissions import IsAuthenticated
 
 # Models
 from .models import Product, Cart, Order, OrderItem
-from core.models import DeliveryZone # Imported for Delivery Logic
 from core.paystack import Paystack
-from .serializers import OrderSerializer
+from core.metrics import CHECKOUTS, CHECKOUT_DURATION, PAYMENT_VERIFICATIONS
+from .serializers import OrderSerializer, OrderSummarySerializer
+from .pagination import OrderPagination
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .checkout import (
+    place_order, start_paystack_payment, can_retry_payment,
+    payment_started_payload, payment_retry_payload, order_placed_payload,
+    payment_method_label, mark_paid, GATEWAY_DOWN_MESSAGE, RETRY_DOWN_MESSAGE, NOT_PAYABLE_MESSAGE,
+)
 
 class CheckoutView(views.APIView):
+    """
+    Sync checkout (WSGI). The async twin lives in api/async_views.py.
+    """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        # 1. Get User's Cart
-        try:
-            cart = Cart.objects.get(user=request.user)
-            if not cart.items.exists():
-                return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
-        except Cart.DoesNotExist:
-            return Response({"error": "No cart found"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 2. Extract Data
         data = request.data
         payment_method = data.get('payment_method', 'paystack')
-        state_name = data.get('state')
+        label = payment_method_label(payment_method) # Bounded set of metric series
 
-        # 3. CALCULATE DELIVERY FEE (Server-Side Validation)
-        # We don't trust the frontend price. We verify it here.
-        delivery_fee = 0
-        try:
-            # Case-insensitive match for state (e.g. "kano" matches "Kano")
-            zone = DeliveryZone.objects.get(state__iexact=state_name)
-            delivery_fee = zone.fee
-        except DeliveryZone.DoesNotExist:
-            # Fallback/Default fee if state is not in your DB
-            delivery_fee = 2500 # Default Standard Delivery
-
-        # 4. Start Database Transaction
-        try:
-            with transaction.atomic():
-                
-                # Calculate Grand Total (Cart Subtotal + Delivery Fee)
-                grand_total = cart.total_price + delivery_fee
+        with CHECKOUT_DURATION.time(payment_method=label):
+            # 1-4. Cart -> Order in one short DB transaction
+            try:
+                order = place_order(request.user, data)
+            except Exception as e:
+                CHECKOUTS.inc(payment_method=label, outcome='rejected')
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-                # A. Create the Order
-                order = Order.objects.create(
-                    user=request.user,
-                    full_name=data.get('full_name'),
-                    address=data.get('address'),
-                    city=data.get('city'),
-                    state=state_name,
-                    phone=data.get('phone'),
-                    delivery_fee=delivery_fee, # Save the fee
-                    total_amount=grand_total,  # Save the final total
-                    payment_method=payment_method
-                )
+            # --- 5. PAYMENT PROCESSING (order is committed, lock released) ---
 
-                # B. Move Items & Deduct Stock
-                items_to_create = []
-                for item in cart.items.select_related('product'):
-                    product = item.product
-                    
-                    # Check Stock
-                    if product.stock < item.quantity:
-                        raise ValueError(f"Not enough stock for {product.name}")
+            # Option A: Paystack (Card/Transfer)
+            if payment_method == 'paystack':
+                # Initialize transaction with the Grand Total (Cart + Delivery)
+                res = start_paystack_payment(order, request.user.email)
 
-                    # Deduct Stock
-                    product.stock -= item.quantity
-                    product.save()
+                if res['status']:
+                    CHECKOUTS.inc(payment_method=label, outcome='payment_started')
+                    return Response(payment_started_payload(order, res), status=status.HTTP_201_CREATED)
 
-                    # Create Order Item (Snapshot of price/name)
-                    items_to_create.append(OrderItem(
-                        order=order,
-                        product=product,
-                        product_name=product.name,
-                        price=product.price,
-                        quantity=item.quantity
-                    ))
+                # Order and stock are kept; the customer retries payment only
+                CHECKOUTS.inc(payment_method=label, outcome='gateway_down')
+                return Response(payment_retry_payload(order, GATEWAY_DOWN_MESSAGE), status=status.HTTP_502_BAD_GATEWAY)
 
-                # Bulk Create for performance
-                OrderItem.objects.bulk_create(items_to_create)
+            # Option B: Payment on Delivery (POD) / Bank Transfer
+            CHECKOUTS.inc(payment_method=label, outcome='placed')
+            return Response(order_placed_payload(order), status=status.HTTP_201_CREATED)
 
-                # C. Clear the Cart
-                cart.items.all().delete()
-                
-                # --- D. PAYMENT PROCESSING ---
-                
-                # Option A: Paystack (Card/Transfer)
-                if payment_method == 'paystack':
-                    paystack = Paystack()
-                    # Initialize transaction with the Grand Total (Cart + Delivery)
-                    res = paystack.initialize_transaction(
-                        email=request.user.email,
-                        amount=order.total_amount,
-                        order_id=order.id
-                    )
-                    
-                    if res['status']:
-                        # Save the Paystack Reference
-                        order.payment_reference = res['reference']
-                        order.save()
-                        
-                        return Response({
-                            "message": "Order created. Redirecting to payment.",
-                            "payment_url": res['auth_url'],
-                            "type": "paystack"
-                        }, status=status.HTTP_201_CREATED)
-                    else:
-                        raise ValueError("Paystack initialization failed.")
-
-                # Option B: Payment on Delivery (POD) / Bank Transfer
-                else:
-                    return Response({
-                        "message": "Order placed successfully!",
-                        "type": "pod"
-                    }, status=status.HTTP_201_CREATED)
+class OrderPaymentView(views.APIView):
+    """ Retry Paystack initialization for one of the user's pending orders """
+    permission_classes = [IsAuthenticated]
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    def post(self, request, id):
+        order = get_object_or_404(Order, id=id, user=request.user)
+
+        if not can_retry_payment(order):
+            return Response({"error": NOT_PAYABLE_MESSAGE}, status=status.HTTP_400_BAD_REQUEST)
+
+        res = start_paystack_payment(order, request.user.email)
+        if res['status']:
+            return Response(payment_started_payload(order, res, "Redirecting to payment."))
+        return Response(payment_retry_payload(order, RETRY_DOWN_MESSAGE), status=status.HTTP_502_BAD_GATEWAY)
 
 class OrderListView(generics.ListAPIView):
-    """ List all orders for the logged-in user """
-    serializer_class = OrderSerializer
+    """
+    List all orders for the logged-in user (paginated, newest first).
+    - Default: summary rows with `item_count`, one query per page
+    - ?expand=items: full orders, items fetched with one prefetch query
+    """
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderPagination
+
+    def expand_items(self):
+        return self.request.query_params.get('expand') == 'items'
+
+    def get_serializer_class(self):
+        return OrderSerializer if self.expand_items() else OrderSummarySerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Order.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+        if self.expand_items():
+            return queryset.prefetch_related('items')
+        # Correlated COUNT rather than JOIN + GROUP BY, so the page is read
+        # straight off order_user_newest_idx without sorting the user's orders
+        item_count = (
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return queryset.annotate(item_count=Coalesce(Subquery(item_count), 0))
 
 class OrderDetailView(generics.RetrieveAPIView):
     """ View specific order details """
@@ -421,30 +442,53 @@ class OrderDetailView(generics.RetrieveAPIView):
 
     def get_queryset(self):
         # Ensure user can only see their OWN orders
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).prefetch_related('items')
 
 # ... imports ...
-from core.models import DeliveryZone # Import the new model
+from core.delivery_zones import get_zone_table
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 
-class DeliveryZoneListView(views.APIView):
+class DeliveryZoneListView(ReplicaReadMixin, views.APIView):
+    """
+    Served from the in-memory zone table. The ETag changes only when a zone
+    is edited, so the checkout page's repeat loads get an empty 304.
+    """
     permission_classes = [AllowAny] # Public info
 
+    @method_decorator(condition(etag_func=lambda request: get_zone_table().etag))
     def get(self, request):
-        zones = DeliveryZone.objects.filter(is_active=True).values('id', 'state', 'fee', 'estimated_time')
-        return Response(list(zones))
+        zones = [dict(zone) for zone in get_zone_table().zones]
+        response = Response(zones)
+        response['Cache-Control'] = 'no-cache' # Always revalidate, usually for free
+        return response
 
 
 # A. Product Detail (Single Page)
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.filter(is_available=True)
+class ProductDetailView(ReplicaReadMixin, generics.RetrieveAPIView):
+    """
+    Product page: 2 queries total (product + category, first page of
+    reviews + their users). More reviews: GET /api/products/<id>/reviews/?page=2
+    """
+    queryset = Product.objects.filter(is_available=True).select_related('category').prefetch_related(
+        Prefetch(
+            'reviews',
+            queryset=Review.objects.select_related('user').order_by('-created_at')[:ReviewPagination.page_size],
+            to_attr='recent_reviews'
+        )
+    )
     serializer_class = ProductDetailSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
 
-# B. Create Review (With Verification Logic)
-class CreateReviewView(generics.CreateAPIView):
+# B. Product Reviews: List (paginated) & Create (With Verification Logic)
+class ProductReviewsView(generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ReviewPagination
+
+    def get_queryset(self):
+        return Review.objects.filter(product_id=self.kwargs['product_id']).select_related('user').order_by('-created_at')
 
     def perform_create(self, serializer):
         product_id = self.kwargs['product_id']
@@ -496,7 +540,11 @@ class UserProfileDetailView(views.APIView):
 
 
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, Max
+from django.utils import timezone
+from datetime import timedelta
+from .models import SalesRollup, ProductSalesRollup, InventoryRollup
+from .rollups import refresh_inventory_rollup
 
 # ... existing imports ...
 
@@ -505,28 +553,49 @@ def admin_dashboard_view(request):
     """
     Custom Dashboard for Business Owners.
     """
-    # 1. Financials
-    total_revenue = Order.objects.filter(is_paid=True).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    total_orders = Order.objects.count()
-    pending_orders = Order.objects.filter(status='pending').count()
+    # Everything below reads the rollup tables (api/rollups.py): a handful of
+    # rows per day, however many orders the store has taken.
+    day_rows = SalesRollup.objects.filter(period='day')
+
+    # 1. Financials (revenue = orders in a paid status; is_paid follows status)
+    total_revenue = day_rows.filter(status__in=Order.PAID_STATUSES).aggregate(Sum('amount'))['amount__sum'] or 0
+    total_orders = day_rows.aggregate(Sum('order_count'))['order_count__sum'] or 0
+    pending_orders = day_rows.filter(status='pending').aggregate(Sum('order_count'))['order_count__sum'] or 0
+    orders_last_24h = SalesRollup.objects.filter(
+        period='hour', bucket__gt=timezone.now() - timedelta(hours=24)
+    ).aggregate(Sum('order_count'))['order_count__sum'] or 0
     
-    # 2. Inventory Health
-    low_stock_count = Product.objects.filter(stock__lt=10).count()
+    # 2. Inventory Health (refreshed on every stock change; first visit of the day creates it)
+    inventory = InventoryRollup.objects.filter(day=timezone.localdate()).first()
+    if inventory is None:
+        refresh_inventory_rollup()
+        inventory = InventoryRollup.objects.get(day=timezone.localdate())
+    low_stock_count = inventory.low_stock_count
     
     # 3. Recent Activity
     recent_orders = Order.objects.select_related('user').order_by('-created_at')[:5]
     
-    # 4. Top Products (Simple Logic: Filter by available)
-    # In a real app, you'd aggregate OrderItems, but for now we list available stock
-    top_products = Product.objects.order_by('-created_at')[:5]
+    # 4. Top Products: units sold over the last 30 days
+    top_products = (
+        ProductSalesRollup.objects
+        .filter(day__gte=timezone.localdate() - timedelta(days=30))
+        .values('product_id')
+        .annotate(name=Max('product_name'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-units')[:5]
+    )
+
+    # 5. Catalog Cache Health
+    cache_stats = catalog_cache_stats()
 
     context = {
         'total_revenue': total_revenue,
         'total_orders': total_orders,
         'pending_orders': pending_orders,
+        'orders_last_24h': orders_last_24h,
         'low_stock_count': low_stock_count,
         'recent_orders': recent_orders,
         'top_products': top_products,
+        'cache_stats': cache_stats,
         'title': 'Business Dashboard' # Required for Admin template
     }
     
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Async views reach the ORM through sync_to_async threads, and each thread
+# keeps its own persistent connection: a pool of idle connections that
+# outlives the requests. Close them per request unless explicitly set.
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -35,14 +36,33 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.static.StaticFilesMiddleware', # /static/ without a CDN (SERVE_STATIC); above metrics: assets aren't endpoints
+    'core.metrics.MetricsMiddleware', # Request counts/latency for /metrics
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db_router.ReplicaPinMiddleware',
 ]
 
+# Per-request profiling (core/profiling.py): Server-Timing headers, a JSON log
+# line per request and per-endpoint latency histograms at /admin/profiling/.
+# Off by default: the headers expose internal timings to every client.
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING') == 'True'
+PROFILING_WINDOW_MINUTES = int(os.getenv('PROFILING_WINDOW_MINUTES', 15)) # Histogram span
+if REQUEST_PROFILING:
+    MIDDLEWARE.insert(0, 'core.profiling.ProfilingMiddleware') # Outermost: times everything
+
+# /metrics (core/metrics.py). With several worker processes, point METRICS_DIR
+# at a directory they share (emptied on deploy) so the scrape adds them all up.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_SECONDS = int(os.getenv('METRICS_FLUSH_SECONDS', 5))
+# Required in production: without it /metrics answers 401 to everyone but staff
+# (and DEBUG runs). The scraper sends "Authorization: Bearer <token>".
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -63,16 +83,75 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Serve checkout/payment endpoints from async views (api/async_views.py).
+# Turn on when running under ASGI, e.g. `uvicorn config.asgi:application`.
+ASYNC_PAYMENTS = os.getenv('ASYNC_PAYMENTS') == 'True'
+
 # Database
-# Using SQLite as requested
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-        'OPTIONS': {
-            'timeout': 30,  # Wait up to 20 seconds for the lock to clear
+# Using SQLite as requested. DB_ENGINE switches to another backend
+# (e.g. django.db.backends.postgresql, configured with DB_NAME/DB_USER/...).
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # Keep each worker's connection open between requests (pragmas run once).
+            # config.asgi defaults it to 0: connections there are per sync_to_async thread
+            'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': 30,  # Wait up to 30 seconds for the lock to clear
+                # atomic() takes the write lock at BEGIN, so the wait above applies
+                # (a deferred read->write upgrade fails at once with "database is locked")
+                'transaction_mode': 'IMMEDIATE',
+            }
         }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', ''),
+            'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# Optional read replica for catalog reads (routing: core/db_router.py).
+# Locally, two SQLite files work: copy the primary with
+#   sqlite3 db.sqlite3 ".backup replica.sqlite3"
+# and start with DB_REPLICA_NAME=replica.sqlite3. The replica is never
+# migrated or written by Django; keep it fed by real replication
+# (Postgres streaming, Litestream...).
+if os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME'),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default'].get('PORT', '')),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# After a request writes (cart, checkout, orders...), that browser reads from
+# the primary for this long, so it never sees replica lag on its own changes
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 15))
+
+# Applied to every new SQLite connection by core/db.py (connection_created hook)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # Readers no longer block behind checkout writers
+    'synchronous': 'NORMAL',    # fsync at checkpoints only; durable enough with WAL
+    'busy_timeout': 30000,      # ms, same as OPTIONS['timeout']
+    'cache_size': -20000,       # ~20 MB page cache per connection
+    'mmap_size': 268435456,     # 256 MB of the file read through mmap
+    'temp_store': 'MEMORY',     # Sorts/temp indexes in RAM
 }
 
 # Password validation
@@ -102,6 +181,17 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed names (js/app.3f2a9c1b.js) plus .gz/.br
+# copies, so {% static %} URLs change with the file and can be cached forever
+# (core/static.py). Brotli copies need `pip install brotli`; gzip always works.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.static.CompressedManifestStaticFilesStorage'},
+}
+# Serve STATIC_ROOT from the app (immutable caching, precompressed files).
+# Set to False when a CDN or web server serves /static/ instead.
+SERVE_STATIC = os.getenv('SERVE_STATIC', 'True') == 'True'
+
 # Media files (User uploads)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -152,20 +242,94 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Prints to te
 # EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASS')
 
 DEFAULT_FROM_EMAIL = 'Django Store <noreply@nurastire.com>'
+
+# Email outbox (EmailLog rows with status 'pending', see core/email_service.py)
+# 'thread': one background worker thread per process drains it
+# 'command': run `python manage.py send_queued_emails --loop` as a separate worker
+EMAIL_OUTBOX_WORKER = os.getenv('EMAIL_OUTBOX_WORKER', 'thread')
+EMAIL_OUTBOX_BATCH_SIZE = 50      # Emails per SMTP connection
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5     # Then the row is marked 'failed'
+EMAIL_OUTBOX_RETRY_BASE = 60      # Seconds; doubles on every failed attempt
+
+# Product image variants (thumbnails, WebP/AVIF sizes, see api/images.py)
+# 'thread': one background worker thread per process renders them after upload
+# 'command': run `python manage.py generate_image_variants --loop` as a separate worker
+IMAGE_PIPELINE_WORKER = os.getenv('IMAGE_PIPELINE_WORKER', 'thread')
+IMAGE_PIPELINE_BATCH_SIZE = 10    # Products per batch (the catalog cache is bumped once per batch)
 # Payment Config
 PAYSTACK_SECRET_KEY = os.getenv('PAYSTACK_SECRET_KEY')
 PAYSTACK_PUBLIC_KEY = os.getenv('PAYSTACK_PUBLIC_KEY')
 PAYSTACK_URL = os.getenv('PAYSTACK_URL')
-
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+PAYSTACK_CALLBACK_URL = os.getenv('PAYSTACK_CALLBACK_URL', 'http://127.0.0.1:8000/checkout/verify/')
+# Gateway HTTP client (pooled keep-alive session, see core/paystack.py)
+PAYSTACK_CONNECT_TIMEOUT = float(os.getenv('PAYSTACK_CONNECT_TIMEOUT', 3.05))  # seconds
+PAYSTACK_READ_TIMEOUT = float(os.getenv('PAYSTACK_READ_TIMEOUT', 10))  # seconds
+PAYSTACK_MAX_RETRIES = 2
+PAYSTACK_RETRY_BACKOFF = 0.3  # 0.3s, 0.6s, ...
+PAYSTACK_POOL_SIZE = 20
+
+# Cache tier, picked with the CACHE_BACKEND env var:
+# - locmem (default): per-process, fine for runserver
+# - sqlite: one WAL SQLite file shared by every worker on the box (LRU + size caps)
+# - file: Django's file-based cache, shared through the filesystem
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'sqlite':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache.sqlite3'),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+                'MAX_BYTES': int(os.getenv('CACHE_MAX_BYTES', 256 * 1024 * 1024)),  # 256 MB
+                'CULL_FREQUENCY': 10,  # Evict the oldest 10% when full
+            },
+        }
     }
-}
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / '.cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
+    }
+
+# Sessions read through the shared cache (DB stays the source of truth).
+# Throttle counters (AnonRateThrottle/UserRateThrottle) use the default cache too.
+if CACHE_BACKEND != 'locmem':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Product/Category list responses. Safe to keep long: every catalog
+# save/delete bumps the version key, which invalidates all entries.
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 6  # 6 hours
+
+# Max age (seconds) of each worker's in-memory delivery fee table (core/delivery_zones.py).
+# Admin edits reload it at once through the shared cache; this bounds staleness
+# when the cache is per-process (locmem) and other workers can't see the edit.
+DELIVERY_ZONES_TTL = int(os.getenv('DELIVERY_ZONES_TTL', 60))
+
+# How long POST /api/cart/batch/ remembers an Idempotency-Key (replays get the stored response)
+CART_IDEMPOTENCY_TTL = 60 * 60 * 24  # 24 hours
+# How long an in-flight claim blocks the key (409) if its worker dies before answering
+CART_IDEMPOTENCY_PENDING_TTL = 60
 
 # config/settings.py
 
+# ERROR-level Django logs go to this file ('' turns it off). `manage.py test`
+# never writes it: the failures the suite provokes on purpose are not errors.
+ERROR_LOG_FILE = os.getenv('ERROR_LOG_FILE', str(BASE_DIR / 'errors.log'))
+TESTING = sys.argv[1:2] == ['test']
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -179,8 +343,10 @@ LOGGING = {
         'file': {
             'level': 'ERROR',
             'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'errors.log', # Saves to project root
+            'filename': ERROR_LOG_FILE, # Project root by default
             'formatter': 'verbose',
+        } if ERROR_LOG_FILE and not TESTING else {
+            'class': 'logging.NullHandler',
         },
         'console': {
             'class': 'logging.StreamHandler',
@@ -192,6 +358,12 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        # One JSON line per request when REQUEST_PROFILING is on
+        'core.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -3,8 +3,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics_view, profiling_report_view
+
 urlpatterns = [
+    path('admin/profiling/', profiling_report_view, name='profiling_report'), # Before the admin catch-all
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'), # Prometheus scrape target
     path('api/', include('api.urls')),  # API Endpoints
     path('', include('web.urls')),      # Frontend Interface
 ]
@@ -3,7 +3,12 @@ from .models import DeliveryZone, Profile, EmailLog
 
 # Register existing models if you haven't
 admin.site.register(Profile)
-admin.site.register(EmailLog)
+
+@admin.register(EmailLog)
+class EmailLogAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'subject')
 
 @admin.register(DeliveryZone)
 class DeliveryZoneAdmin(admin.ModelAdmin):
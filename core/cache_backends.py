@@ -0,0 +1,214 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """
+    Shared cache tier stored in its own SQLite file (WAL mode).
+    Every gunicorn worker on the box reads and writes the same entries, so
+    cached catalog pages, throttle counters and sessions are shared
+    without running Redis/Memcached.
+
+    - LRU eviction: least recently read entries go first
+    - Size caps: OPTIONS MAX_ENTRIES (row count) and MAX_BYTES (payload size),
+      checked against running totals in `cache_stats` (kept by triggers), so
+      a write never counts the table
+    - incr/decr are atomic across processes (BEGIN IMMEDIATE)
+    """
+    # Only rewrite the access time if it is older than this (seconds).
+    # Keeps hot reads from turning into writes.
+    LRU_RESOLUTION = 5
+
+    # Bumped when the tables change; older cache files are dropped and rebuilt
+    SCHEMA_VERSION = 2
+    SCHEMA = (
+        # value last: the small columns stay on the row's first page
+        'CREATE TABLE cache ('
+        'key TEXT PRIMARY KEY, size INTEGER NOT NULL, expires REAL, accessed REAL NOT NULL, '
+        'value BLOB NOT NULL)',
+        'CREATE INDEX cache_accessed ON cache (accessed)',
+        'CREATE TABLE cache_stats (entries INTEGER NOT NULL, bytes INTEGER NOT NULL)',
+        'INSERT INTO cache_stats VALUES (0, 0)',
+        'CREATE TRIGGER cache_stats_insert AFTER INSERT ON cache BEGIN '
+        'UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size; END',
+        'CREATE TRIGGER cache_stats_delete AFTER DELETE ON cache BEGIN '
+        'UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size; END',
+        'CREATE TRIGGER cache_stats_update AFTER UPDATE OF size ON cache BEGIN '
+        'UPDATE cache_stats SET bytes = bytes + NEW.size - OLD.size; END',
+    )
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._max_bytes = int(options.get('MAX_BYTES', 0))  # 0 = no byte cap
+        self._local = threading.local()
+        self._schema_ready = False
+
+    # --- Connection handling (one per thread, re-opened after fork) ---
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._schema_ready:
+                self._create_schema(conn)
+                self._schema_ready = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute('BEGIN IMMEDIATE') # One worker builds it, the others wait and see it done
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+                # Only cached data lives here: rebuilding beats migrating
+                conn.execute('DROP TABLE IF EXISTS cache')
+                conn.execute('DROP TABLE IF EXISTS cache_stats')
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _write(self, sql, params=()):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute(sql, params)
+            conn.execute('COMMIT')
+            return cursor
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    # --- Cache API ---
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            self._write('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        if now - accessed > self.LRU_RESOLUTION:
+            self._write('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._store(key, value, timeout, replace=True)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._store(key, value, timeout, replace=False)
+
+    def _store(self, key, value, timeout, replace):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if not replace:
+                row = conn.execute('SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+                if row is not None and (row[0] is None or row[0] > now):
+                    conn.execute('COMMIT')
+                    return False
+            # Upsert, not INSERT OR REPLACE: REPLACE's implicit delete skips the stats trigger
+            conn.execute(
+                'INSERT INTO cache (key, size, expires, accessed, value) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET size = excluded.size, expires = excluded.expires, '
+                'accessed = excluded.accessed, value = excluded.value',
+                (key, len(blob), expires, now, blob),
+            )
+            self._cull(conn, now)
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _cull(self, conn, now):
+        # Running totals: one row, no table scan per write
+        count, total_bytes = conn.execute('SELECT entries, bytes FROM cache_stats').fetchone()
+        over_bytes = self._max_bytes and total_bytes > self._max_bytes
+        if count <= self._max_entries and not over_bytes:
+            return
+
+        # Expired rows are free to drop
+        conn.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (now,))
+        count, total_bytes = conn.execute('SELECT entries, bytes FROM cache_stats').fetchone()
+        over_bytes = self._max_bytes and total_bytes > self._max_bytes
+        if count <= self._max_entries and not over_bytes:
+            return
+
+        # Then the least recently used chunk (1/CULL_FREQUENCY of the table)
+        if self._cull_frequency == 0:
+            conn.execute('DELETE FROM cache')
+            return
+        conn.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(count // self._cull_frequency, 1),),
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._write(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL)
+            conn.execute('UPDATE cache SET value = ?, size = ? WHERE key = ?', (blob, len(blob), key))
+            conn.execute('COMMIT')
+            return new_value
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        self._write('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Connections are kept open for the life of the thread on purpose
+        pass
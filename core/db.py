@@ -0,0 +1,18 @@
+from django.conf import settings
+
+
+def sqlite_pragma_statements():
+    return [f'PRAGMA {name} = {value}' for name, value in settings.SQLITE_PRAGMAS.items()]
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    connection_created receiver (see CoreConfig.ready): tunes every new
+    SQLite connection. With CONN_MAX_AGE this runs once per worker thread,
+    not once per request.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in sqlite_pragma_statements():
+            cursor.execute(statement)
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pin'
+
+# Set for the duration of a catalog view (see ReplicaReadMixin)
+_replica_reads = ContextVar('replica_reads', default=False)
+# True once the current request wrote, or its browser wrote recently
+_pinned = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """ Reads inside go to `default` even within replica_reads() (e.g. cache fills). """
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    - Writes always go to `default`
+    - Reads go to `replica` only inside replica_reads() (the read-only catalog
+      endpoints), only when a replica is configured, and never for a request
+      that is pinned to the primary (read-your-writes)
+    - Everything else (cart, checkout, orders, admin) reads the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _pinned.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Later reads in this request must see this write
+        _pinned.set(True)
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Same data on both aliases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from replication
+        return db != REPLICA
+
+
+class ReplicaPinMiddleware:
+    """
+    Read-your-writes across requests: a request that wrote sets a short-lived
+    cookie, and requests carrying it skip the replica. Works for JWT and
+    session users alike, since the browser sends the cookie with its API calls.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned.set(request.COOKIES.get(PIN_COOKIE) == '1')
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and response.status_code < 400:
+                response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                    httponly=True, samesite='Lax')
+            return response
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
+
+
+class ReplicaReadMixin:
+    """ For read-only views whose queries may be served by the replica. """
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
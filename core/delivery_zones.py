@@ -0,0 +1,93 @@
+import hashlib
+import json
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import DeliveryZone
+
+# Bumped on every DeliveryZone change; other processes reload when it moves
+ZONES_VERSION_KEY = 'delivery_zones:version'
+
+
+class ZoneTable(NamedTuple):
+    version: object
+    fees: MappingProxyType    # normalized state -> fee (every zone, like the old .get())
+    zones: tuple              # active zones for the checkout dropdown
+    etag: str
+    expires: float            # time.monotonic() after which it is reloaded anyway
+
+
+def normalize_state(name):
+    """ ' Kano  State' / 'kano' / 'KANO' -> 'kano' """
+    key = ' '.join((name or '').split()).casefold()
+    return key.removesuffix(' state')
+
+
+_table = None
+_lock = threading.Lock()
+
+
+def _load(version):
+    # Always the primary: checkout charges from this table, and a lagging
+    # replica would otherwise be remembered under the new version
+    rows = list(
+        DeliveryZone.objects.using('default').order_by('state')
+        .values('id', 'state', 'fee', 'estimated_time', 'is_active')
+    )
+    zones = tuple(
+        MappingProxyType({'id': r['id'], 'state': r['state'], 'fee': r['fee'], 'estimated_time': r['estimated_time']})
+        for r in rows if r['is_active']
+    )
+    body = json.dumps([dict(zone) for zone in zones], cls=DjangoJSONEncoder)
+    return ZoneTable(
+        version=version,
+        fees=MappingProxyType({normalize_state(r['state']): r['fee'] for r in rows}),
+        zones=zones,
+        etag=hashlib.md5(body.encode()).hexdigest(),
+        expires=time.monotonic() + settings.DELIVERY_ZONES_TTL,
+    )
+
+
+def _is_current(table, version):
+    return table is not None and table.version == version and time.monotonic() < table.expires
+
+
+def get_zone_table():
+    """
+    Process-wide, read-only copy of the DeliveryZone table (a few dozen rows).
+    Loaded on first use, then served from memory: each call costs one cache
+    read to notice edits made by other workers, and no database query.
+    With a per-process cache (locmem) other workers never see the version
+    move, so every copy is also reloaded after DELIVERY_ZONES_TTL seconds.
+    """
+    global _table
+    version = cache.get(ZONES_VERSION_KEY)
+    table = _table
+    if not _is_current(table, version):
+        with _lock:
+            if not _is_current(_table, version):
+                _table = _load(version)
+            table = _table
+    return table
+
+
+def get_zone_fee(state_name, default=None):
+    return get_zone_table().fees.get(normalize_state(state_name), default)
+
+
+def invalidate_zone_table():
+    global _table
+    _table = None
+    cache.set(ZONES_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_zone_table_on_commit():
+    # Reload only once the change is visible to the next read
+    transaction.on_commit(invalidate_zone_table)
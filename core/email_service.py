@@ -1,77 +1,217 @@
+import logging
 import threading
-from django.core.mail import EmailMultiAlternatives
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .metrics import EMAILS
 from .models import EmailLog
 
-class EmailThread(threading.Thread):
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold a claimed row before others can take it over.
+# Renewed row by row as the batch is sent (see _renew_lease).
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def _retry_delay(attempts):
+    """ Exponential backoff: 1, 2, 4, 8... minutes (capped at 1 hour). """
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def _claim_batch(batch_size):
     """
-    Background Thread to send email without blocking the API response.
+    Marks up to `batch_size` due rows as 'sending' and returns them.
+    The claim is a conditional UPDATE, so two workers (threads or
+    processes) never pick up the same email.
     """
-    def __init__(self, subject, recipient_list, html_content, text_content):
-        self.subject = subject
-        self.recipient_list = recipient_list
-        self.html_content = html_content
-        self.text_content = text_content
-        threading.Thread.__init__(self)
+    now = timezone.now()
+    due = (
+        EmailLog.objects.filter(status='pending', next_attempt_at__isnull=True) |
+        EmailLog.objects.filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+    )
+    ids = list(due.order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    lease_until = now + CLAIM_LEASE
+    due.filter(id__in=ids).update(status='sending', next_attempt_at=lease_until)
+    # Rows still carrying our lease timestamp are ours
+    return list(EmailLog.objects.filter(id__in=ids, status='sending', next_attempt_at=lease_until))
+
+
+def deliver_pending_emails(batch_size=None):
+    """
+    Sends one batch of queued emails over a single SMTP connection.
+    Returns the number of rows processed (0 when the outbox is empty).
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0
+    _send_batch(batch, max_attempts)
+    return len(batch)
+
+
+def _renew_lease(log):
+    """
+    Extends our claim on `log` right before it is sent. A slow batch can
+    outlive CLAIM_LEASE and be reclaimed by another worker: the UPDATE only
+    matches while the row still carries our lease timestamp, so a row that
+    changed hands is skipped instead of sent twice.
+    """
+    lease_until = timezone.now() + CLAIM_LEASE
+    renewed = EmailLog.objects.filter(
+        id=log.id, status='sending', next_attempt_at=log.next_attempt_at,
+    ).update(next_attempt_at=lease_until)
+    if renewed:
+        log.next_attempt_at = lease_until
+    return bool(renewed)
+
+
+def _send_batch(batch, max_attempts):
+    """ Sends claimed rows over one SMTP connection. """
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # SMTP is down: put the whole batch back with backoff
+        for log in batch:
+            _mark_failed(log, e, max_attempts)
+        return
+
+    try:
+        for log in batch:
+            if not _renew_lease(log):
+                logger.info("Email #%s was reclaimed by another worker; skipping", log.id)
+                continue
 
-    def run(self):
-        try:
             msg = EmailMultiAlternatives(
-                subject=self.subject,
-                body=self.text_content, # Plain text fallback
+                subject=log.subject,
+                body=log.body, # Plain text fallback
                 from_email=settings.DEFAULT_FROM_EMAIL,
-                to=self.recipient_list
+                to=[log.recipient],
+                connection=connection
             )
-            msg.attach_alternative(self.html_content, "text/html")
-            msg.send()
-            
+            if log.html_body:
+                msg.attach_alternative(log.html_body, "text/html")
+
+            try:
+                msg.send()
+            except Exception as e:
+                _mark_failed(log, e, max_attempts)
+                continue
+
             # Log Success
-            EmailLog.objects.create(
-                recipient=self.recipient_list[0],
-                subject=self.subject,
-                body=self.text_content,
-                status='sent'
-            )
-        except Exception as e:
-            # Log Failure
-            EmailLog.objects.create(
-                recipient=self.recipient_list[0],
-                subject=self.subject,
-                body=str(e),
-                status='failed',
-                error_message=str(e)
-            )
+            log.status = 'sent'
+            log.attempts += 1
+            log.sent_at = timezone.now()
+            log.next_attempt_at = None
+            log.error_message = None
+            log.save(update_fields=['status', 'attempts', 'sent_at', 'next_attempt_at', 'error_message'])
+            EMAILS.inc(outcome='sent')
+    finally:
+        connection.close()
+
+
+def _mark_failed(log, error, max_attempts):
+    log.attempts += 1
+    log.error_message = str(error)
+    if log.attempts >= max_attempts:
+        log.status = 'failed'
+        log.next_attempt_at = None
+    else:
+        log.status = 'pending'
+        log.next_attempt_at = timezone.now() + _retry_delay(log.attempts)
+    log.save(update_fields=['status', 'attempts', 'error_message', 'next_attempt_at'])
+    EMAILS.inc(outcome='failed' if log.status == 'failed' else 'retry')
+    logger.warning("Email #%s to %s failed (attempt %s): %s", log.id, log.recipient, log.attempts, error)
+
+
+class OutboxWorker(threading.Thread):
+    """
+    One background thread per process that drains the outbox.
+    Replaces the old thread-per-email: a bulk action queuing 5,000 emails
+    now means 5,000 INSERTs and one worker, not 5,000 threads and SMTP logins.
+    Disable with EMAIL_OUTBOX_WORKER = 'command' and run
+    `manage.py send_queued_emails --loop` instead.
+    """
+    POLL_INTERVAL = 30 # Seconds; also picks up retries whose backoff expired
+
+    def __init__(self):
+        super().__init__(name='email-outbox', daemon=True)
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.POLL_INTERVAL)
+            self.wakeup.clear()
+            try:
+                while deliver_pending_emails():
+                    pass
+            except Exception:
+                logger.exception("Email outbox worker crashed while draining")
+            finally:
+                close_old_connections()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_outbox_worker():
+    global _worker
+    if getattr(settings, 'EMAIL_OUTBOX_WORKER', 'thread') != 'thread':
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker()
+            _worker.start()
+    _worker.wakeup.set()
+
 
 class EmailService:
+    @staticmethod
+    def queue(subject, recipient, html_content, text_content):
+        """
+        Writes the email to the outbox (one INSERT) and nudges the worker
+        once the surrounding transaction commits.
+        """
+        log = EmailLog.objects.create(
+            recipient=recipient,
+            subject=subject,
+            body=text_content,
+            html_body=html_content,
+            status='pending'
+        )
+        transaction.on_commit(wake_outbox_worker)
+        return log
+
     @staticmethod
     def send_welcome_email(user):
         """
         Prepares the welcome email and dispatches it in the background.
         """
         subject = "Welcome to Django Store!"
-        
+
         # Render HTML template
         context = {'username': user.username}
         html_content = render_to_string('emails/welcome.html', context)
         text_content = f"Welcome {user.username}! Thank you for joining Django Store."
 
-        # Dispatch via Thread
-        EmailThread(
-            subject=subject,
-            recipient_list=[user.email],
-            html_content=html_content,
-            text_content=text_content
-        ).start()
-
+        # Dispatch via Outbox
+        EmailService.queue(subject, user.email, html_content, text_content)
 
     @staticmethod
-    def send_order_status_email(order):
-        """
-        Sends an email when order status changes.
-        """
+    def build_order_status_email(order):
         subject = f"Order Update: #{order.id} is {order.get_status_display()}"
-        
+
         # Simple HTML Template for status
         html_content = f"""
         <html>
@@ -85,10 +225,31 @@ class EmailService:
         </body>
         </html>
         """
-        
-        EmailThread(
+        return EmailLog(
+            recipient=order.user.email,
             subject=subject,
-            recipient_list=[order.user.email],
-            html_content=html_content,
-            text_content=f"Your order #{order.id} is now {order.get_status_display()}."
-        ).start()
\ No newline at end of file
+            body=f"Your order #{order.id} is now {order.get_status_display()}.",
+            html_body=html_content,
+            status='pending'
+        )
+
+    @staticmethod
+    def send_order_status_email(order):
+        """
+        Sends an email when order status changes.
+        """
+        log = EmailService.build_order_status_email(order)
+        EmailService.queue(log.subject, log.recipient, log.html_body, log.body)
+
+    @staticmethod
+    def send_order_status_emails(orders):
+        """
+        Bulk version for admin actions: one INSERT for the whole batch.
+        Pass orders with select_related('user').
+        """
+        logs = EmailLog.objects.bulk_create(
+            [EmailService.build_order_status_email(order) for order in orders],
+            batch_size=500
+        )
+        transaction.on_commit(wake_outbox_worker)
+        return len(logs)
@@ -0,0 +1,126 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.db import sqlite_pragma_statements
+
+
+SCHEMA = [
+    "CREATE TABLE product (id INTEGER PRIMARY KEY, category_id INTEGER, name TEXT, price REAL, stock INTEGER)",
+    "CREATE INDEX product_category ON product (category_id, id)",
+    "CREATE TABLE sale (id INTEGER PRIMARY KEY, product_id INTEGER, quantity INTEGER, created_at REAL)",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency benchmark for the SQLite settings: catalog readers and checkout "
+        "writers hammer a scratch database, first with the old defaults (rollback "
+        "journal, new connection per request) and then with SQLITE_PRAGMAS and "
+        "persistent connections. Prints reads/s and writes/s for both."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (default: 8)')
+        parser.add_argument('--writers', type=int, default=2, help='Writer threads (default: 2)')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per run (default: 5)')
+        parser.add_argument('--rows', type=int, default=5000, help='Products in the scratch DB (default: 5000)')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in ('baseline', 'tuned'):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                self._seed(path, options['rows'])
+                results[mode] = self._run(path, mode, options)
+
+        self.stdout.write(f"{'':10} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+        for mode, (reads, writes, errors) in results.items():
+            self.stdout.write(f"{mode:10} {reads:>10.0f} {writes:>10.0f} {errors:>8}")
+
+        base, tuned = results['baseline'], results['tuned']
+        self.stdout.write(self.style.SUCCESS(
+            f"Reads x{tuned[0] / max(base[0], 1):.1f}, writes x{tuned[1] / max(base[1], 1):.1f}"
+        ))
+
+    def _seed(self, path, rows):
+        conn = sqlite3.connect(path, isolation_level=None)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO product (category_id, name, price, stock) VALUES (?, ?, ?, ?)",
+            [(i % 20, f"Product {i}", 1000 + i, 1_000_000) for i in range(rows)]
+        )
+        conn.execute("COMMIT")
+        conn.close()
+
+    def _connect(self, path, mode):
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        if mode == 'tuned':
+            for statement in sqlite_pragma_statements():
+                conn.execute(statement)
+        return conn
+
+    def _run(self, path, mode, options):
+        rows = options['rows']
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(op):
+            # Baseline reopens the file for every "request" (CONN_MAX_AGE = 0)
+            conn = self._connect(path, mode) if mode == 'tuned' else None
+            done = errors = 0
+            while not stop.is_set():
+                c = conn or self._connect(path, mode)
+                try:
+                    op(c)
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if c.in_transaction:
+                        c.execute("ROLLBACK")
+                finally:
+                    if conn is None:
+                        c.close()
+            if conn is not None:
+                conn.close()
+            with lock:
+                counts['reads' if op is read else 'writes'] += done
+                counts['errors'] += errors
+
+        def read(conn):
+            # A catalog page plus a product detail
+            conn.execute(
+                "SELECT id, name, price, stock FROM product WHERE category_id = ? ORDER BY id DESC LIMIT 24",
+                (random.randrange(20),)
+            ).fetchall()
+            conn.execute("SELECT * FROM product WHERE id = ?", (random.randrange(1, rows + 1),)).fetchone()
+
+        def write(conn):
+            # A checkout: guarded stock decrement + a sale row, in one transaction
+            product_id = random.randrange(1, rows + 1)
+            conn.execute("BEGIN IMMEDIATE" if mode == 'tuned' else "BEGIN")
+            conn.execute("UPDATE product SET stock = stock - 1 WHERE id = ? AND stock > 0", (product_id,))
+            conn.execute("INSERT INTO sale (product_id, quantity, created_at) VALUES (?, 1, ?)", (product_id, time.time()))
+            conn.execute("COMMIT")
+
+        threads = (
+            [threading.Thread(target=worker, args=(read,)) for _ in range(options['readers'])] +
+            [threading.Thread(target=worker, args=(write,)) for _ in range(options['writers'])]
+        )
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        seconds = options['duration']
+        return counts['reads'] / seconds, counts['writes'] / seconds, counts['errors']
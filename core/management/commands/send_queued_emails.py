@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.email_service import deliver_pending_emails
+
+
+class Command(BaseCommand):
+    help = (
+        "Delivers queued emails from the EmailLog outbox in batches over one SMTP connection. "
+        "Use --loop to run as a dedicated worker (with EMAIL_OUTBOX_WORKER = 'command')."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Emails per SMTP connection (default: EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and poll for new emails')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to sleep when the outbox is empty (default: 5)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = deliver_pending_emails(options['batch_size'])
+            total += processed
+
+            if processed:
+                continue
+            if not options['loop']:
+                break
+
+            close_old_connections()
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} queued emails."))
@@ -0,0 +1,282 @@
+"""
+Prometheus-style metrics, served as text at /metrics.
+
+Counters and histograms are kept in process memory (a dict behind a lock,
+so recording costs no I/O). To add up several workers, set METRICS_DIR:
+each process then writes a snapshot of its values to
+METRICS_DIR/metrics-<pid>.json every METRICS_FLUSH_SECONDS, and /metrics
+sums every snapshot in the directory with its own live values.
+Counters of workers that have exited stay in the sum (counters never go
+down), so empty the directory when the app is (re)deployed, as with
+prometheus_client's multiprocess mode.
+
+Usage:
+    CHECKOUTS = Counter('checkouts_total', 'Checkouts', ['outcome'])
+    CHECKOUTS.inc(outcome='created')
+    with CHECKOUT_SECONDS.time(payment_method='pod'):
+        ...
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PREFIX = 'nurastore_'
+
+# Seconds; the last bucket (+Inf) is implicit
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = {}
+        self._values = {} # (name, labels) -> number | [bucket counts..., sum, count]
+        self._pid = os.getpid()
+        self._flusher = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _check_fork(self):
+        # A forked worker must not report its parent's counts as its own
+        if self._pid != os.getpid():
+            self._values = {}
+            self._pid = os.getpid()
+            self._flusher = None
+
+    def add(self, name, labels, amount):
+        with self._lock:
+            self._check_fork()
+            self._values[(name, labels)] = self._values.get((name, labels), 0) + amount
+        self._ensure_flusher()
+
+    def observe(self, name, labels, buckets, value):
+        with self._lock:
+            self._check_fork()
+            series = self._values.get((name, labels))
+            if series is None:
+                series = self._values[(name, labels)] = [0] * (len(buckets) + 3)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1 # Per-bucket; made cumulative on export
+                    break
+            else:
+                series[len(buckets)] += 1 # +Inf
+            series[-2] += value
+            series[-1] += 1
+        self._ensure_flusher()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return [
+                [name, list(labels), value if isinstance(value, (int, float)) else list(value)]
+                for (name, labels), value in self._values.items()
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    # --- Multi-process (METRICS_DIR) ---
+
+    def _path(self):
+        return os.path.join(settings.METRICS_DIR, f"metrics-{os.getpid()}.json")
+
+    def flush(self):
+        """ Writes this process's values for the other workers' /metrics. """
+        if not settings.METRICS_DIR:
+            return
+        data = json.dumps({'pid': os.getpid(), 'values': self.snapshot()})
+        path = self._path()
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path) # Readers never see half a file
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or not settings.METRICS_DIR:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except OSError:
+                pass # Try again next tick
+
+    def collect(self):
+        """ Every process's values, summed per series. """
+        totals = {}
+
+        def merge(values):
+            for name, labels, value in values:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if isinstance(value, list):
+                    current = totals.setdefault(key, [0] * len(value))
+                    totals[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+
+        merge(self.snapshot()) # Live values for this process
+        if settings.METRICS_DIR:
+            own = self._path()
+            for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        merge(json.load(f)['values'])
+                except (OSError, ValueError):
+                    continue # Being replaced right now; next scrape has it
+        return totals
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush() if settings.configured and settings.METRICS_DIR else None)
+
+
+def _labels(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple((name, str(labels[name])) for name in labelnames)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        registry.add(self.name, _labels(self.labelnames, labels), amount)
+
+    def value(self, **labels):
+        """ Current count of one series (every worker's, with METRICS_DIR). """
+        return registry.collect().get((self.name, _labels(self.labelnames, labels)), 0)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        registry.observe(self.name, _labels(self.labelnames, labels), self.buckets, value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+# --- Metrics recorded across the app ---
+
+HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests by endpoint and status code.',
+                        ['method', 'endpoint', 'status'])
+HTTP_DURATION = Histogram('http_request_duration_seconds', 'HTTP request latency by endpoint.',
+                          ['method', 'endpoint'])
+CHECKOUTS = Counter('checkouts_total', 'Checkout attempts by payment method and outcome.',
+                    ['payment_method', 'outcome'])
+CHECKOUT_DURATION = Histogram('checkout_duration_seconds', 'Checkout latency, gateway call included.',
+                              ['payment_method'])
+PAYMENT_VERIFICATIONS = Counter('payment_verifications_total', 'Paystack payment verifications by outcome.',
+                                ['outcome'])
+PAYSTACK_REQUESTS = Counter('paystack_requests_total', 'Calls to the Paystack API by operation and outcome.',
+                            ['operation', 'outcome'])
+PAYSTACK_DURATION = Histogram('paystack_request_duration_seconds', 'Paystack API call latency.',
+                              ['operation'])
+EMAILS = Counter('emails_total', 'Outbox deliveries by outcome (sent, retry, failed).', ['outcome'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Response cache lookups by cache and result.',
+                         ['cache', 'result'])
+
+
+class MetricsMiddleware:
+    """ Request count and latency per endpoint (URL name, so ids don't add series). """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.view_name if match else '<unmatched>'
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+        HTTP_DURATION.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+        return response
+
+
+# --- Text exposition format ---
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(gauges=()):
+    """
+    All registered metrics (summed across processes) plus `gauges`, a list
+    of (name, help, [(labels, value), ...]) read fresh at scrape time.
+    """
+    totals = registry.collect()
+    lines = []
+    for metric in registry.metrics.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for (name, labels), value in sorted(totals.items()):
+            if name != metric.name:
+                continue
+            if metric.kind == 'counter':
+                lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value):
+                cumulative += count
+                bucket_labels = labels + (('le', _number(float(bound))),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+
+    for name, documentation, samples in gauges:
+        lines.append(f"# HELP {PREFIX}{name} {documentation}")
+        lines.append(f"# TYPE {PREFIX}{name} gauge")
+        for labels, value in samples:
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_number(value)}")
+    return '\n'.join(lines) + '\n'
@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 class Profile(models.Model):
@@ -33,20 +33,34 @@ def save_user_profile(sender, instance, **kwargs):
 class EmailLog(models.Model):
     """
     Tracks every email sent by the system for auditing and debugging.
+    Doubles as the outbox: rows are written as 'pending' and delivered
+    in batches by core.email_service (see deliver_pending_emails).
     """
     STATUS_CHOICES = (
         ('sent', 'Sent'),
         ('failed', 'Failed'),
         ('pending', 'Pending'),
+        ('sending', 'Sending'), # Claimed by a worker
     )
 
     recipient = models.EmailField()
     subject = models.CharField(max_length=255)
     body = models.TextField() # Store the HTML or Text content
+    html_body = models.TextField(blank=True, default='')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     error_message = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Outbox bookkeeping
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(blank=True, null=True) # Retry backoff / claim lease
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='emaillog_outbox_idx'),
+        ]
+
     def __str__(self):
         return f"{self.subject} -> {self.recipient} ({self.status})"
 
@@ -61,4 +75,11 @@ class DeliveryZone(models.Model):
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
-        return f"{self.state} - ₦{self.fee}"
\ No newline at end of file
+        return f"{self.state} - ₦{self.fee}"
+
+# Keep the in-memory fee table (core.delivery_zones) in sync with admin edits
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def reload_delivery_zones(sender, **kwargs):
+    from .delivery_zones import invalidate_zone_table_on_commit # delivery_zones imports this module
+    invalidate_zone_table_on_commit()
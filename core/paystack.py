@@ -1,6 +1,98 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
 
+from .metrics import PAYSTACK_DURATION, PAYSTACK_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def _build_session():
+    """
+    One pooled Session per process: keep-alive connections are reused, so
+    checkouts and verifications skip the TCP + TLS handshake.
+    Retries:
+    - Connection failures: retried for every call (nothing reached Paystack)
+    - 502/503/504 and read errors: retried for GET (verify) only, since
+      re-POSTing /transaction/initialize could open a second transaction
+    """
+    retry = Retry(
+        total=settings.PAYSTACK_MAX_RETRIES,
+        backoff_factor=settings.PAYSTACK_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=settings.PAYSTACK_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+class CallStats:
+    """ In-process latency/error counters for gateway calls. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, operation, seconds, ok):
+        with self._lock:
+            stat = self._stats.setdefault(operation, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            ms = seconds * 1000
+            stat['calls'] += 1
+            stat['total_ms'] += ms
+            stat['max_ms'] = max(stat['max_ms'], ms)
+            if not ok:
+                stat['errors'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                op: dict(stat, avg_ms=round(stat['total_ms'] / stat['calls'], 1))
+                for op, stat in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+call_stats = CallStats()
+
+
+def record_metrics(operation, seconds, ok):
+    # call_stats is this process only; /metrics adds up every worker
+    PAYSTACK_REQUESTS.inc(operation=operation, outcome='ok' if ok else 'error')
+    PAYSTACK_DURATION.observe(seconds, operation=operation)
+
+
 class Paystack:
     def __init__(self):
         self.secret_key = settings.PAYSTACK_SECRET_KEY
@@ -9,33 +101,66 @@ class Paystack:
             "Authorization": f"Bearer {self.secret_key}",
             "Content-Type": "application/json",
         }
+        # (connect, read) seconds. A slow gateway can no longer hang a worker.
+        self.timeout = (
+            settings.PAYSTACK_CONNECT_TIMEOUT,
+            settings.PAYSTACK_READ_TIMEOUT,
+        )
+        self.session = get_session()
 
-    def initialize_transaction(self, email, amount, order_id):
+    def _request(self, operation, method, url, **kwargs):
         """
-        Initializes a transaction and returns the authorization URL.
-        Amount must be in Kobo (Naira * 100).
+        Sends the request through the pooled session and records latency.
+        Returns the decoded JSON body; raises on network/JSON errors.
         """
-        url = f"{self.base_url}/transaction/initialize"
-        
-        data = {
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, url, headers=self.headers, timeout=self.timeout, **kwargs)
+            data = response.json()
+            ok = bool(data.get('status'))
+            return data
+        finally:
+            elapsed = time.perf_counter() - start
+            call_stats.record(operation, elapsed, ok)
+            record_metrics(operation, elapsed, ok)
+            logger.info("paystack %s %.1fms ok=%s", operation, elapsed * 1000, ok)
+
+    def _initialize_payload(self, email, amount, order_id):
+        return {
             "email": email,
             "amount": int(amount * 100), # Convert to Kobo
             "metadata": {"order_id": order_id},
-            "callback_url": "http://127.0.0.1:8000/checkout/verify/" # Frontend will handle this
+            "callback_url": settings.PAYSTACK_CALLBACK_URL # Frontend will handle this
         }
 
+    @staticmethod
+    def _parse_initialize(response_data):
+        if response_data['status']:
+            return {
+                'status': True,
+                'auth_url': response_data['data']['authorization_url'],
+                'access_code': response_data['data']['access_code'],
+                'reference': response_data['data']['reference']
+            }
+        return {'status': False, 'message': response_data.get('message', 'Initialization failed')}
+
+    @staticmethod
+    def _parse_verify(response_data):
+        if response_data['status'] and response_data['data']['status'] == 'success':
+            return {'status': True, 'amount': response_data['data']['amount']}
+        return {'status': False}
+
+    def initialize_transaction(self, email, amount, order_id):
+        """
+        Initializes a transaction and returns the authorization URL.
+        Amount must be in Kobo (Naira * 100).
+        """
+        url = f"{self.base_url}/transaction/initialize"
+        data = self._initialize_payload(email, amount, order_id)
+
         try:
-            response = requests.post(url, headers=self.headers, json=data)
-            response_data = response.json()
-            
-            if response_data['status']:
-                return {
-                    'status': True, 
-                    'auth_url': response_data['data']['authorization_url'],
-                    'access_code': response_data['data']['access_code'],
-                    'reference': response_data['data']['reference']
-                }
-            return {'status': False, 'message': response_data.get('message', 'Initialization failed')}
+            return self._parse_initialize(self._request('initialize', 'POST', url, json=data))
         except Exception as e:
             return {'status': False, 'message': str(e)}
 
@@ -44,13 +169,83 @@ class Paystack:
         Verifies the transaction status with Paystack.
         """
         url = f"{self.base_url}/transaction/verify/{reference}"
-        
+
+        try:
+            return self._parse_verify(self._request('verify', 'GET', url))
+        except Exception as e:
+            return {'status': False, 'message': str(e)}
+
+
+# --- Async client (used by api/async_views.py under ASGI) ---
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    One pooled httpx.AsyncClient per event loop. Under ASGI there is a
+    single loop per worker, so all in-flight gateway calls share its
+    keep-alive pool without tying up a thread each.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.PAYSTACK_READ_TIMEOUT, connect=settings.PAYSTACK_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.PAYSTACK_POOL_SIZE,
+                                max_keepalive_connections=settings.PAYSTACK_POOL_SIZE),
+            # Connection failures only: safe for POST as nothing was sent
+            transport=httpx.AsyncHTTPTransport(retries=settings.PAYSTACK_MAX_RETRIES),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+class AsyncPaystack(Paystack):
+    """
+    Same API as Paystack, but `await`-able. Retry and timeout policy match
+    the sync client: connect errors are retried for every call, gateway
+    5xx responses for verify (GET) only.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.client = get_async_client()
+
+    async def _arequest(self, operation, method, url, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        try:
+            attempt = 0
+            while True:
+                response = await self.client.request(method, url, headers=self.headers, **kwargs)
+                if (method != 'GET' or response.status_code not in (502, 503, 504)
+                        or attempt >= settings.PAYSTACK_MAX_RETRIES):
+                    break
+                attempt += 1
+                await asyncio.sleep(settings.PAYSTACK_RETRY_BACKOFF * 2 ** (attempt - 1))
+            data = response.json()
+            ok = bool(data.get('status'))
+            return data
+        finally:
+            elapsed = time.perf_counter() - start
+            call_stats.record(operation, elapsed, ok)
+            record_metrics(operation, elapsed, ok)
+            logger.info("paystack %s %.1fms ok=%s (async)", operation, elapsed * 1000, ok)
+
+    async def initialize_transaction(self, email, amount, order_id):
+        url = f"{self.base_url}/transaction/initialize"
+        data = self._initialize_payload(email, amount, order_id)
+
+        try:
+            return self._parse_initialize(await self._arequest('initialize', 'POST', url, json=data))
+        except Exception as e:
+            return {'status': False, 'message': str(e)}
+
+    async def verify_transaction(self, reference):
+        url = f"{self.base_url}/transaction/verify/{reference}"
+
         try:
-            response = requests.get(url, headers=self.headers)
-            response_data = response.json()
-            
-            if response_data['status'] and response_data['data']['status'] == 'success':
-                return {'status': True, 'amount': response_data['data']['amount']}
-            return {'status': False}
+            return self._parse_verify(await self._arequest('verify', 'GET', url))
         except Exception as e:
-            return {'status': False, 'message': str(e)}
\ No newline at end of file
+            return {'status': False, 'message': str(e)}
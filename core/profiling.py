@@ -0,0 +1,273 @@
+"""
+Opt-in request profiling (REQUEST_PROFILING = True).
+
+For every request ProfilingMiddleware records wall time, SQL count/time,
+cache hits/misses and time spent in DRF serializers, then:
+- adds them to the response as a `Server-Timing` header (browser devtools
+  show it under Network > Timing)
+- logs one JSON line on the `core.profiling` logger
+- adds the wall time to a rolling per-endpoint histogram, shown to staff
+  at /admin/profiling/
+
+The histogram lives in process memory (like core.paystack.call_stats), so
+each worker reports the requests it served itself.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the histogram buckets; the last one catches the rest
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+_current = ContextVar('request_profile', default=None)
+_MISSING = object()
+_patched = [] # (owner, attribute, original class attribute or _MISSING), for uninstall()
+
+
+class RequestProfile:
+    """ Counters for the request being served (see _current). """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_ms = 0.0
+        self.serialize_ms = 0.0
+        self.total_ms = 0.0
+        self._in_cache = False
+        self._in_serializer = False
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: times every query on the connection
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_ms += (time.perf_counter() - start) * 1000
+
+    def server_timing(self):
+        return ', '.join([
+            f'total;dur={self.total_ms:.1f}',
+            f'db;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"',
+            f'cache;dur={self.cache_ms:.1f};desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'serialize;dur={self.serialize_ms:.1f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_ms, 1),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_ms, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_ms': round(self.cache_ms, 1),
+            'serialize_ms': round(self.serialize_ms, 1),
+        }
+
+
+class EndpointStats:
+    """
+    Rolling latency histogram per endpoint: one slot per minute, slots
+    older than PROFILING_WINDOW_MINUTES are dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def _window(self):
+        return getattr(settings, 'PROFILING_WINDOW_MINUTES', 15)
+
+    def record(self, endpoint, profile):
+        minute = int(time.time() // 60)
+        with self._lock:
+            slots = self._slots.setdefault(endpoint, deque())
+            if not slots or slots[-1]['minute'] != minute:
+                slots.append({
+                    'minute': minute, 'buckets': [0] * len(BUCKETS_MS),
+                    'requests': 0, 'total_ms': 0.0, 'sql_count': 0, 'sql_ms': 0.0,
+                    'cache_hits': 0, 'cache_misses': 0, 'serialize_ms': 0.0,
+                })
+            while slots and slots[0]['minute'] <= minute - self._window():
+                slots.popleft()
+
+            slot = slots[-1]
+            slot['buckets'][next(i for i, bound in enumerate(BUCKETS_MS) if profile.total_ms <= bound)] += 1
+            slot['requests'] += 1
+            slot['total_ms'] += profile.total_ms
+            slot['sql_count'] += profile.sql_count
+            slot['sql_ms'] += profile.sql_ms
+            slot['cache_hits'] += profile.cache_hits
+            slot['cache_misses'] += profile.cache_misses
+            slot['serialize_ms'] += profile.serialize_ms
+
+    @staticmethod
+    def _percentile(buckets, requests, fraction):
+        # Upper bound of the bucket holding the percentile (an estimate)
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, buckets):
+            seen += count
+            if seen >= requests * fraction:
+                return bound
+        return BUCKETS_MS[-1]
+
+    def snapshot(self):
+        """ Per-endpoint totals for the window, busiest (total time) first. """
+        oldest = int(time.time() // 60) - self._window()
+        rows = []
+        with self._lock:
+            for endpoint, slots in self._slots.items():
+                live = [slot for slot in slots if slot['minute'] > oldest]
+                requests = sum(slot['requests'] for slot in live)
+                if not requests:
+                    continue
+                buckets = [sum(counts) for counts in zip(*(slot['buckets'] for slot in live))]
+                total = {key: sum(slot[key] for slot in live)
+                         for key in ('total_ms', 'sql_count', 'sql_ms', 'cache_hits', 'cache_misses', 'serialize_ms')}
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': requests,
+                    'total_ms': round(total['total_ms'], 1),
+                    'avg_ms': round(total['total_ms'] / requests, 1),
+                    'p50_ms': self._percentile(buckets, requests, 0.50),
+                    'p95_ms': self._percentile(buckets, requests, 0.95),
+                    'p99_ms': self._percentile(buckets, requests, 0.99),
+                    'avg_sql_count': round(total['sql_count'] / requests, 1),
+                    'avg_sql_ms': round(total['sql_ms'] / requests, 1),
+                    'avg_serialize_ms': round(total['serialize_ms'] / requests, 1),
+                    'cache_hits': total['cache_hits'],
+                    'cache_misses': total['cache_misses'],
+                    'buckets': buckets,
+                })
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._slots.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def endpoint_name(request):
+    """ "GET product_list": the URL name keeps the histogram small (no ids). """
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name or match._func_path) if match else '<unmatched>'
+    return f"{request.method} {view}"
+
+
+class ProfilingMiddleware:
+    """ First in MIDDLEWARE when REQUEST_PROFILING is on (see config/settings.py). """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        profile.total_ms = (time.perf_counter() - start) * 1000
+
+        endpoint = endpoint_name(request)
+        response['Server-Timing'] = profile.server_timing()
+        endpoint_stats.record(endpoint, profile)
+        logger.info(json.dumps({
+            'endpoint': endpoint, 'path': request.path, 'status': response.status_code, **profile.as_dict()
+        }))
+        return response
+
+
+# --- Instrumentation (installed from CoreConfig.ready when enabled) ---
+
+def _profiled_cache_get(get):
+    def profiled_get(self, key, default=None, version=None):
+        profile = _current.get()
+        # Outside a request, or called from another cache method (get_many, get_or_set)
+        if profile is None or profile._in_cache:
+            return get(self, key, default, version)
+
+        profile._in_cache = True
+        start = time.perf_counter()
+        try:
+            value = get(self, key, _MISSING, version)
+        finally:
+            profile._in_cache = False
+            profile.cache_ms += (time.perf_counter() - start) * 1000
+        if value is _MISSING:
+            profile.cache_misses += 1
+            return default
+        profile.cache_hits += 1
+        return value
+
+    profiled_get.profiled = True
+    return profiled_get
+
+
+def _profiled_serializer_data(data):
+    def profiled_data(self):
+        profile = _current.get()
+        # Nested .data calls are already inside the outer timing
+        if profile is None or profile._in_serializer:
+            return data(self)
+
+        profile._in_serializer = True
+        start = time.perf_counter()
+        try:
+            return data(self)
+        finally:
+            profile._in_serializer = False
+            profile.serialize_ms += (time.perf_counter() - start) * 1000
+
+    profiled_data.profiled = True
+    return profiled_data
+
+
+def install():
+    """
+    Wraps cache `get` for every configured backend and DRF's
+    BaseSerializer.data, so both report into the current request's profile.
+    The wrappers cost one ContextVar lookup outside profiled requests.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    for cache in settings.CACHES.values():
+        backend = import_string(cache['BACKEND'])
+        if not getattr(backend.get, 'profiled', False):
+            _patch(backend, 'get', _profiled_cache_get(backend.get))
+
+    if not getattr(BaseSerializer.data.fget, 'profiled', False):
+        _patch(BaseSerializer, 'data', property(_profiled_serializer_data(BaseSerializer.data.fget)))
+
+
+def uninstall():
+    """ Puts back what install() replaced (tests switch profiling off again). """
+    while _patched:
+        owner, name, original = _patched.pop()
+        if original is _MISSING: # Was inherited: drop the override
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+
+
+def _patch(owner, name, value):
+    _patched.append((owner, name, owner.__dict__.get(name, _MISSING)))
+    setattr(owner, name, value)
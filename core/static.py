@@ -0,0 +1,156 @@
+"""
+Static files: hashed names, precompressed copies and far-future caching.
+
+`collectstatic` (CompressedManifestStaticFilesStorage) writes every file
+under a content-hashed name (js/app.3f2a9c1b.js, listed in
+STATIC_ROOT/staticfiles.json) and, for text assets, `.gz` copies (and `.br`
+when the `brotli` package is installed). `{% static %}` then emits the
+hashed URLs, so a changed file gets a new URL and the old one can be cached
+forever.
+
+Without a CDN or web server in front, StaticFilesMiddleware serves
+STATIC_ROOT itself (SERVE_STATIC = True): hashed files with
+`Cache-Control: immutable` (repeat visits make no asset requests at all),
+the smallest encoding the browser accepts, and 304s for ETag revalidation.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+# Text formats worth compressing (images/fonts like woff2 already are)
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot')
+MIN_COMPRESS_SIZE = 256 # Bytes; below this the headers cost more than they save
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=60' # Plain (unhashed) names can change in place
+
+
+def compress(data):
+    """ {'br': bytes, 'gzip': bytes} for the encodings that make data smaller. """
+    encoded = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)} # mtime=0: same bytes every build
+    if brotli is not None:
+        encoded['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in encoded.items() if len(body) < len(data) * 0.95}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ ManifestStaticFilesStorage that also writes .gz/.br next to each text asset. """
+    EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+
+    def stored_name(self, name):
+        # Before the first collectstatic (runserver, tests) there is no manifest:
+        # use the plain names. Once there is one, missing entries still raise.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        # Both the plain copies and the hashed ones (the templates link the latter)
+        for name in sorted({*paths, *self.hashed_files.values()}):
+            if name.endswith(COMPRESSIBLE):
+                self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for encoding, body in compress(data).items():
+            path = name + self.EXTENSIONS[encoding]
+            if self.exists(path):
+                self.delete(path)
+            self._save(path, ContentFile(body))
+
+
+class StaticFile:
+    """ One file under STATIC_ROOT and its precompressed copies. """
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.etag = f'W/"{int(stat.st_mtime):x}-{stat.st_size:x}"' # Weak: same tag for every encoding
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        # Best first, so the first one the browser accepts wins
+        self.encodings = [
+            (encoding, path + extension)
+            for encoding, extension in (('br', '.br'), ('gzip', '.gz'))
+            if os.path.isfile(path + extension)
+        ]
+
+
+class StaticFilesMiddleware:
+    """
+    Serves STATIC_ROOT before the rest of the stack (no session, auth or
+    URL resolving for assets). Set SERVE_STATIC = False when a CDN or
+    nginx serves /static/ instead.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVE_STATIC', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        # STATIC_ROOT only changes on deploy (i.e. with a new process): stat each file once
+        self.files = {}
+        self.hashed_names = None
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            static_file = self.find(request.path_info[len(self.prefix):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request) # Not a static file: the normal 404
+
+    def find(self, name):
+        name = posixpath.normpath(name).lstrip('/')
+        if name not in self.files:
+            if self.hashed_names is None:
+                self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+            try:
+                path = safe_join(settings.STATIC_ROOT, name)
+            except SuspiciousFileOperation:
+                return None
+            if not os.path.isfile(path):
+                return None # Not memoized: any URL can miss
+            self.files[name] = StaticFile(path, name in self.hashed_names)
+        return self.files[name]
+
+    def serve(self, request, static_file):
+        # 1. Revalidation (plain names after max-age, or a forced reload)
+        if static_file.etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            # 2. Smallest encoding the browser accepts
+            accepted = {part.split(';')[0].strip() for part in request.headers.get('Accept-Encoding', '').split(',')}
+            encoding, path = next(
+                ((encoding, path) for encoding, path in static_file.encodings if encoding in accepted),
+                (None, static_file.path),
+            )
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            del response['Content-Disposition'] # FileResponse names the file; assets are inline
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = static_file.etag
+        response['Cache-Control'] = static_file.cache_control
+        if static_file.encodings:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -1,3 +1,550 @@
-from django.test import TestCase
+import contextvars
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from unittest import mock
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, modify_settings, override_settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from rest_framework.request import Request
+from rest_framework.serializers import BaseSerializer
+from rest_framework.response import Response
+
+from api.cache import CatalogCacheMixin
+from api.checkout import payment_method_label
+from . import metrics
+from .cache_backends import SQLiteCache
+from .delivery_zones import get_zone_fee, get_zone_table, invalidate_zone_table
+from .email_service import CLAIM_LEASE, _claim_batch, _send_batch, deliver_pending_emails
+from .models import DeliveryZone, EmailLog
+from .db_router import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, replica_reads
+from .paystack import Paystack, call_stats
+from .profiling import endpoint_stats, install as install_profiling, uninstall as uninstall_profiling
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    """ Minimal stand-in for api.paystack.co, driven by class attributes. """
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateway
+    delay = 0
+    fail_first = 0
+    hits = []
+    connections = set()
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        StubGatewayHandler.hits.append(('POST', self.path))
+        StubGatewayHandler.connections.add(self.client_address)
+        time.sleep(StubGatewayHandler.delay)
+        self._reply(200, {'status': True, 'data': {
+            'authorization_url': 'https://checkout.test/abc', 'access_code': 'abc', 'reference': 'ref_123',
+        }})
+
+    def do_GET(self):
+        StubGatewayHandler.hits.append(('GET', self.path))
+        StubGatewayHandler.connections.add(self.client_address)
+        if StubGatewayHandler.fail_first > 0:
+            StubGatewayHandler.fail_first -= 1
+            return self._reply(503, {'status': False})
+        self._reply(200, {'status': True, 'data': {'status': 'success', 'amount': 270000}})
+
+    def log_message(self, *args):
+        pass
+
+
+class StubGatewayServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # The client timed out and hung up before the (delayed) reply: expected
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class PaystackClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubGatewayServer(('127.0.0.1', 0), StubGatewayHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubGatewayHandler.delay = 0
+        StubGatewayHandler.fail_first = 0
+        StubGatewayHandler.hits = []
+        StubGatewayHandler.connections = set()
+        call_stats.reset()
+
+    def test_initialize_and_verify_reuse_one_connection(self):
+        with override_settings(PAYSTACK_URL=self.base_url):
+            res = Paystack().initialize_transaction('a@b.com', 2700, order_id=1)
+            self.assertTrue(res['status'])
+            self.assertEqual(res['reference'], 'ref_123')
+            for _ in range(3):
+                self.assertTrue(Paystack().verify_transaction('ref_123')['status'])
+
+        self.assertEqual(len(StubGatewayHandler.hits), 4)
+        self.assertEqual(len(StubGatewayHandler.connections), 1)
+        stats = call_stats.snapshot()
+        self.assertEqual(stats['initialize']['calls'], 1)
+        self.assertEqual(stats['verify']['calls'], 3)
+
+    def test_verify_retries_gateway_errors(self):
+        StubGatewayHandler.fail_first = 1
+        with override_settings(PAYSTACK_URL=self.base_url):
+            self.assertTrue(Paystack().verify_transaction('ref_123')['status'])
+        self.assertEqual(StubGatewayHandler.hits, [('GET', '/transaction/verify/ref_123')] * 2)
+
+    def test_slow_gateway_times_out(self):
+        StubGatewayHandler.delay = 0.5
+        with override_settings(PAYSTACK_URL=self.base_url, PAYSTACK_READ_TIMEOUT=0.1):
+            res = Paystack().initialize_transaction('a@b.com', 2700, order_id=1)
+        self.assertFalse(res['status'])
+        # POST is never re-sent: a retry could open a second transaction
+        self.assertEqual(len(StubGatewayHandler.hits), 1)
+        self.assertEqual(call_stats.snapshot()['initialize']['errors'], 1)
+
+
+@mock.patch.dict(settings.DATABASES, {'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'replica.sqlite3'}})
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, view):
+        """ Runs `view` through the pin middleware; returns (response, aliases it read from). """
+        reads = []
+
+        def get_response(request):
+            return view(reads)
+
+        response = ReplicaPinMiddleware(get_response)(request)
+        return response, reads
+
+    def catalog_view(self, reads):
+        with replica_reads():
+            reads.append(self.router.db_for_read(None))
+        return HttpResponse()
+
+    def cart_view(self, reads):
+        reads.append(self.router.db_for_read(None))
+        self.router.db_for_write(None)
+        with replica_reads():
+            reads.append(self.router.db_for_read(None)) # Same request, after the write
+        return HttpResponse()
+
+    def test_only_catalog_reads_use_the_replica(self):
+        response, reads = self.route(self.factory.get('/api/products/'), self.catalog_view)
+        self.assertEqual(reads, ['replica'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(None), 'default')
+        self.assertEqual(self.router.db_for_write(None), 'default')
+
+    def test_write_pins_the_request_and_the_browser_to_primary(self):
+        response, reads = self.route(self.factory.post('/api/cart/batch/'), self.cart_view)
+        self.assertEqual(reads, ['default', 'default'])
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        # Next catalog request from the same browser still reads its own writes
+        request = self.factory.get('/api/products/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        _, reads = self.route(request, self.catalog_view)
+        self.assertEqual(reads, ['default'])
+
+    def test_catalog_cache_fills_from_primary(self):
+        # A lagging replica must not be cached under the new catalog version
+        router = self.router
+
+        class ListView:
+            def list(self, request):
+                self.reads.append(router.db_for_read(None))
+                return Response([])
+
+        class CachedListView(CatalogCacheMixin, ListView):
+            pass
+
+        def catalog_view(reads):
+            view = CachedListView()
+            view.reads = reads
+            with replica_reads():
+                reads.append(router.db_for_read(None))
+                view.list(Request(self.factory.get('/api/products/?fill=primary')))
+            return HttpResponse()
+
+        cache.clear()
+        _, reads = self.route(self.factory.get('/api/products/'), catalog_view)
+        self.assertEqual(reads, ['replica', 'default'])
+
+    def test_replica_is_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'api'))
+        self.assertTrue(self.router.allow_migrate('default', 'api'))
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 2}})
+
+    def assertStatsMatchTable(self):
+        conn = self.cache._connection()
+        stats = conn.execute('SELECT entries, bytes FROM cache_stats').fetchone()
+        actual = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        self.assertEqual(stats, actual)
+
+    def test_running_totals_follow_every_write(self):
+        self.cache.set('a', 'x' * 100)
+        self.cache.set('a', 'x' * 10) # Replace: size shrinks, still one entry
+        self.cache.add('b', 1)
+        self.cache.incr('b', 10 ** 30) # Bigger pickle
+        self.cache.delete('a')
+        self.assertStatsMatchTable()
+
+        for i in range(12): # Past MAX_ENTRIES: culls
+            self.cache.set(f'k{i}', i)
+        self.assertStatsMatchTable()
+        self.assertLessEqual(self.cache._connection().execute('SELECT entries FROM cache_stats').fetchone()[0], 5)
+        self.assertEqual(self.cache.get('k11'), 11) # Newest survives
+
+        self.cache.clear()
+        self.assertStatsMatchTable()
+
+    def test_old_cache_file_is_rebuilt(self):
+        with sqlite3.connect(self.path) as conn: # v1 layout, no stats table
+            conn.execute('CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                         'expires REAL, accessed REAL NOT NULL)')
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertStatsMatchTable()
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    """ core.db.apply_sqlite_pragmas, read back from a fresh file-backed connection. """
+
+    def open_connection(self):
+        # The test database is in-memory (no WAL there): same settings, on a file
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        default = connections['default']
+        settings_dict = {**default.settings_dict, 'NAME': os.path.join(directory, 'pragmas.sqlite3')}
+        conn = type(default)(settings_dict, alias='pragma_tests')
+        self.addCleanup(conn.close)
+        return conn
+
+    def read_pragma(self, conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_on_connect(self):
+        conn = self.open_connection()
+        self.assertEqual(self.read_pragma(conn, 'journal_mode'), 'wal')
+        self.assertEqual(self.read_pragma(conn, 'synchronous'), 1) # NORMAL
+        self.assertEqual(self.read_pragma(conn, 'busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.read_pragma(conn, 'cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(self.read_pragma(conn, 'temp_store'), 2) # MEMORY
+
+    def test_atomic_takes_the_write_lock_at_begin(self):
+        conn = self.open_connection()
+        self.assertEqual(conn.settings_dict['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        other = sqlite3.connect(conn.settings_dict['NAME'], timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        connections[conn.alias] = conn # atomic() looks the alias up there
+        self.addCleanup(connections.__delitem__, conn.alias)
+        with transaction.atomic(using=conn.alias):
+            # No write yet, but another writer is already locked out
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+        other.execute('BEGIN IMMEDIATE') # Released at commit
+        other.execute('COMMIT')
+
+
+class DeliveryZoneTableTests(TestCase):
+    def setUp(self):
+        DeliveryZone.objects.create(state='Kano', fee=1500)
+        invalidate_zone_table()
+
+    @mock.patch.dict(settings.DATABASES, {'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'replica.sqlite3'}})
+    def test_loaded_from_primary_inside_replica_views(self):
+        # Checkout charges from this table: never snapshot a lagging replica.
+        # Fresh context: setUp's write pinned this one to the primary.
+        def catalog_request():
+            with replica_reads():
+                return get_zone_fee('kano')
+
+        self.assertEqual(contextvars.Context().run(catalog_request), 1500)
+
+    def test_reloaded_after_ttl(self):
+        # Edits another worker's (per-process) cache never told us about
+        get_zone_table()
+        DeliveryZone.objects.filter(state='Kano').update(fee=2000) # No signal, no version bump
+        self.assertEqual(get_zone_fee('Kano'), 1500)
+        with override_settings(DELIVERY_ZONES_TTL=0):
+            invalidate_zone_table() # Rebuilt with the 0s TTL...
+            get_zone_table()
+            DeliveryZone.objects.filter(state='Kano').update(fee=2500)
+            self.assertEqual(get_zone_fee('Kano'), 2500) # ...so the next call reloads
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'core.profiling.ProfilingMiddleware'})
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        install_profiling() # What CoreConfig.ready does when REQUEST_PROFILING is on
+        cls.addClassCleanup(uninstall_profiling) # The patches are process-wide
+
+    def setUp(self):
+        cache.clear()
+        endpoint_stats.reset()
+
+    def test_server_timing_reports_sql_cache_and_serializer(self):
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            cold = self.client.get('/api/products/')
+            warm = self.client.get('/api/products/') # Served from the catalog cache
+
+        self.assertIn('db;dur=', cold['Server-Timing'])
+        self.assertIn('desc="1 queries"', cold['Server-Timing'])
+        self.assertIn('serialize;dur=', cold['Server-Timing'])
+        self.assertIn('desc="0 queries"', warm['Server-Timing'])
+        self.assertIn('desc="4 hits, 0 misses"', warm['Server-Timing'])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['endpoint'], line['status'], line['sql_count']), ('GET product_list', 200, 1))
+
+    def test_histogram_is_per_endpoint_and_shown_to_staff(self):
+        with self.assertLogs('core.profiling', 'INFO'):
+            self.client.get('/api/products/')
+            self.client.get('/api/products/?ordering=price')
+            self.client.get('/api/categories/')
+
+        rows = {row['endpoint']: row for row in endpoint_stats.snapshot()}
+        self.assertEqual(rows['GET product_list']['requests'], 2)
+        self.assertEqual(sum(rows['GET product_list']['buckets']), 2)
+        self.assertEqual(rows['GET category_list']['requests'], 1)
+
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        with self.assertLogs('core.profiling', 'INFO'):
+            response = self.client.get('/admin/profiling/')
+        self.assertContains(response, 'GET product_list')
+
+    def test_uninstall_restores_originals(self):
+        self.addCleanup(install_profiling) # For the rest of the class
+        uninstall_profiling()
+        owners = [BaseSerializer] + [import_string(cache['BACKEND']) for cache in settings.CACHES.values()]
+        originals = [dict(owner.__dict__) for owner in owners]
+
+        install_profiling()
+        self.assertTrue(BaseSerializer.data.fget.profiled)
+        uninstall_profiling()
+        self.assertEqual([dict(owner.__dict__) for owner in owners], originals)
+
+
+class MetricsTests(SimpleTestCase):
+    databases = {'default'} # The scrape reads the outbox depth
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_text_exposition(self):
+        metrics.CHECKOUTS.inc(payment_method='pod', outcome='placed')
+        metrics.CHECKOUTS.inc(payment_method='pod', outcome='placed')
+        metrics.PAYSTACK_DURATION.observe(0.3, operation='verify')
+        metrics.PAYSTACK_DURATION.observe(7, operation='verify')
+
+        text = metrics.render([('email_outbox_depth', 'Queued emails.', [((('status', 'pending'),), 4)])])
+        self.assertIn('# TYPE nurastore_checkouts_total counter', text)
+        self.assertIn('nurastore_checkouts_total{payment_method="pod",outcome="placed"} 2', text)
+        # Buckets are cumulative
+        self.assertIn('nurastore_paystack_request_duration_seconds_bucket{operation="verify",le="0.25"} 0', text)
+        self.assertIn('nurastore_paystack_request_duration_seconds_bucket{operation="verify",le="0.5"} 1', text)
+        self.assertIn('nurastore_paystack_request_duration_seconds_bucket{operation="verify",le="+Inf"} 2', text)
+        self.assertIn('nurastore_paystack_request_duration_seconds_count{operation="verify"} 2', text)
+        self.assertIn('nurastore_email_outbox_depth{status="pending"} 4', text)
+
+    def test_workers_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # "Another worker": flush this process's values, then file them under a different pid
+            metrics.EMAILS.inc(3, outcome='sent')
+            metrics.registry.flush()
+            os.replace(os.path.join(directory, f"metrics-{os.getpid()}.json"),
+                       os.path.join(directory, 'metrics-99999.json'))
+
+            metrics.registry.reset()
+            metrics.EMAILS.inc(outcome='sent')
+            metrics.registry.flush() # Our own snapshot must not be counted twice
+
+            self.assertIn('nurastore_emails_total{outcome="sent"} 4', metrics.render())
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    def test_payment_method_label_is_bounded(self):
+        # Free text from the checkout body must not create new series
+        self.assertEqual(payment_method_label('pod'), 'pod')
+        self.assertEqual(payment_method_label('x' * 40), 'other')
+        self.assertEqual(payment_method_label(None), 'other')
+        self.assertEqual(payment_method_label(['pod']), 'other') # JSON bodies aren't just strings
+
+
+class StaticFilesTests(SimpleTestCase):
+    """ collectstatic output (hashed + precompressed) served with immutable caching. """
+
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        # Only the project's own static/ (not the admin/DRF files) keeps the run short
+        settings_override = override_settings(
+            STATIC_ROOT=static_root, SERVE_STATIC=True,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.app_js = engines['django'].from_string("{% load static %}{% static 'js/app.js' %}").render()
+
+    def test_templates_link_hashed_names(self):
+        self.assertRegex(self.app_js, r'^/static/js/app\.[0-9a-f]{12}\.js$')
+        self.assertTrue(os.path.isfile(os.path.join(settings.STATIC_ROOT, self.app_js[len('/static/'):] + '.gz')))
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        response = self.client.get(self.app_js, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        with open(os.path.join(settings.BASE_DIR, 'static/js/app.js'), 'rb') as f:
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), f.read())
+
+        plain = self.client.get(self.app_js) # No Accept-Encoding: the original bytes
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+    def test_plain_names_revalidate(self):
+        response = self.client.get('/static/js/app.js')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        again = self.client.get('/static/js/app.js', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_outside_static_root_is_not_served(self):
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+    def test_assets_are_not_counted_as_requests(self):
+        metrics.registry.reset()
+        self.client.get(self.app_js)
+        self.assertNotIn('nurastore_http_requests_total{', metrics.render())
+        self.assertEqual(self.client.get('/static/js/missing.js').status_code, 404)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_BASE=60)
+class EmailOutboxTests(TestCase):
+    """ Outbox claims, leases, retries with backoff, and the send command. """
+
+    def setUp(self):
+        self.logs = EmailLog.objects.bulk_create([
+            EmailLog(recipient=f'user{i}@example.com', subject=f'Email {i}', body='Hi', status='pending')
+            for i in range(3)
+        ])
+
+    def at(self, delta):
+        """ Runs the outbox `delta` from now. """
+        return mock.patch('django.utils.timezone.now', return_value=timezone.now() + delta)
+
+    def statuses(self):
+        return list(EmailLog.objects.order_by('id').values_list('status', 'attempts'))
+
+    def test_claims_do_not_overlap(self):
+        first = _claim_batch(2)
+        second = _claim_batch(5)
+        self.assertEqual([log.id for log in first], [log.id for log in self.logs[:2]])
+        self.assertEqual([log.id for log in second], [self.logs[2].id])
+        self.assertEqual(_claim_batch(5), [])
+        self.assertEqual({log.status for log in first + second}, {'sending'})
+
+    def test_expired_lease_is_reclaimed(self):
+        _claim_batch(5) # This worker dies before sending
+        with self.at(CLAIM_LEASE - timedelta(seconds=1)):
+            self.assertEqual(_claim_batch(5), [])
+        with self.at(CLAIM_LEASE + timedelta(seconds=1)):
+            self.assertEqual(len(_claim_batch(5)), 3)
+
+    def test_reclaimed_rows_are_not_sent_twice(self):
+        slow = _claim_batch(5) # A batch that outlives its lease...
+        with self.at(CLAIM_LEASE + timedelta(seconds=1)):
+            self.assertEqual(deliver_pending_emails(), 3) # ...is taken over and sent
+        _send_batch(slow, max_attempts=3) # The slow worker gets to its rows
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(self.statuses(), [('sent', 1)] * 3)
+
+    def test_sends_batch_and_marks_rows_sent(self):
+        self.assertEqual(deliver_pending_emails(), 3)
+        self.assertEqual([message.to for message in mail.outbox], [[log.recipient] for log in self.logs])
+        self.assertEqual(self.statuses(), [('sent', 1)] * 3)
+        self.assertEqual(deliver_pending_emails(), 0)
+
+    @mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=OSError('SMTP said no'))
+    def test_failures_back_off_then_give_up(self, send):
+        self.enterContext(self.assertLogs('core.email_service', 'WARNING')) # One per failed attempt
+        deliver_pending_emails()
+        self.assertEqual(self.statuses(), [('pending', 1)] * 3)
+        self.assertEqual(deliver_pending_emails(), 0) # Not due yet
+
+        with self.at(timedelta(seconds=61)): # 60s after the 1st failure
+            deliver_pending_emails()
+        self.assertEqual(self.statuses(), [('pending', 2)] * 3)
+        with self.at(timedelta(seconds=150)):
+            self.assertEqual(deliver_pending_emails(), 0) # 2nd wait is 120s
+        with self.at(timedelta(seconds=190)):
+            deliver_pending_emails()
+        self.assertEqual(self.statuses(), [('failed', 3)] * 3) # EMAIL_OUTBOX_MAX_ATTEMPTS
+        self.assertEqual(EmailLog.objects.first().error_message, 'SMTP said no')
+
+        with self.at(timedelta(days=1)):
+            self.assertEqual(deliver_pending_emails(), 0) # Never retried again
+
+    def test_send_command_drains_the_outbox(self):
+        out = io.StringIO()
+        call_command('send_queued_emails', '--batch-size', '2', stdout=out)
+        self.assertIn('Processed 3 queued emails.', out.getvalue())
+        self.assertEqual(len(mail.outbox), 3)
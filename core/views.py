@@ -1,3 +1,70 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Count
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
+
+from . import metrics
+from .models import EmailLog
+from .profiling import BUCKETS_MS, endpoint_stats
+
+
+@staff_member_required
+def profiling_report_view(request):
+    """
+    Per-endpoint latency histograms from ProfilingMiddleware (this worker
+    only), busiest first. ?reset=1 starts a fresh window.
+    """
+    if request.GET.get('reset'):
+        endpoint_stats.reset()
+
+    context = {
+        'enabled': settings.REQUEST_PROFILING,
+        'window_minutes': settings.PROFILING_WINDOW_MINUTES,
+        'bucket_labels': [f"≤{bound}" if bound != float('inf') else f">{BUCKETS_MS[-2]}" for bound in BUCKETS_MS],
+        'rows': endpoint_stats.snapshot(),
+    }
+    return render(request, 'admin/profiling_report.html', context)
+
+
+OUTBOX_STATUSES = ('pending', 'sending')
+
+
+def _may_scrape(request):
+    """
+    Closed by default (the counters are business data): the scraper sends
+    METRICS_TOKEN as a bearer token; staff and DEBUG runs may also look.
+    """
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return True
+    return settings.DEBUG or request.user.is_staff
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape target. Counters/histograms come from core.metrics
+    (all workers when METRICS_DIR is set); gauges are read here.
+    """
+    if not _may_scrape(request):
+        return HttpResponse(status=401)
+
+    from api.cache import catalog_cache_stats # api depends on core, not the reverse
 
-# Create your views here.
+    # Undelivered rows only: 'sent' grows forever (emaillog_outbox_idx keeps this cheap)
+    outbox = dict(
+        EmailLog.objects.filter(status__in=OUTBOX_STATUSES)
+        .values_list('status').annotate(total=Count('id')).order_by()
+    )
+    cache_stats = catalog_cache_stats()
+    gauges = [
+        ('email_outbox_depth', 'Emails waiting in the outbox, by status.',
+         [((('status', status),), outbox.get(status, 0)) for status in OUTBOX_STATUSES]),
+        ('catalog_cache_hit_ratio', 'Catalog response cache hit ratio since the workers started.',
+         [((), cache_stats['hit_rate'] / 100)]),
+    ]
+    return HttpResponse(metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -33,6 +33,16 @@ const App = {
         });
     },
 
+    // UX Utility: <picture> with the AVIF/WebP sizes (see ImageVariantsField), <img> fallback
+    // `sizes` tells the browser how wide the image is drawn, so it picks the smallest file that fits
+    productPicture: function(variants, fallback, sizes, imgAttrs) {
+        const srcset = (variants && variants.srcset) || {};
+        const sources = Object.keys(srcset)
+            .map(fmt => `<source type="image/${fmt}" srcset="${srcset[fmt]}" sizes="${sizes}">`)
+            .join('');
+        return `<picture>${sources}<img src="${fallback}" ${imgAttrs}></picture>`;
+    },
+
     // 2. UX Utility: Render Skeleton Loaders
     renderSkeleton: function(containerId, count=4) {
         const container = document.getElementById(containerId);
@@ -64,6 +74,13 @@ const App = {
         price_max: ''
     },
 
+    // Infinite Scroll State (API returns cursor pages: {next, previous, results})
+    nextPageUrl: null,
+    isLoadingPage: false,
+    scrollObserver: null,
+    productGeneration: 0,  // Bumped by every new search/filter: older responses are dropped
+    productRequest: null,  // AbortController of the page request in flight
+
     // 3. API Action: Fetch and Display Products (Updated for Phase 6)
     fetchProducts: async function() {
         const container = document.getElementById('product-list');
@@ -81,17 +98,18 @@ const App = {
         // Construct URL
         const url = `/api/products/?${params.toString()}`;
 
-        try {
-            const response = await fetch(url);
-            if (!response.ok) throw new Error('Server returned ' + response.status);
+        // Fresh search: forget the old cursor, cancel any page still loading
+        const generation = this.startProductGeneration();
 
-            const products = await response.json();
+        try {
+            const page = await this.loadProductPage(url, generation);
+            if (!page) return; // A newer search took over
 
             // Clear Skeletons
             container.innerHTML = '';
 
             // Handle Empty State
-            if (products.length === 0) {
+            if (page.results.length === 0) {
                 container.innerHTML = `
                     <div class="col-12 text-center py-5">
                         <i class="fas fa-search fa-3x text-muted mb-3"></i>
@@ -101,67 +119,129 @@ const App = {
                 return;
             }
 
-            // Render Products (Same rendering logic as before)
-            products.forEach(product => {
-                const imgUrl = product.image ? product.image : 'https://via.placeholder.com/300x300?text=No+Image';
-                
-                // UX: Discount Badge
-                let badge = '';
-                if (product.old_price && parseFloat(product.old_price) > parseFloat(product.price)) {
-                    const diff = Math.round(((product.old_price - product.price) / product.old_price) * 100);
-                    badge = `<span class="position-absolute top-0 start-0 badge bg-danger m-2 shadow-sm">-${diff}%</span>`;
-                }
+            this.renderProducts(page.results);
+            this.initInfiniteScroll();
 
-                const priceFormatted = parseFloat(product.price).toLocaleString();
-                const oldPriceFormatted = product.old_price ? parseFloat(product.old_price).toLocaleString() : null;
+        } catch (error) {
+            console.error("Fetch error:", error);
+            container.innerHTML = `<div class="col-12 text-center text-danger">Failed to load products.</div>`;
+        }
+    },
 
-                // ... inside fetchProducts, inside products.forEach(product => { ...
+    // Helper: A new search/filter replaces the grid; pages of the old one must not land in it
+    startProductGeneration: function() {
+        if (this.productRequest) this.productRequest.abort();
+        this.productRequest = null;
+        this.nextPageUrl = null;
+        this.isLoadingPage = false;
+        return ++this.productGeneration;
+    },
 
-                const html = `
-                <div class="col">
-                    <div class="card h-100 shadow-sm border-0 product-card">
-                        <div class="position-relative">
-                            ${badge}
-                            <a href="/product/${product.slug}/">
-                                <img src="${imgUrl}" class="card-img-top" alt="${product.name}" style="height: 220px; object-fit: cover;">
-                            </a>
-                        </div>
-                        <div class="card-body d-flex flex-column">
-                            <small class="text-muted mb-1 text-uppercase" style="font-size: 0.75rem;">${product.category_name}</small>
-                            
-                            <a href="/product/${product.slug}/" class="text-decoration-none text-dark">
-                                <h5 class="card-title text-truncate">${product.name}</h5>
-                            </a>
-                            
-                            <div class="mt-auto pt-3">
-                                <div class="d-flex align-items-center justify-content-between mb-3">
-                                    <span class="fs-5 fw-bold text-dark">₦${priceFormatted}</span>
-                                    ${oldPriceFormatted ? `<small class="text-muted text-decoration-line-through">₦${oldPriceFormatted}</small>` : ''}
-                                </div>
-                                
-                                <div class="d-flex gap-2">
-                                    <a href="/product/${product.slug}/" class="btn btn-outline-secondary flex-grow-1">
-                                        View
-                                    </a>
-                                    <button class="btn btn-primary flex-grow-1" onclick="App.addToCart(${product.id})">
-                                        <i class="fas fa-cart-plus"></i>
-                                    </button>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>`;
-                container.insertAdjacentHTML('beforeend', html);
-            
-            // ... end of loop
-            });
+    // Helper: Fetch one cursor page and remember where the next one is.
+    // Returns null if a newer search started meanwhile (the page is stale).
+    loadProductPage: async function(url, generation) {
+        const controller = new AbortController();
+        this.productRequest = controller;
+        try {
+            const response = await fetch(url, { signal: controller.signal });
+            if (!response.ok) throw new Error('Server returned ' + response.status);
 
+            const page = await response.json();
+            if (generation !== this.productGeneration) return null;
+            this.nextPageUrl = page.next;
+            return page;
+        } catch (error) {
+            if (generation !== this.productGeneration) return null; // Aborted by the newer search
+            throw error;
+        } finally {
+            if (this.productRequest === controller) this.productRequest = null;
+        }
+    },
+
+    // Infinite Scroll: Append the next page when the sentinel comes into view
+    loadMoreProducts: async function() {
+        if (!this.nextPageUrl || this.isLoadingPage) return;
+
+        const generation = this.productGeneration;
+        this.isLoadingPage = true;
+        try {
+            const page = await this.loadProductPage(this.nextPageUrl, generation);
+            if (page) this.renderProducts(page.results);
         } catch (error) {
             console.error("Fetch error:", error);
-            container.innerHTML = `<div class="col-12 text-center text-danger">Failed to load products.</div>`;
+        } finally {
+            // A newer search already reset the flag (and may have a page loading)
+            if (generation === this.productGeneration) this.isLoadingPage = false;
         }
     },
 
+    initInfiniteScroll: function() {
+        const sentinel = document.getElementById('product-list-sentinel');
+        if (!sentinel || this.scrollObserver) return;
+
+        this.scrollObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) this.loadMoreProducts();
+        }, { rootMargin: '400px' });
+        this.scrollObserver.observe(sentinel);
+    },
+
+    // UI: Render Product Cards (appends to the grid)
+    renderProducts: function(products) {
+        const container = document.getElementById('product-list');
+        if (!container) return;
+
+        products.forEach(product => {
+            const imgUrl = product.image ? product.image : 'https://via.placeholder.com/300x300?text=No+Image';
+            
+            // UX: Discount Badge
+            let badge = '';
+            if (product.old_price && parseFloat(product.old_price) > parseFloat(product.price)) {
+                const diff = Math.round(((product.old_price - product.price) / product.old_price) * 100);
+                badge = `<span class="position-absolute top-0 start-0 badge bg-danger m-2 shadow-sm">-${diff}%</span>`;
+            }
+
+            const priceFormatted = parseFloat(product.price).toLocaleString();
+            const oldPriceFormatted = product.old_price ? parseFloat(product.old_price).toLocaleString() : null;
+
+            const html = `
+            <div class="col">
+                <div class="card h-100 shadow-sm border-0 product-card">
+                    <div class="position-relative">
+                        ${badge}
+                        <a href="/product/${product.slug}/">
+                            ${this.productPicture(product.image_variants, imgUrl, '(min-width: 992px) 25vw, (min-width: 576px) 50vw, 100vw',
+                                `class="card-img-top" alt="${product.name}" loading="lazy" style="height: 220px; object-fit: cover;"`)}
+                        </a>
+                    </div>
+                    <div class="card-body d-flex flex-column">
+                        <small class="text-muted mb-1 text-uppercase" style="font-size: 0.75rem;">${product.category_name}</small>
+                        
+                        <a href="/product/${product.slug}/" class="text-decoration-none text-dark">
+                            <h5 class="card-title text-truncate">${product.name}</h5>
+                        </a>
+                        
+                        <div class="mt-auto pt-3">
+                            <div class="d-flex align-items-center justify-content-between mb-3">
+                                <span class="fs-5 fw-bold text-dark">₦${priceFormatted}</span>
+                                ${oldPriceFormatted ? `<small class="text-muted text-decoration-line-through">₦${oldPriceFormatted}</small>` : ''}
+                            </div>
+                            
+                            <div class="d-flex gap-2">
+                                <a href="/product/${product.slug}/" class="btn btn-outline-secondary flex-grow-1">
+                                    View
+                                </a>
+                                <button class="btn btn-primary flex-grow-1" onclick="App.addToCart(${product.id})">
+                                    <i class="fas fa-cart-plus"></i>
+                                </button>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+            </div>`;
+            container.insertAdjacentHTML('beforeend', html);
+        });
+    },
+
     // UX: Apply Filters when user types or selects
     applyFilters: function() {
         // Read values from DOM
@@ -212,23 +292,71 @@ const App = {
             return;
         }
 
-        try {
-            const response = await fetch('/api/cart/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${localStorage.getItem('access_token')}`
-                },
-                body: JSON.stringify({ product_id: productId, quantity: 1 })
-            });
+        // Sent right away (no debounce), together with any pending +/- clicks
+        const ok = await this.queueCartOp({ op: 'add', product_id: productId, quantity: 1 }, 0);
+        if (ok) this.showToast('Item added to cart!', 'success');
+    },
 
-            if (response.ok) {
-                this.showToast('Item added to cart!', 'success');
-                this.fetchCart(); // Update UI
-            } else {
-                this.showToast('Failed to add item', 'error');
-            }
-        } catch (e) { console.error(e); }
+    // 4b. Cart Batching: every cart change is queued and sent as ONE
+    // POST /api/cart/batch/ that returns the updated cart (no extra fetchCart)
+    cartQueue: [],
+    cartFlushTimer: null,
+    cartInFlight: false,
+
+    queueCartOp: function(op, delay = 300) {
+        // Resolves with true/false once the batch carrying this op is applied
+        return new Promise(resolve => {
+            this.cartQueue.push({ op, resolve });
+            clearTimeout(this.cartFlushTimer);
+            this.cartFlushTimer = setTimeout(() => this.flushCart(), delay);
+        });
+    },
+
+    flushCart: async function() {
+        // One batch in flight at a time; clicks made meanwhile go in the next one
+        if (this.cartInFlight) return;
+        const batch = this.cartQueue.splice(0);
+        if (!batch.length) return;
+
+        this.cartInFlight = true;
+        const result = await this.sendCartBatch(batch.map(entry => entry.op));
+        this.cartInFlight = false;
+
+        if (result.ok) {
+            this.renderCart(result.data);
+        } else {
+            this.showToast(result.data.error || 'Failed to update cart', 'error');
+            this.fetchCart(); // Undo optimistic quantities
+        }
+        batch.forEach(entry => entry.resolve(result.ok));
+
+        if (this.cartQueue.length) this.flushCart();
+    },
+
+    sendCartBatch: async function(operations) {
+        // Same key on every retry: the server applies the batch at most once
+        const key = window.crypto && crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+
+        for (let attempt = 0; attempt < 3; attempt++) {
+            try {
+                const response = await fetch('/api/cart/batch/', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${localStorage.getItem('access_token')}`,
+                        'Idempotency-Key': key
+                    },
+                    body: JSON.stringify({ operations })
+                });
+                // 409: a previous attempt is still being applied, ask again shortly
+                if (response.status !== 409) {
+                    return { ok: response.ok, data: await response.json() };
+                }
+            } catch (e) { console.error(e); } // Network error: retry with the same key
+
+            await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+        }
+        return { ok: false, data: { error: 'Connection error. Please try again.' } };
     },
 
     // 5. API Action: Fetch Cart Data
@@ -276,7 +404,8 @@ const App = {
         // Render Items
         let html = '';
         cart.items.forEach(item => {
-            const img = item.product_image ? item.product_image : 'https://via.placeholder.com/80';
+            const thumb = item.product_image_variants && item.product_image_variants.sizes.thumb;
+            const img = (thumb && thumb.webp) || item.product_image || 'https://via.placeholder.com/80';
             html += `
             <div class="d-flex mb-3 pb-3 border-bottom">
                 <img src="${img}" class="rounded" style="width: 60px; height: 60px; object-fit: cover;">
@@ -286,11 +415,11 @@ const App = {
                     
                     <div class="d-flex justify-content-between align-items-center mt-2">
                         <div class="input-group input-group-sm" style="width: 80px;">
-                            <button class="btn btn-outline-secondary" onclick="App.updateCartItem(${item.id}, ${item.quantity - 1})">-</button>
-                            <span class="input-group-text bg-white">${item.quantity}</span>
-                            <button class="btn btn-outline-secondary" onclick="App.updateCartItem(${item.id}, ${item.quantity + 1})">+</button>
+                            <button class="btn btn-outline-secondary" onclick="App.updateCartItem(${item.product}, -1)">-</button>
+                            <span class="input-group-text bg-white" id="cart-qty-${item.product}">${item.quantity}</span>
+                            <button class="btn btn-outline-secondary" onclick="App.updateCartItem(${item.product}, 1)">+</button>
                         </div>
-                        <button class="btn btn-sm text-danger" onclick="App.removeCartItem(${item.id})">
+                        <button class="btn btn-sm text-danger" onclick="App.removeCartItem(${item.product})">
                             <i class="fas fa-trash"></i>
                         </button>
                     </div>
@@ -300,36 +429,17 @@ const App = {
         container.innerHTML = html;
     },
 
-    // 7. API Action: Update Quantity
-    updateCartItem: async function(itemId, newQuantity) {
-        try {
-            const response = await fetch(`/api/cart/items/${itemId}/`, {
-                method: 'PATCH',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${localStorage.getItem('access_token')}`
-                },
-                body: JSON.stringify({ quantity: newQuantity })
-            });
-            if(response.ok) {
-                const cart = await response.json();
-                this.renderCart(cart);
-            }
-        } catch(e) { console.error(e); }
+    // 7. API Action: Update Quantity (+/- buttons, debounced into one batch)
+    updateCartItem: function(productId, delta) {
+        const qtyEl = document.getElementById(`cart-qty-${productId}`);
+        if (qtyEl) qtyEl.innerText = Math.max(parseInt(qtyEl.innerText) + delta, 0); // Optimistic
+
+        this.queueCartOp({ op: 'add', product_id: productId, quantity: delta });
     },
 
     // 8. API Action: Remove Item
-    removeCartItem: async function(itemId) {
-        try {
-            const response = await fetch(`/api/cart/items/${itemId}/`, {
-                method: 'DELETE',
-                headers: { 'Authorization': `Bearer ${localStorage.getItem('access_token')}` }
-            });
-            if(response.ok) {
-                const cart = await response.json();
-                this.renderCart(cart);
-            }
-        } catch(e) { console.error(e); }
+    removeCartItem: function(productId) {
+        this.queueCartOp({ op: 'remove', product_id: productId }, 0);
     },
     // ... inside App object ...
 
@@ -396,6 +506,10 @@ const App = {
                     this.showToast('Order placed successfully!', 'success');
                     setTimeout(() => window.location.href = '/order-success', 2000); // We will build this page next
                 }
+            } else if (data.order_id) {
+                // CASE C: Order saved but gateway unreachable -> retry from the order page
+                this.showToast(data.error, 'error');
+                setTimeout(() => window.location.href = `/orders/${data.order_id}/`, 2000);
             } else {
                 this.showToast(data.error || 'Checkout failed', 'error');
                 btn.innerText = originalText;
@@ -409,6 +523,29 @@ const App = {
         }
     },
 
+    // 10b. API Action: Retry Paystack for a pending order
+    retryPayment: async function(orderId, btn) {
+        btn.disabled = true;
+        try {
+            const response = await fetch(`/api/orders/${orderId}/pay/`, {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('access_token')}` }
+            });
+            const data = await response.json();
+
+            if (response.ok && data.payment_url) {
+                this.showToast('Redirecting to secure payment...', 'success');
+                window.location.href = data.payment_url;
+                return;
+            }
+            this.showToast(data.error || 'Payment could not be started', 'error');
+        } catch (e) {
+            console.error(e);
+            this.showToast('Connection failed', 'error');
+        }
+        btn.disabled = false;
+    },
+
     // ... inside App object ...
 
     // Store zones locally to avoid repeated API calls